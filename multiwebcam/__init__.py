@@ -1,8 +1,6 @@
 """Top-level package for basic_template_repo."""
 import os
 from pathlib import Path
-import rtoml
-import platform
 
 __package_name__ = "multiwebcam"
 __version__ = "v0.1.0"
@@ -15,18 +13,16 @@ __repo_url__ = (
 )
 __repo_issues_url__ = f"{__repo_url__}issues"
 
-
+# Importing the package is kept cheap: paths are only computed here. Directories, the
+# settings file and rtoml are only touched when something actually needs them.
 
 # Determine platform-specific application data directory
-if platform.system() == "Windows":
-    print("Windows platform identified")
+if os.name == "nt":
     app_data_dir = os.getenv('LOCALAPPDATA')
 else:  # macOS, Linux, and other UNIX variants
-    print(f"Non-windows platform identified: {platform.system()}")
     app_data_dir = os.path.join(os.path.expanduser("~"), '.local', 'share')
 
 __app_dir__ = Path(app_data_dir, __package_name__)
-__app_dir__.mkdir(exist_ok=True, parents=True)
 
 # Create a toml file for user settings in app data directory and default the project folder to USER
 __settings_path__ = Path(__app_dir__, 'settings.toml')
@@ -34,32 +30,59 @@ __settings_path__ = Path(__app_dir__, 'settings.toml')
 # Get user home directory in a cross-platform way
 __user_dir__ = Path(os.path.expanduser("~"))
 
-if __settings_path__.exists():
-    USER_SETTINGS = rtoml.load(__settings_path__)
-else:
-    # default to storing pyxy projects in user/__package_name__
-    USER_SETTINGS = {"recent_projects":[],
-                     "last_project_parent":str(__user_dir__) # default initially to home...this will be where the 'New' folder dialog starts
-                     } 
-
-    
-    with open(__settings_path__, "a") as f:
-        rtoml.dump(USER_SETTINGS, f)
-
-
 __log_dir__ = Path(__app_dir__, "logs")
-__log_dir__.mkdir(exist_ok=True, parents=True)
 
 # a helpful reference
 __root__ = Path(__file__).parent.parent
 
-print(f"Thank you for using {__package_name__}!")
-print(f"This is printing from: {__file__}")
-print(f"Source code for this package is available at: {__repo_url__}")
-print(
-    f"Data and Log files associated with {__package_name__} are stored in {__app_dir__}"
-)
-print("""              _ _   _ __    __     _       ___                
+
+def load_user_settings() -> dict:
+    """
+    Read the user settings from the app data directory, creating the
+    file with defaults on first use
+    """
+    import rtoml
+
+    __app_dir__.mkdir(exist_ok=True, parents=True)
+
+    if __settings_path__.exists():
+        user_settings = rtoml.load(__settings_path__)
+    else:
+        # default to storing pyxy projects in user/__package_name__
+        user_settings = {"recent_projects":[],
+                         "last_project_parent":str(__user_dir__) # default initially to home...this will be where the 'New' folder dialog starts
+                         }
+
+        with open(__settings_path__, "a") as f:
+            rtoml.dump(user_settings, f)
+
+    return user_settings
+
+
+def __getattr__(name):
+    # USER_SETTINGS remains available as a package attribute but is only loaded on first access
+    if name == "USER_SETTINGS":
+        global USER_SETTINGS
+        USER_SETTINGS = load_user_settings()
+        return USER_SETTINGS
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def print_banner():
+    import platform
+
+    if platform.system() == "Windows":
+        print("Windows platform identified")
+    else:
+        print(f"Non-windows platform identified: {platform.system()}")
+
+    print(f"Thank you for using {__package_name__}!")
+    print(f"This is printing from: {__file__}")
+    print(f"Source code for this package is available at: {__repo_url__}")
+    print(
+        f"Data and Log files associated with {__package_name__} are stored in {__app_dir__}"
+    )
+    print("""              _ _   _ __    __     _       ___                
   /\/\  _   _| | |_(_) / /\ \ \___| |__   / __\__ _ _ __ ___  
  /    \| | | | | __| \ \/  \/ / _ \ '_ \ / /  / _` | '_ ` _ \ 
 / /\/\ \ |_| | | |_| |\  /\  /  __/ |_) / /__| (_| | | | | | |
@@ -70,6 +93,8 @@ def get_config(session_directory: Path) -> dict:
     """
     A broadly useful little function to get the config file
     """
+    import rtoml
+
     config_path = Path(session_directory, "config.toml")
 
     with open(config_path, "r") as f:
@@ -1,20 +1,260 @@
 import sys
-import os
-from PySide6.QtWidgets import QApplication
+import argparse
 from pathlib import Path
 
-from multiwebcam.gui.main_widget import launch_main
 import multiwebcam.logger
 
 logger = multiwebcam.logger.get(__name__)
 
 
 def CLI_parser():
+    # the GUI is only imported when it is actually launched so that
+    # headless recording never loads PySide6
     if len(sys.argv) == 1:
+        from multiwebcam.gui.main_widget import launch_main
         launch_main(show_clock=False)
 
-    if len(sys.argv) == 2:
+    elif sys.argv[1] == "record":
+        record_parser(sys.argv[2:])
+
+    elif sys.argv[1] == "serve":
+        serve_parser(sys.argv[2:])
+
+    elif sys.argv[1] == "watch":
+        watch_parser(sys.argv[2:])
+
+    elif sys.argv[1] == "calibrate-clock":
+        calibrate_clock_parser(sys.argv[2:])
+
+    elif sys.argv[1] == "latency":
+        latency_parser(sys.argv[2:])
+
+    elif len(sys.argv) == 2:
         modifiers = sys.argv[1]
 
         if modifiers in ["clock", "-c"]:
+            from multiwebcam.gui.main_widget import launch_main
             launch_main(show_clock=True)
+
+
+def record_parser(args):
+    parser = argparse.ArgumentParser(
+        prog="mwc record",
+        description="Record synchronized video from the cameras configured in a workspace without launching the GUI",
+    )
+    parser.add_argument(
+        "--workspace", required=True, type=Path, help="workspace directory containing recording_config.toml"
+    )
+    parser.add_argument(
+        "--duration", required=True, type=float, help="length of the recording in seconds"
+    )
+    parser.add_argument(
+        "--destination", type=Path, default=None, help="output folder (default: next recording_N in the workspace)"
+    )
+    parser.add_argument(
+        "--fps", type=int, default=None, help="target frame rate (default: value stored in the workspace config)"
+    )
+    parser.add_argument(
+        "--raw", action="store_true", help="capture unencoded frames and transcode to mp4 after recording"
+    )
+    parser.add_argument(
+        "--undistort", action="store_true", help="store lens corrected frames for cameras with a saved calibration"
+    )
+    parsed = parser.parse_args(args)
+
+    from multiwebcam.headless import record
+
+    destination = record(
+        parsed.workspace,
+        parsed.duration,
+        destination=parsed.destination,
+        fps_target=parsed.fps,
+        raw_capture=parsed.raw,
+        undistort=parsed.undistort,
+    )
+
+    if destination is None:
+        sys.exit(1)
+
+
+def serve_parser(args):
+    parser = argparse.ArgumentParser(
+        prog="mwc serve",
+        description="Stream JPEG compressed synchronized frames from the cameras configured in a workspace over TCP",
+    )
+    parser.add_argument(
+        "--workspace", required=True, type=Path, help="workspace directory containing recording_config.toml"
+    )
+    parser.add_argument(
+        "--host", default="127.0.0.1", help="interface to listen on; 0.0.0.0 serves the local network (default: 127.0.0.1)"
+    )
+    parser.add_argument(
+        "--port", type=int, default=None, help="TCP port to listen on (default: 8765)"
+    )
+    parser.add_argument(
+        "--thumbnail", type=int, default=None, help="longest side in pixels of the transmitted frames (default: full frames)"
+    )
+    parser.add_argument(
+        "--fps", type=int, default=None, help="target frame rate (default: value stored in the workspace config)"
+    )
+    parsed = parser.parse_args(args)
+
+    from multiwebcam.headless import serve
+
+    served = serve(
+        parsed.workspace,
+        host=parsed.host,
+        port=parsed.port,
+        thumbnail_edge=parsed.thumbnail,
+        fps_target=parsed.fps,
+    )
+
+    if not served:
+        sys.exit(1)
+
+
+def watch_parser(args):
+    parser = argparse.ArgumentParser(
+        prog="mwc watch",
+        description="Record a clip from the cameras configured in a workspace whenever there is motion or an external trigger",
+    )
+    parser.add_argument(
+        "--workspace", required=True, type=Path, help="workspace directory containing recording_config.toml"
+    )
+    parser.add_argument(
+        "--preroll", type=float, default=3, help="seconds kept before the activity began (default: 3)"
+    )
+    parser.add_argument(
+        "--postroll", type=float, default=5, help="seconds of quiet before a clip ends (default: 5)"
+    )
+    parser.add_argument(
+        "--no-motion", action="store_true", help="only record on the trigger file or socket"
+    )
+    parser.add_argument(
+        "--roi",
+        type=float,
+        nargs=4,
+        default=None,
+        metavar=("LEFT", "TOP", "RIGHT", "BOTTOM"),
+        help="region watched for motion as fractions of the frame, e.g. 0.25 0 0.75 1 (default: whole frame)",
+    )
+    parser.add_argument(
+        "--threshold", type=int, default=None, help="gray level change at which a pixel counts as moving (default: 25)"
+    )
+    parser.add_argument(
+        "--area", type=float, default=None, help="fraction of the watched region that must change to count as motion (default: 0.01)"
+    )
+    parser.add_argument(
+        "--trigger-file", type=Path, default=None, help="also record while this file exists"
+    )
+    parser.add_argument(
+        "--trigger-port", type=int, default=None, help="also listen for UDP \"start\", \"stop\" and \"pulse\" on this localhost port"
+    )
+    parser.add_argument(
+        "--duration", type=float, default=None, help="seconds to keep watching (default: until Ctrl-C)"
+    )
+    parser.add_argument(
+        "--fps", type=int, default=None, help="target frame rate (default: value stored in the workspace config)"
+    )
+    parsed = parser.parse_args(args)
+
+    if parsed.no_motion and parsed.trigger_file is None and parsed.trigger_port is None:
+        parser.error("--no-motion needs --trigger-file or --trigger-port")
+
+    from multiwebcam.headless import watch
+
+    clips = watch(
+        parsed.workspace,
+        preroll_seconds=parsed.preroll,
+        postroll_seconds=parsed.postroll,
+        motion=not parsed.no_motion,
+        roi=None if parsed.roi is None else tuple(parsed.roi),
+        pixel_threshold=parsed.threshold,
+        motion_fraction=parsed.area,
+        trigger_file=parsed.trigger_file,
+        trigger_port=parsed.trigger_port,
+        duration=parsed.duration,
+        fps_target=parsed.fps,
+    )
+
+    if clips is None:
+        sys.exit(1)
+
+    for clip in clips:
+        print(clip)
+
+
+def calibrate_clock_parser(args):
+    parser = argparse.ArgumentParser(
+        prog="mwc calibrate-clock",
+        description="Estimate the timing offset and drift of each camera configured in a workspace",
+    )
+    parser.add_argument(
+        "--workspace", required=True, type=Path, help="workspace directory containing recording_config.toml"
+    )
+    parser.add_argument(
+        "--duration", type=float, default=30, help="seconds of frames to collect (default: 30)"
+    )
+    parser.add_argument(
+        "--method",
+        choices=["events", "residuals"],
+        default="events",
+        help="events: switch the lights on and off a few times while running, and the result is saved; residuals: nothing needed in view, but the result is only reported and not saved (default: events)",
+    )
+    parser.add_argument(
+        "--fps", type=int, default=None, help="target frame rate (default: value stored in the workspace config)"
+    )
+    parsed = parser.parse_args(args)
+
+    from multiwebcam.headless import calibrate_clocks
+
+    corrections = calibrate_clocks(
+        parsed.workspace,
+        parsed.duration,
+        method=parsed.method,
+        fps_target=parsed.fps,
+    )
+
+    if corrections is None:
+        sys.exit(1)
+
+    for port, (offset, drift) in corrections.items():
+        print(f"port {port}: offset {offset * 1000:.1f} ms, drift {drift * 1e6:.1f} us/s")
+    if parsed.method == "residuals":
+        print("(reported only; recording_config.toml was not changed)")
+
+
+def latency_parser(args):
+    parser = argparse.ArgumentParser(
+        prog="mwc latency",
+        description="Measure per camera latency and skew by decoding the timestamp barcode shown by `mwc clock`, either live or from a recording",
+    )
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument(
+        "--workspace", type=Path, help="measure live from the cameras configured in this workspace"
+    )
+    source.add_argument(
+        "--recording", type=Path, help="measure from the port_N.mp4 files and frame_time_history.csv in this folder"
+    )
+    parser.add_argument(
+        "--duration", type=float, default=20, help="seconds to measure live (default: 20)"
+    )
+    parser.add_argument(
+        "--fps", type=int, default=None, help="target frame rate when live (default: value stored in the workspace config)"
+    )
+    parsed = parser.parse_args(args)
+
+    if parsed.recording is not None:
+        from multiwebcam.cameras.timestamp_barcode import analyze_recording
+
+        tracker = analyze_recording(parsed.recording)
+        tracker.save(Path(parsed.recording, "latency_samples.csv"))
+    else:
+        from multiwebcam.headless import measure_latency
+
+        tracker = measure_latency(parsed.workspace, parsed.duration, fps_target=parsed.fps)
+        if tracker is None:
+            sys.exit(1)
+
+    for port, stats in tracker.summary().items():
+        print(f"port {port}: " + ", ".join(f"{name} {value:.1f}" if isinstance(value, float) else f"{name} {value}" for name, value in stats.items()))
@@ -0,0 +1,55 @@
+"""
+A Queue that can hand over several items per call.
+
+Consumers that fall behind (e.g. a recorder catching up after a disk stall) otherwise
+pay for a lock round trip and a pass through their loop for every single item. With
+get_batch everything that is waiting (up to a limit) comes back in one list, taken
+under a single acquisition of the queue's mutex.
+"""
+
+from queue import Empty, Queue
+from time import monotonic
+
+
+class BatchQueue(Queue):
+    def get_batch(
+        self, max_items: int = None, timeout: float = None, time_budget: float = None
+    ) -> list:
+        """
+        Block until at least one item is available (raising queue.Empty if `timeout`
+        seconds pass first), then return it together with whatever else is queued,
+        up to `max_items`.
+
+        With a `time_budget`, keep collecting items as they arrive until that many
+        seconds have passed since the first one was available or `max_items` is reached.
+        """
+        with self.not_empty:
+            if timeout is None:
+                while not self._qsize():
+                    self.not_empty.wait()
+            else:
+                endtime = monotonic() + timeout
+                while not self._qsize():
+                    remaining = endtime - monotonic()
+                    if remaining <= 0.0:
+                        raise Empty
+                    self.not_empty.wait(remaining)
+
+            if time_budget is not None:
+                deadline = monotonic() + time_budget
+
+            batch = []
+            while True:
+                while self._qsize() and (max_items is None or len(batch) < max_items):
+                    batch.append(self._get())
+
+                if time_budget is None or (max_items is not None and len(batch) >= max_items):
+                    break
+                remaining = deadline - monotonic()
+                if remaining <= 0.0:
+                    break
+                self.not_empty.wait(remaining)
+
+            # wake any producers that were blocked on a bounded queue
+            self.not_full.notify(len(batch))
+            return batch
@@ -0,0 +1,163 @@
+"""
+asyncio access to frame packets and sync packets.
+
+LiveStream and Synchronizer push to subscriber queues from their own threads. Rather
+than dedicating a thread to every consumer, the hub subscribes a single bridge to each
+source. The bridge hands every packet to the event loop with call_soon_threadsafe (no
+polling) and the loop fans it out to any number of async iterators:
+
+    hub = AsyncPacketHub()  # from within a running event loop
+
+    async with hub.sync_packets(synchronizer) as sync_packets:
+        async for sync_packet in sync_packets:
+            ...
+
+    async for frame_packet in hub.frame_packets(stream):
+        ...
+
+Each subscription buffers only a few packets. A consumer that falls behind loses the
+oldest ones (counted in `dropped`) rather than holding up capture or other consumers.
+"""
+
+import multiwebcam.logger
+
+import asyncio
+from collections import deque
+
+logger = multiwebcam.logger.get(__name__)
+
+DEFAULT_MAXSIZE = 2  # packets buffered per subscription before the oldest is dropped
+
+
+class _LoopBridge:
+    """
+    Stands in for a subscriber Queue on the capture side. put() is called from the
+    stream or synchronizer thread and only schedules delivery on the event loop.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, deliver):
+        self.loop = loop
+        self.deliver = deliver
+
+    def put(self, item, block=True, timeout=None):
+        try:
+            self.loop.call_soon_threadsafe(self.deliver, item)
+        except RuntimeError:
+            # the event loop has been closed; nothing is listening anymore
+            pass
+
+    def qsize(self):
+        return 0
+
+
+class PacketSubscription:
+    """Async iterator over the packets of one source for a single consumer"""
+
+    def __init__(self, channel, maxsize: int):
+        self.channel = channel
+        self.buffer = deque(maxlen=maxsize)
+        self.ready = asyncio.Event()
+        self.dropped = 0
+        self.closed = False
+
+    def _push(self, item):
+        # runs on the event loop
+        if item is None:
+            # end of packets signaled by the source
+            self.close()
+            return
+
+        if len(self.buffer) == self.buffer.maxlen:
+            self.dropped += 1
+        self.buffer.append(item)
+        self.ready.set()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self.buffer:
+            if self.closed:
+                raise StopAsyncIteration
+            self.ready.clear()
+            await self.ready.wait()
+        return self.buffer.popleft()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.channel.remove(self)
+            self.ready.set()
+
+
+class _SourceChannel:
+    """One bridge per source, fanned out on the loop to every subscription"""
+
+    def __init__(self, hub, key, subscribe, unsubscribe):
+        self.hub = hub
+        self.key = key
+        self._subscribe = subscribe
+        self._unsubscribe = unsubscribe
+        self.subscriptions = []
+        self.bridge = _LoopBridge(hub.loop, self.dispatch)
+
+    def dispatch(self, item):
+        for subscription in list(self.subscriptions):
+            subscription._push(item)
+
+    def add(self, subscription: PacketSubscription):
+        self.subscriptions.append(subscription)
+        if len(self.subscriptions) == 1:
+            self._subscribe(self.bridge)
+
+    def remove(self, subscription: PacketSubscription):
+        if subscription in self.subscriptions:
+            self.subscriptions.remove(subscription)
+        if len(self.subscriptions) == 0:
+            # the source stops delivering to the loop once nobody is listening
+            self._unsubscribe(self.bridge)
+            self.hub.channels.pop(self.key, None)
+
+
+class AsyncPacketHub:
+    def __init__(self, loop: asyncio.AbstractEventLoop = None):
+        # created inside a coroutine the running loop is used; otherwise pass the loop
+        self.loop = loop if loop is not None else asyncio.get_running_loop()
+        self.channels = {}
+
+    def _subscribe(self, key, subscribe, unsubscribe, maxsize) -> PacketSubscription:
+        if key not in self.channels:
+            self.channels[key] = _SourceChannel(self, key, subscribe, unsubscribe)
+        channel = self.channels[key]
+
+        subscription = PacketSubscription(channel, maxsize)
+        channel.add(subscription)
+        return subscription
+
+    def frame_packets(self, stream, maxsize: int = DEFAULT_MAXSIZE) -> PacketSubscription:
+        """FramePackets from a LiveStream as they are read"""
+        logger.info(f"Adding async frame packet subscriber at port {stream.port}")
+        return self._subscribe(
+            ("stream", id(stream)), stream.subscribe, stream.unsubscribe, maxsize
+        )
+
+    def sync_packets(self, synchronizer, maxsize: int = DEFAULT_MAXSIZE) -> PacketSubscription:
+        """SyncPackets from a Synchronizer; iteration ends when the synchronizer stops"""
+        logger.info("Adding async sync packet subscriber")
+        return self._subscribe(
+            ("synchronizer", id(synchronizer)),
+            synchronizer.subscribe_to_sync_packets,
+            synchronizer.release_sync_packet_q,
+            maxsize,
+        )
+
+    def close(self):
+        for channel in list(self.channels.values()):
+            for subscription in list(channel.subscriptions):
+                subscription.close()
@@ -50,6 +50,12 @@ class Camera:
             # sets orientation in the GUI, but otherwise does not affect the frame
             self.rotation_count = 0  # +1 for each 90 degree CW rotation, -1 for CCW
 
+            # correction subtracted from frame_time: pipeline latency relative to the
+            # other cameras (seconds) and its change per second of streaming
+            # (see clock_calibration)
+            self.time_offset = 0.0
+            self.time_drift = 0.0
+
             self.set_exposure()
             self.set_default_resolution()
         else: 
@@ -77,6 +83,7 @@ class Camera:
             self.error = None
             self.matrix = None
             self.distortions = None
+            self.calibration_size = None  # (width, height) the matrix was estimated at
             self.grid_count = None
             self.translation = None
             self.rotation = None
@@ -0,0 +1,219 @@
+"""
+Estimate a per camera timing correction for frame_time.
+
+FramePacket.frame_time is taken when the grab returns, but every webcam has its own
+pipeline latency (and an exposure dependent delay), so the same moment is stamped
+later by some cameras than by others. The synchronizer then sees those ports as
+consistently late or early and skips frames that belong in a layer.
+
+For each port an offset (seconds) and drift (seconds per second of streaming) are
+estimated relative to the average of all ports and saved with the camera in
+recording_config.toml as `time_offset` and `time_drift`. LiveStream subtracts
+
+    time_offset + time_drift * (seconds since the stream started)
+
+from each frame_time as it is read.
+
+Two sources of timing residuals are supported:
+
+    "events"     a shared visual event seen by every camera, such as switching the
+                 room lights on and off or flashing a phone light in view of all of
+                 them. The frame at which each camera first sees the brightness change
+                 gives its latency relative to the others. This is the direct measure.
+
+    "residuals"  how far each port's frame_time sits from the layer average over
+                 many sync layers. Needs nothing in view, but only captures the
+                 consistent phase of each port's reads, not the true exposure latency.
+                 That phase is set by when each stream happened to start reading, so
+                 it does not carry over to the next session and is only reported,
+                 never saved.
+"""
+
+import multiwebcam.logger
+
+from queue import Empty
+from time import perf_counter
+
+import numpy as np
+
+logger = multiwebcam.logger.get(__name__)
+
+METHODS = ("events", "residuals")
+SAVED_METHODS = ("events",)  # methods whose estimates are folded into the saved corrections
+EVENT_BRIGHTNESS_JUMP = 25  # change in mean gray level (0-255) between frames that marks an event
+EVENT_MATCH_WINDOW = 0.5  # seconds; detections of one event must fall within this of each other
+MIN_EVENTS_FOR_DRIFT = 3  # fewer matched events only support an offset
+MIN_RESIDUAL_LAYERS = 30
+
+
+def fit_offset_drift(times: np.ndarray, residuals: np.ndarray, fit_drift: bool = True) -> tuple:
+    """
+    Least squares residual = offset + drift * times, with times measured from the
+    start of the stream. Returns (offset, drift).
+    """
+    times = np.asarray(times, dtype=np.float64)
+    residuals = np.asarray(residuals, dtype=np.float64)
+    if len(residuals) == 0:
+        return 0.0, 0.0
+    if not fit_drift or len(residuals) < 2 or np.ptp(times) == 0:
+        return float(np.mean(residuals)), 0.0
+    drift, offset = np.polyfit(times, residuals, 1)
+    return float(offset), float(drift)
+
+
+def residual_estimate(ports: tuple, frame_times: np.ndarray, origins: dict) -> dict:
+    """
+    frame_times: (layers x ports) as in SyncPacket.frame_times, nan where dropped.
+    Each present frame's residual from the mean of its layer is fit over the time
+    since that port's stream started (origins).
+    """
+    frame_times = np.asarray(frame_times, dtype=np.float64)
+    counts = np.sum(~np.isnan(frame_times), axis=1)
+    usable = frame_times[counts >= 2]
+    if len(usable) < MIN_RESIDUAL_LAYERS:
+        raise ValueError(
+            f"Only {len(usable)} layers with two or more frames; need {MIN_RESIDUAL_LAYERS}"
+        )
+
+    layer_means = np.nanmean(usable, axis=1, keepdims=True)
+    residuals = usable - layer_means
+
+    estimates = {}
+    for column, port in enumerate(ports):
+        present = ~np.isnan(residuals[:, column])
+        estimates[port] = fit_offset_drift(
+            layer_means[present, 0] - origins[port], residuals[present, column]
+        )
+    return estimates
+
+
+def detect_events(frame_times: np.ndarray, brightness: np.ndarray, jump: float = EVENT_BRIGHTNESS_JUMP) -> np.ndarray:
+    """
+    frame_times of frames whose mean brightness changed by more than `jump` from the
+    previous frame (lights on or off); only the first frame of a change is reported
+    """
+    frame_times = np.asarray(frame_times, dtype=np.float64)
+    brightness = np.asarray(brightness, dtype=np.float64)
+    changes = np.abs(np.diff(brightness)) > jump
+    # a change spread over two frames should only count once
+    onsets = changes & ~np.concatenate(([False], changes[:-1]))
+    return frame_times[1:][onsets]
+
+
+def event_estimate(event_times: dict, origins: dict) -> dict:
+    """
+    event_times: {port: detection times}. Events are matched across ports by
+    proximity; each matched event contributes one residual per port from the mean
+    detection time of that event.
+    """
+    ports = list(event_times.keys())
+    reference_port = max(ports, key=lambda port: len(event_times[port]))
+
+    matched = []
+    for reference_time in event_times[reference_port]:
+        detections = {}
+        for port in ports:
+            times = np.asarray(event_times[port])
+            if len(times) == 0:
+                break
+            nearest = times[np.argmin(np.abs(times - reference_time))]
+            if abs(nearest - reference_time) > EVENT_MATCH_WINDOW:
+                break
+            detections[port] = nearest
+        else:
+            matched.append(detections)
+
+    if not matched:
+        raise ValueError("No event was seen by every camera")
+    logger.info(f"{len(matched)} events seen by all cameras")
+
+    fit_drift = len(matched) >= MIN_EVENTS_FOR_DRIFT
+    estimates = {}
+    for port in ports:
+        event_means = np.array([np.mean(list(event.values())) for event in matched])
+        residuals = np.array([event[port] for event in matched]) - event_means
+        estimates[port] = fit_offset_drift(event_means - origins[port], residuals, fit_drift)
+    return estimates
+
+
+class ClockCalibrator:
+    """
+    Collects sync packets from a running Synchronizer for a while and estimates the
+    timing correction of each port. Brightness for event detection is taken from the
+    thumbnail stream variant so the full frames are never scanned.
+    """
+
+    def __init__(self, synchronizer, method: str = "events"):
+        if method not in METHODS:
+            raise ValueError(f"Unknown clock calibration method {method!r}; expected one of {METHODS}")
+        self.synchronizer = synchronizer
+        self.method = method
+        self.ports = synchronizer.port_order
+
+    def collect(self, duration: float):
+        """Gather layers for `duration` seconds; returns (frame_times, brightness) arrays"""
+        sync_packet_q = self.synchronizer.subscribe_to_sync_packets()
+        frame_times = []
+        brightness = []
+        start = perf_counter()
+        ended = False
+        try:
+            while not ended and perf_counter() - start < duration:
+                try:
+                    batch = sync_packet_q.get_batch(timeout=1)
+                except Empty:
+                    continue
+                for sync_packet in batch:
+                    if sync_packet is None:
+                        ended = True
+                        break
+                    frame_times.append(sync_packet.frame_times)
+                    if self.method == "events":
+                        brightness.append(self.layer_brightness(sync_packet))
+        finally:
+            self.synchronizer.release_sync_packet_q(sync_packet_q)
+
+        logger.info(f"Collected {len(frame_times)} sync layers for clock calibration")
+        return np.array(frame_times).reshape(-1, len(self.ports)), np.array(brightness)
+
+    def layer_brightness(self, sync_packet) -> np.ndarray:
+        values = np.full(len(self.ports), np.nan)
+        for row in np.flatnonzero(sync_packet.present):
+            values[row] = sync_packet.packets[row].variant("thumbnail").mean()
+        return values
+
+    def run(self, duration: float) -> dict:
+        """{port: (offset, drift)} measured against the corrections already in place"""
+        frame_times, brightness = self.collect(duration)
+        if len(frame_times) == 0:
+            raise ValueError("No sync layers were received")
+        # drift is applied relative to when each stream began reading
+        origins = {
+            port: self.synchronizer.streams[port].clock_origin for port in self.ports
+        }
+
+        if self.method == "residuals":
+            return residual_estimate(self.ports, frame_times, origins)
+
+        event_times = {}
+        for column, port in enumerate(self.ports):
+            present = ~np.isnan(frame_times[:, column])
+            event_times[port] = detect_events(
+                frame_times[present, column], brightness[present, column]
+            )
+            logger.info(f"Detected {len(event_times[port])} brightness events at port {port}")
+        return event_estimate(event_times, origins)
+
+
+def apply_estimates(cameras: dict, estimates: dict):
+    """
+    Fold new estimates into the cameras' corrections. The frames measured already
+    had the existing correction applied, so the estimates are added to it.
+    """
+    for port, (offset, drift) in estimates.items():
+        camera = cameras[port]
+        camera.time_offset = camera.time_offset + offset
+        camera.time_drift = camera.time_drift + drift
+        logger.info(
+            f"Port {port}: time offset {camera.time_offset * 1000:.1f} ms, drift {camera.time_drift * 1e6:.1f} us/s"
+        )
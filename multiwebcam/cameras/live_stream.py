@@ -17,6 +17,9 @@ from multiwebcam.interface import FramePacket
 
 logger = multiwebcam.logger.get(__name__)
 
+RECONNECT_TIMEOUT = 10  # seconds to wait for the worker to carry out a reopen
+RECONFIGURE_TIMEOUT = 10  # seconds change_resolution waits for the worker to apply a change
+
 class LiveStream():
     def __init__(self, camera: Camera, fps_target: int = 6):
         self.camera: Camera = camera
@@ -27,14 +30,27 @@ class LiveStream():
         # list of queues that will have frame packets pushed to them
         self.subscribers = []
 
-        # make sure camera no longer reading before trying to change resolution
+        # confirms the worker has wrapped up once stop_event is set
         self.stop_confirm = Queue()
 
+        # mode changes requested from other threads; applied by the worker between frames
+        self.reconfigure_q = Queue()
+
+        # health tracking read by the StreamWatchdog; while `recovering` is set the
+        # worker stops reading and instead carries out the reopen requests queued by
+        # the watchdog, so the capture is only ever touched from this one thread
+        self.last_good_read = perf_counter()
+        self.consecutive_failures = 0
+        self.recovering = Event()
+        self.reconnect_q = Queue()
+        self.target_size = camera.size
+
         self._show_fps = False  # used for testing
 
 
         self.set_fps_target(fps_target)
         self.FPS_actual = 0
+        self.clock_origin = perf_counter()
         # Start the thread to read frames from the video stream
         self.thread = Thread(target=self._play_worker, args=(), daemon=True)
         self.thread.start()
@@ -128,12 +144,28 @@ class LiveStream():
         """
         self.frame_index = 0
         self.start_time = perf_counter()  # used to get initial delta_t for FPS
+        # drift in the camera's timing correction accumulates from here
+        self.clock_origin = self.start_time
         first_time = True
         while not self.stop_event.is_set():
             if first_time:
                 logger.info(f"Camera now rolling at port {self.port}")
                 first_time = False
 
+            if self.recovering.is_set():
+                # the watchdog has declared the device failed and asks for reopens;
+                # a new resolution is just noted, and the reopen picks it up
+                if not self.reconfigure_q.empty():
+                    self._defer_reconfiguration()
+                if not self.reconnect_q.empty():
+                    self._handle_reconnect()
+                else:
+                    sleep(0.1)
+                continue
+
+            if not self.reconfigure_q.empty():
+                self._apply_reconfiguration()
+
             if self.camera.capture.isOpened():
                 # slow wait if not pushing frames
                 # this is a sub-optimal busy wait spin lock, but it works and I'm tired.
@@ -144,9 +176,14 @@ class LiveStream():
                     if not spinlock_looped:
                         logger.info(f"Spinlock initiated at port {self.port}")
                         spinlock_looped = True
+                    # mode changes are still applied while nobody is subscribed
+                    if not self.reconfigure_q.empty():
+                        self._apply_reconfiguration()
                     sleep(0.5)
                 if spinlock_looped == True:
                     logger.info(f"Spinlock released at port {self.port}")
+                    # no reads were attempted while idle, so don't let that look like a stall
+                    self.last_good_read = perf_counter()
 
                 # Wait an appropriate amount of time to hit the frame rate target
                 sleep(self.wait_to_next_frame())
@@ -156,7 +193,18 @@ class LiveStream():
                 self.success, self.frame = self.camera.capture.retrieve()
 
                 read_stop = perf_counter()
-                self.frame_time = (read_start + read_stop) / 2
+                read_time = (read_start + read_stop) / 2
+                # shift onto a common timeline with the other cameras (see clock_calibration)
+                self.frame_time = read_time - (
+                    self.camera.time_offset
+                    + self.camera.time_drift * (read_time - self.clock_origin)
+                )
+
+                if self.success:
+                    self.last_good_read = read_stop
+                    self.consecutive_failures = 0
+                else:
+                    self.consecutive_failures += 1
 
                 if self.success and len(self.subscribers) > 0:
                     # logger.info(f"Pushing frame to reel at port {self.port}")
@@ -175,6 +223,9 @@ class LiveStream():
                         fps = self.FPS_actual
                     )
 
+                    # reduced resolution variants are not made here; the first consumer
+                    # to ask for one builds it on its own thread and the rest share it
+
                     # cv2.imshow(str(self.port), frame_packet.frame_with_points)
                     # key = cv2.waitKey(1)
                     # if key == ord("q"):
@@ -185,33 +236,142 @@ class LiveStream():
                         q.put(frame_packet)
 
                 self.frame_index +=1
+            else:
+                # device released out from under the stream; wait for the watchdog
+                sleep(0.1)
 
         logger.info(f"Stream stopped at port {self.port}")
         self.stop_event.clear()
         self.stop_confirm.put("Successful Stop")
 
-    def change_resolution(self, res):
-        logger.info(f"About to stop camera at port {self.port}")
-        self.stop_event.set()
-        self.stop_confirm.get()
-        logger.info(f"Roll camera stop confirmed at port {self.port}")
+    def change_resolution(self, res, wait: bool = True, timeout: float = RECONFIGURE_TIMEOUT):
+        """
+        Queue a resolution change for the running worker, which applies it between
+        frames. The capture device is only reopened if the backend does not take the
+        new size on the open device. Returns once applied unless wait is False, or
+        after timeout if the worker is held up in a read (the change is still applied
+        once it gets to it).
+        """
+        logger.info(f"Queueing change of resolution at port {self.port} to {res}")
+        applied = Event()
+        self.reconfigure_q.put((tuple(res), applied))
+
+        if wait:
+            start = perf_counter()
+            while not applied.wait(timeout=0.5):
+                if not self.thread.is_alive():
+                    # no worker to pick the change up, so apply it here
+                    self._apply_reconfiguration()
+                elif perf_counter() - start > timeout:
+                    logger.warning(
+                        f"Resolution change at port {self.port} not applied after {timeout} s; continuing without waiting"
+                    )
+                    return
+
+    def _defer_reconfiguration(self):
+        """While recovering the device may be gone, so the size is only recorded for the reopen"""
+        while not self.reconfigure_q.empty():
+            res, applied = self.reconfigure_q.get()
+            self.target_size = res
+            logger.info(f"Port {self.port} is reconnecting; it will reopen at {res}")
+            applied.set()
+
+    def _apply_reconfiguration(self):
+        """Called by the worker between frames (or directly if the worker has ended)"""
+        while not self.reconfigure_q.empty():
+            res, applied = self.reconfigure_q.get()
+            start = perf_counter()
+            self.target_size = res
+
+            self.camera.size = res
+            if not self._resolution_took(res):
+                # some backends only honor a new size on a freshly opened device
+                logger.info(f"Resolution change did not take on open device at port {self.port}; reopening")
+                self.camera.disconnect()
+                self.camera.connect()
+                self._restore_capture_settings()
+
+            self.FPS_actual = 0
+            self.avg_delta_time = None
+            self.last_good_read = perf_counter()
+            logger.info(
+                f"Resolution at port {self.port} now {self.camera.size}; change took {(perf_counter() - start) * 1000:.0f} ms"
+            )
+            applied.set()
 
-        self.FPS_actual = 0
-        self.avg_delta_time = None
-
-        # reconnecting a few times without disconnnect sometimes crashed python
-        logger.info(f"Disconnecting from port {self.port}")
-        self.camera.disconnect()
-        logger.info(f"Reconnecting to port {self.port}")
-        self.camera.connect()
-
-        self.camera.size = res
-        # Spin up the thread again now that resolution is changed
-        logger.info(
-            f"Beginning roll_camera thread at port {self.port} with resolution {res}"
-        )
-        self.thread = Thread(target=self._play_worker, args=(), daemon=True)
-        self.thread.start()
+    def _restore_capture_settings(self):
+        """
+        A freshly opened capture comes up on driver defaults, so reapply what Camera
+        set up when it first connected. The size is the last one requested, as a
+        dropped device no longer reports its own.
+        """
+        self.camera.capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        self.camera.size = self.target_size
+        self.camera.exposure = self.camera.exposure
+
+    def _resolution_took(self, res) -> bool:
+        if self.camera.size != tuple(res):
+            return False
+        # frames already buffered at the old size are discarded along the way
+        success, frame = self.camera.capture.read()
+        return success and (frame.shape[1], frame.shape[0]) == tuple(res)
+
+    def reconnect(self, timeout: float = RECONNECT_TIMEOUT) -> bool:
+        """
+        Ask the worker to reopen the capture device with the current settings. The
+        worker does it between reads, so the capture is never released while a grab
+        is still in progress on it. Returns True once a frame is read from the reopened
+        device; False if that failed, or if the worker did not get to it within timeout
+        (i.e. it is still blocked in a grab on the failed device).
+        """
+        result = []
+        done = Event()
+        self.reconnect_q.put((result, done))
+
+        if not self.thread.is_alive():
+            # no worker to carry it out
+            self._handle_reconnect()
+
+        if not done.wait(timeout):
+            logger.warning(
+                f"Stream worker at port {self.port} has not returned from its last read; not reopening yet"
+            )
+            return False
+        return result[0]
+
+    def _handle_reconnect(self):
+        """Called by the worker while recovering; requests that piled up share one reopen"""
+        requests = []
+        while not self.reconnect_q.empty():
+            requests.append(self.reconnect_q.get())
+        if not requests:
+            return
+
+        success = self._reopen()
+        for result, done in requests:
+            result.append(success)
+            done.set()
+
+    def _reopen(self) -> bool:
+        logger.info(f"Attempting to reconnect camera at port {self.port}")
+        try:
+            self.camera.disconnect()
+            self.camera.connect()
+            if not self.camera.capture.isOpened():
+                return False
+
+            self._restore_capture_settings()
+            success, _ = self.camera.capture.read()
+        except Exception:
+            logger.exception(f"Reconnect attempt failed at port {self.port}")
+            return False
+
+        if success:
+            self.consecutive_failures = 0
+            self.last_good_read = perf_counter()
+            self.FPS_actual = 0
+            self.avg_delta_time = None
+        return success
 
     def _add_fps(self):
         """NOTE: this is used in F5 test, not in external use"""
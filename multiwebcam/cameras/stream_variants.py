@@ -0,0 +1,64 @@
+"""
+Named, reduced resolution versions of a stream's frames.
+
+Consumers that only need a small image (previews, network thumbnails, analytics)
+ask a FramePacket for a variant rather than each scaling down the full frame on its
+own. A variant is made by the first consumer to ask for it, on that consumer's
+thread so the capture thread is never held up scaling frames, and cached on the
+FramePacket that every subscriber shares.
+
+    full        the frame as captured
+    half        half width and height
+    thumbnail   longer side of THUMBNAIL_EDGE pixels
+
+Each variant is made from the smallest one already available that is still larger,
+so a thumbnail following a half variant only scales down the half frame.
+"""
+
+import cv2
+import numpy as np
+
+VARIANTS = ("full", "half", "thumbnail")
+THUMBNAIL_EDGE = 320
+
+
+def variant_size(frame_size: tuple, name: str) -> tuple:
+    """(width, height) of the variant for frames of the given (width, height)"""
+    width, height = frame_size
+    if name == "full":
+        return (width, height)
+    if name == "half":
+        return (max(1, width // 2), max(1, height // 2))
+    if name == "thumbnail":
+        scale = min(1, THUMBNAIL_EDGE / max(width, height))
+        return (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+    raise ValueError(f"Unknown stream variant {name!r}; expected one of {VARIANTS}")
+
+
+def covering_variant(frame_size: tuple, edge_length: int) -> str:
+    """Smallest variant whose longer side is still at least edge_length"""
+    for name in reversed(VARIANTS):
+        if max(variant_size(frame_size, name)) >= edge_length:
+            return name
+    return "full"
+
+
+def make_variant(frame: np.ndarray, name: str, available: dict = None) -> np.ndarray:
+    """
+    Scale frame down to the named variant. available holds variants already made
+    for this frame; the smallest of them that is larger than the target is used as
+    the source.
+    """
+    frame_size = (frame.shape[1], frame.shape[0])
+    size = variant_size(frame_size, name)
+    if size == frame_size:
+        return frame
+
+    source = frame
+    if available:
+        for candidate in VARIANTS[VARIANTS.index(name) - 1 :: -1]:
+            if candidate in available:
+                source = available[candidate]
+                break
+
+    return cv2.resize(source, size, interpolation=cv2.INTER_AREA)
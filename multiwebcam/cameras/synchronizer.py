@@ -8,11 +8,76 @@ from queue import Queue
 from threading import Thread, Event
 
 import numpy as np
+from multiwebcam.batch_queue import BatchQueue
+from multiwebcam.cameras.watchdog import StreamWatchdog
 from multiwebcam.interface import SyncPacket
 
 logger = multiwebcam.logger.get(__name__)
 
 DROPPED_FRAME_TRACK_WINDOW = 100 # trailing frames tracked for reporting purposes
+SKIPPED_FRAME_LOG_INTERVAL = 5 # seconds; skipped frame warnings are rate limited per call site
+
+
+class DroppedFrameTracker:
+    """
+    Rolling and cumulative dropped frame counts per port.
+
+    The trailing window is a fixed (ports x window) circular matrix of 0/1 entries
+    with a running sum per port: each layer overwrites one column and adjusts the sums
+    by the difference, so recording a layer and asking for the rates are both
+    constant time regardless of the window length.
+    """
+
+    def __init__(self, ports, window: int = DROPPED_FRAME_TRACK_WINDOW):
+        self.ports = sorted(ports)
+        self.window = window
+
+        self.history = np.zeros((len(self.ports), window), dtype=np.int64)
+        self.window_sums = np.zeros(len(self.ports), dtype=np.int64)
+        self.totals = np.zeros(len(self.ports), dtype=np.int64)
+        self.layer_dropped = np.zeros(len(self.ports), dtype=np.int64)
+
+        self.next_column = 0
+        self.layer_count = 0
+
+    def record_layer(self, present: np.ndarray):
+        """present is a sync packet's presence mask, in the same (sorted) port order"""
+        np.logical_not(present, out=self.layer_dropped, casting="unsafe")
+        self.update(self.layer_dropped)
+
+    def update(self, dropped: np.ndarray):
+        """dropped holds 1/0 for each port, in sorted port order"""
+        column = self.next_column
+        self.window_sums += dropped - self.history[:, column]
+        self.history[:, column] = dropped
+        self.totals += dropped
+
+        self.next_column = (column + 1) % self.window
+        self.layer_count += 1
+
+    @property
+    def dropped_fps(self) -> dict:
+        """Fraction of layers dropped by each port over the trailing window"""
+        filled = min(self.layer_count, self.window)
+        if filled == 0:
+            return {}
+        rates = self.window_sums / filled
+        return {port: float(rate) for port, rate in zip(self.ports, rates)}
+
+    @property
+    def cumulative_dropped(self) -> dict:
+        """Total dropped frames for each port since the tracker was created"""
+        return {port: int(total) for port, total in zip(self.ports, self.totals)}
+
+    @property
+    def cumulative_dropped_fraction(self) -> dict:
+        if self.layer_count == 0:
+            return {}
+        return {
+            port: float(total) / self.layer_count
+            for port, total in zip(self.ports, self.totals)
+        }
+
 
 class Synchronizer:
     def __init__(self, streams: dict):
@@ -37,8 +102,16 @@ class Synchronizer:
         self.subscribed_to_streams = False # not subscribed yet
         self.subscribe_to_streams()
 
-        # place to store a recent history of dropped frames
-        self.dropped_frame_history = {port:[] for port in sorted(self.ports)} 
+        # fixed port order shared by every sync packet
+        self.port_order = tuple(sorted(self.ports))
+
+        # recent and session-long history of dropped frames
+        self.dropped_frame_tracker = DroppedFrameTracker(self.port_order)
+
+        # ports the watchdog has reported as failed are left out of layers until
+        # they deliver frames again; restored ports rejoin at their newest frame
+        self.missing_ports = set()
+        self.restore_marks = {}
         
         self.initialize_ledgers()
         self.start()
@@ -48,19 +121,19 @@ class Synchronizer:
             stream.set_tracking_on(track)
     
     def update_dropped_frame_history(self):
-        current_dropped:dict = self.current_sync_packet.dropped    
-        
-        for port, dropped in current_dropped.items():
-            self.dropped_frame_history[port].append(dropped)
-            self.dropped_frame_history[port] = self.dropped_frame_history[port][-DROPPED_FRAME_TRACK_WINDOW:]
+        self.dropped_frame_tracker.record_layer(self.current_sync_packet.present)
 
     @property 
     def dropped_fps(self):
         """
         Averages dropped frame count across the observed history
         """
+        return self.dropped_frame_tracker.dropped_fps
 
-        return {port:np.mean(drop_history) for port,drop_history in self.dropped_frame_history.items() if len(drop_history) >0}        
+    @property
+    def cumulative_dropped_frames(self):
+        """Dropped frame totals per port for the life of the synchronizer"""
+        return self.dropped_frame_tracker.cumulative_dropped
 
         
     def subscribe_to_streams(self):
@@ -75,11 +148,43 @@ class Synchronizer:
             stream.unsubscribe(self.frame_packet_queues[port])
         self.subscribed_to_streams = False
 
-    def stop(self):
+    def stop(self, timeout: float = None):
+        """
+        timeout bounds the wait on each thread; a harvester only sees the stop once its
+        stream delivers another frame, so streams should still be running when called
+        """
         self.stop_event.set()
-        self.thread.join()
+        self.thread.join(timeout)
+        self.watchdog.thread.join(timeout)
         for t in self.threads:
-            t.join()
+            t.join(timeout)
+
+    def mark_port_missing(self, port):
+        logger.warning(f"Synchronizer continuing without port {port}")
+        self.restore_marks.pop(port, None)
+        self.missing_ports.add(port)
+
+    def mark_port_restored(self, port):
+        # frames harvested up to now predate the outage; wait for a fresh one
+        self.restore_marks[port] = self.port_frame_count[port]
+
+    def active_ports(self) -> list:
+        return [port for port in self.ports if port not in self.missing_ports]
+
+    def rejoin_restored_ports(self):
+        for port, mark in list(self.restore_marks.items()):
+            newest_index = self.port_frame_count[port] - 1
+            if newest_index < mark:
+                continue
+
+            # discard what was left over from before the outage
+            for index in range(self.port_current_frame[port], newest_index):
+                self.all_frame_packets.pop(f"{port}_{index}", None)
+            self.port_current_frame[port] = newest_index
+
+            self.restore_marks.pop(port, None)
+            self.missing_ports.discard(port)
+            logger.info(f"Port {port} rejoining synchronization at frame {newest_index}")
 
     def initialize_ledgers(self):
 
@@ -97,14 +202,28 @@ class Synchronizer:
             self.threads.append(t)
         logger.info("Frame harvesters just submitted")
 
+        self.watchdog = StreamWatchdog(
+            self.streams,
+            on_missing=self.mark_port_missing,
+            on_restored=self.mark_port_restored,
+            stop_event=self.stop_event,
+        )
+
         logger.info("Starting frame synchronizer...")
         self.thread = Thread(target=self.synch_frames_worker, args=(), daemon=True)
         self.thread.start()
 
 
-    def subscribe_to_sync_packets(self, q):
+    def subscribe_to_sync_packets(self, q=None):
+        """
+        Any Queue can subscribe. If none is provided a BatchQueue is created, so the
+        subscriber can pull several layers at a time with `get_batch`. Returns the queue.
+        """
+        if q is None:
+            q = BatchQueue(-1)
         logger.info("Adding queue to receive synched frames")
         self.synched_frames_subscribers.append(q)
+        return q
 
     def release_sync_packet_q(self, q):
         logger.info("Releasing record queue")
@@ -122,8 +241,12 @@ class Synchronizer:
             self.all_frame_packets[f"{port}_{frame_index}"] = frame_packet
             self.port_frame_count[port] += 1
 
+            # hot loop: lazy %-style arguments so nothing is formatted unless debugging
             logger.debug(
-                f"Frame data harvested from reel {frame_packet.port} with index {frame_index} and frame time of {frame_packet.frame_time}"
+                "Frame data harvested from reel %s with index %s and frame time of %s",
+                frame_packet.port,
+                frame_index,
+                frame_packet.frame_time,
             )
 
         logger.info(f"Frame harvester for port {port} completed")
@@ -133,23 +256,32 @@ class Synchronizer:
         """Looks at next unassigned frame across the ports to determine
         the earliest time at which each of them was read"""
         times_of_next_frames = []
-        for p in self.ports:
+        for p in self.active_ports():
             next_index = self.port_current_frame[p] + 1
             frame_data_key = f"{p}_{next_index}"
 
             # problem with outpacing the threads reading data in, so wait if need be
             while frame_data_key not in self.all_frame_packets.keys():
+                if p in self.missing_ports:
+                    # reported by the watchdog while waiting on it
+                    break
                 logger.debug(
-                    f"Waiting in a loop for frame data to populate with key: {frame_data_key}"
+                    "Waiting in a loop for frame data to populate with key: %s",
+                    frame_data_key,
                 )
                 if self.subscribed_to_streams:
                     time.sleep(0.1)
                 else:
                     # provide infrequent updates of busy waiting
-                    if int(time.time()) % 10 ==0:
-                        logger.info("Synchronizer not subscribed to any streams and busy waiting...")
+                    logger.info(
+                        "Synchronizer not subscribed to any streams and busy waiting...",
+                        extra={"rate_limit": 10},
+                    )
                     time.sleep(1)
-                    
+
+            if p in self.missing_ports:
+                continue
+
             next_frame_time = self.all_frame_packets[frame_data_key].frame_time
 
             if next_frame_time == -1:
@@ -163,27 +295,28 @@ class Synchronizer:
             if p != port:
                 times_of_next_frames.append(next_frame_time)
 
-        return min(times_of_next_frames)
+        # with no other ports (e.g. the rest are missing) nothing can displace this frame
+        return min(times_of_next_frames, default=np.inf)
 
     def latest_current_frame(self, port):
         """Provides the latest frame_time of the current frames not inclusive of the provided port"""
         times_of_current_frames = []
-        for p in self.ports:
+        for p in self.active_ports():
             current_index = self.port_current_frame[p]
             frame_data_key = f"{p}_{current_index}"
             current_frame_time = self.all_frame_packets[frame_data_key].frame_time
             if p != port:
                 times_of_current_frames.append(current_frame_time)
 
-        return max(times_of_current_frames)
+        return max(times_of_current_frames, default=-np.inf)
 
     def frame_slack(self):
         """Determine how many unassigned frames are sitting in self.dataframe"""
         slack = [
             self.port_frame_count[port] - self.port_current_frame[port]
-            for port in self.ports
+            for port in self.active_ports()
         ]
-        logger.debug(f"Slack in frames is {slack}")
+        logger.debug("Slack in frames is %s", slack)
         return min(slack)
 
     def average_fps(self):
@@ -206,21 +339,34 @@ class Synchronizer:
         logger.info("About to start synchronizing frames...")
         while not self.stop_event.is_set():
 
-            current_frame_packets = {}
-
-            layer_frame_times = []
+            # per port values of the layer, positioned according to self.port_order
+            layer_packets = [None] * len(self.port_order)
+            frame_times = np.full(len(self.port_order), np.nan)
+            frame_indices = np.full(len(self.port_order), -1, dtype=np.int64)
+            present = np.zeros(len(self.port_order), dtype=bool)
 
             # build earliest next/latest current dictionaries for each port to determine where to put frames
             # must be done before going in and making any updates to the frame index
             earliest_next = {}
             latest_current = {}
 
-            for port in self.ports:
+            self.rejoin_restored_ports()
+            active_ports = self.active_ports()
+            if not active_ports:
+                # every camera is down; wait for the watchdog to bring one back
+                time.sleep(0.1)
+                continue
+
+            for port in active_ports:
                 earliest_next[port] = self.earliest_next_frame(port)
                 latest_current[port] = self.latest_current_frame(port)
                 current_frame_index = self.port_current_frame[port]
 
-            for port in self.ports:
+            for row, port in enumerate(self.port_order):
+                if port not in earliest_next or port in self.missing_ports:
+                    # left out of the layer while its camera is reconnecting
+                    continue
+
                 current_frame_index = self.port_current_frame[port]
 
                 port_index_key = f"{port}_{current_frame_index}"
@@ -230,35 +376,52 @@ class Synchronizer:
                 # don't put a frame in a synched frame packet if the next packet has a frame before it
                 if frame_time > earliest_next[port]:
                     # definitly should be put in the next layer and not this one
-                    current_frame_packets[port] = None
-                    logger.warning(f"Skipped frame at port {port}: > earliest_next")
+                    logger.warning(
+                        "Skipped frame at port %s: > earliest_next",
+                        port,
+                        extra={"rate_limit": SKIPPED_FRAME_LOG_INTERVAL},
+                    )
                 elif (
                     earliest_next[port] - frame_time < frame_time - latest_current[port]
                 ):  # frame time is closer to earliest next than latest current
                     # if it's closer to the earliest next frame than the latest current frame, bump it up
                     # only applying for 2 camera setup where I noticed this was an issue (frames stay out of synch)
-                    current_frame_packets[port] = None
                     logger.warning(
-                        f"Skipped frame at port {port}: delta < time-latest_current"
+                        "Skipped frame at port %s: delta < time-latest_current",
+                        port,
+                        extra={"rate_limit": SKIPPED_FRAME_LOG_INTERVAL},
                     )
                 else:
                     # add the data and increment the index
-                    current_frame_packets[port] = self.all_frame_packets.pop(
-                        port_index_key
-                    )
+                    layer_packets[row] = self.all_frame_packets.pop(port_index_key)
+                    frame_times[row] = frame_time
+                    frame_indices[row] = current_frame_packet.frame_index
+                    present[row] = True
                     # frame_packets[port]["sync_index"] = sync_index
                     self.port_current_frame[port] += 1
-                    layer_frame_times.append(frame_time)
                     logger.debug(
-                        f"Adding to layer from port {port} at index {current_frame_index} and frame time: {frame_time}"
+                        "Adding to layer from port %s at index %s and frame time: %s",
+                        port,
+                        current_frame_index,
+                        frame_time,
                     )
 
-            logger.debug(f"Unassigned Frames: {len(self.all_frame_packets)}")
-
-            self.mean_frame_times.append(np.mean(layer_frame_times))
-
-            logger.debug(f"Updating sync packet for sync_index {sync_index}")
-            self.current_sync_packet = SyncPacket(sync_index, current_frame_packets)
+            logger.debug("Unassigned Frames: %s", len(self.all_frame_packets))
+
+            if present.any():
+                self.mean_frame_times.append(frame_times[present].mean())
+            else:
+                self.mean_frame_times.append(np.nan)
+
+            logger.debug("Updating sync packet for sync_index %s", sync_index)
+            self.current_sync_packet = SyncPacket(
+                sync_index,
+                self.port_order,
+                tuple(layer_packets),
+                frame_times,
+                frame_indices,
+                present,
+            )
             
             self.update_dropped_frame_history()
             
@@ -271,8 +434,10 @@ class Synchronizer:
             for q in self.synched_frames_subscribers:
                 q.put(self.current_sync_packet)
                 if self.current_sync_packet is not None:
-                    logger.debug(f"Placing new synched frames packet on queue with {self.current_sync_packet.frame_packet_count} frames")
-                    logger.debug(f"Placing new synched frames with index {self.current_sync_packet.sync_index}")
+                    logger.debug(
+                        "Placing new synched frames with index %s",
+                        self.current_sync_packet.sync_index,
+                    )
                     
                     # provide infrequent notice of synchronizer activity
                     if self.current_sync_packet.sync_index % 100 == 0:
@@ -0,0 +1,335 @@
+"""
+Machine readable timestamps for measuring glass-to-glass latency.
+
+The clock widget (`mwc clock`) shows perf_counter() as a grid of black and white
+cells. Point the cameras at the screen: every frame then carries the time it was
+displayed, and decoding it gives each camera's latency (frame_time minus displayed
+time, which includes the display's own lag) and the skew between cameras within a
+sync layer.
+
+Layout, in cells, from the outside in:
+
+    white quiet zone (1 cell) | black border (1 cell) | GRID_ROWS x GRID_COLUMNS data
+
+The data grid holds an orientation mark (top left cell black, the other three
+corners white) and then, row by row, DATA_BITS bits of the timestamp in units of
+TIMESTAMP_RESOLUTION seconds followed by one even parity bit per PARITY_GROUP bits.
+The timestamp is Gray coded, so a frame exposed while the screen was redrawing
+reads as one of the two neighbouring times rather than something far off.
+
+The decoder finds the border as a dark quadrilateral, undoes the perspective,
+samples every cell, and accepts the read only if the border, orientation mark and
+parity all check out. Cameras turned on their side are handled by trying the four
+rotations.
+"""
+
+import multiwebcam.logger
+
+import csv
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+logger = multiwebcam.logger.get(__name__)
+
+GRID_ROWS = 6
+GRID_COLUMNS = 8
+DATA_BITS = 40
+PARITY_GROUP = 10
+TIMESTAMP_RESOLUTION = 1e-4  # seconds per count; 40 bits cover about 3.5 years of perf_counter
+
+# data cells in reading order, skipping the four corners used for orientation
+CORNERS = {(0, 0), (0, GRID_COLUMNS - 1), (GRID_ROWS - 1, 0), (GRID_ROWS - 1, GRID_COLUMNS - 1)}
+DATA_CELLS = [
+    (row, column)
+    for row in range(GRID_ROWS)
+    for column in range(GRID_COLUMNS)
+    if (row, column) not in CORNERS
+]
+PARITY_BITS = DATA_BITS // PARITY_GROUP
+assert DATA_BITS + PARITY_BITS <= len(DATA_CELLS)
+
+MIN_BARCODE_AREA = 900  # pixels; smaller dark quadrilaterals are not considered
+SAMPLE_SIZE = 10  # pixels per cell once the barcode is warped to a canonical square grid
+
+
+def to_gray_code(value: int) -> int:
+    return value ^ (value >> 1)
+
+
+def from_gray_code(gray: int) -> int:
+    value = gray
+    shift = gray >> 1
+    while shift:
+        value ^= shift
+        shift >>= 1
+    return value
+
+
+def encode_bits(timestamp: float) -> list:
+    """The DATA_BITS + PARITY_BITS cell values (1 = black) for a perf_counter time"""
+    count = int(round(timestamp / TIMESTAMP_RESOLUTION)) % (1 << DATA_BITS)
+    gray = to_gray_code(count)
+    bits = [(gray >> (DATA_BITS - 1 - i)) & 1 for i in range(DATA_BITS)]
+    parity = [
+        sum(bits[group * PARITY_GROUP : (group + 1) * PARITY_GROUP]) % 2
+        for group in range(PARITY_BITS)
+    ]
+    return bits + parity
+
+
+def decode_bits(bits: list) -> float | None:
+    """Inverse of encode_bits; None if any parity group fails"""
+    data = bits[:DATA_BITS]
+    parity = bits[DATA_BITS : DATA_BITS + PARITY_BITS]
+    for group in range(PARITY_BITS):
+        if sum(data[group * PARITY_GROUP : (group + 1) * PARITY_GROUP]) % 2 != parity[group]:
+            return None
+
+    gray = 0
+    for bit in data:
+        gray = (gray << 1) | int(bit)
+    return from_gray_code(gray) * TIMESTAMP_RESOLUTION
+
+
+def barcode_cells(timestamp: float) -> np.ndarray:
+    """GRID_ROWS x GRID_COLUMNS array of cell values (1 = black) including the orientation mark"""
+    cells = np.zeros((GRID_ROWS, GRID_COLUMNS), dtype=np.uint8)
+    cells[0, 0] = 1
+    for (row, column), bit in zip(DATA_CELLS, encode_bits(timestamp)):
+        cells[row, column] = bit
+    return cells
+
+
+def render_barcode(timestamp: float, cell_size: int = 24) -> np.ndarray:
+    """Grayscale image of the barcode for timestamp, quiet zone included"""
+    cells = np.ones((GRID_ROWS + 4, GRID_COLUMNS + 4), dtype=np.uint8)  # 1 = black
+    cells[0, :] = cells[-1, :] = 0
+    cells[:, 0] = cells[:, -1] = 0
+    cells[2:-2, 2:-2] = barcode_cells(timestamp)
+
+    image = np.where(cells == 1, 0, 255).astype(np.uint8)
+    return np.kron(image, np.ones((cell_size, cell_size), dtype=np.uint8))
+
+
+def order_corners(points: np.ndarray) -> np.ndarray:
+    """top left, top right, bottom right, bottom left"""
+    points = points.reshape(4, 2).astype(np.float32)
+    sums = points.sum(axis=1)
+    differences = np.diff(points, axis=1).ravel()
+    return np.array(
+        [
+            points[np.argmin(sums)],
+            points[np.argmin(differences)],
+            points[np.argmax(sums)],
+            points[np.argmax(differences)],
+        ],
+        dtype=np.float32,
+    )
+
+
+def candidate_quads(gray: np.ndarray) -> list:
+    """Dark convex quadrilaterals in the image, largest first"""
+    _, dark = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    # every contour rather than only the outermost: a dim background can come out as
+    # dark too, and the barcode is then nested within it
+    contours, _ = cv2.findContours(dark, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+
+    quads = []
+    for contour in contours:
+        area = cv2.contourArea(contour)
+        if area < MIN_BARCODE_AREA:
+            continue
+        approx = cv2.approxPolyDP(contour, 0.03 * cv2.arcLength(contour, True), True)
+        if len(approx) == 4 and cv2.isContourConvex(approx):
+            quads.append((area, approx))
+    quads.sort(key=lambda quad: quad[0], reverse=True)
+    return [approx for area, approx in quads]
+
+
+def sample_cells(gray: np.ndarray, quad: np.ndarray) -> np.ndarray | None:
+    """
+    Warp the bordered grid to a canonical image and return the (GRID_ROWS + 2) x
+    (GRID_COLUMNS + 2) cell values (1 = dark), or None if the cells are ambiguous
+    """
+    rows, columns = GRID_ROWS + 2, GRID_COLUMNS + 2
+    # which side is which is settled later by the orientation mark, so a portrait
+    # looking quad is warped onto a portrait grid
+    corners = order_corners(quad)
+    top = np.linalg.norm(corners[1] - corners[0])
+    side = np.linalg.norm(corners[3] - corners[0])
+    if side > top:
+        rows, columns = columns, rows
+
+    width, height = columns * SAMPLE_SIZE, rows * SAMPLE_SIZE
+    target = np.array([[0, 0], [width, 0], [width, height], [0, height]], dtype=np.float32)
+    warp = cv2.getPerspectiveTransform(corners, target)
+    warped = cv2.warpPerspective(gray, warp, (width, height))
+
+    # mean of the central part of each cell, away from blurry edges
+    margin = SAMPLE_SIZE // 4
+    blocks = warped.reshape(rows, SAMPLE_SIZE, columns, SAMPLE_SIZE)
+    means = blocks[:, margin:-margin, :, margin:-margin].mean(axis=(1, 3))
+
+    low, high = means.min(), means.max()
+    if high - low < 40:
+        return None
+    return (means < (low + high) / 2).astype(np.uint8)
+
+
+def read_cells(cells: np.ndarray) -> float | None:
+    """Timestamp from sampled cells (border included), trying each rotation"""
+    for rotation in range(4):
+        rotated = np.rot90(cells, rotation)
+        if rotated.shape != (GRID_ROWS + 2, GRID_COLUMNS + 2):
+            continue
+        border = np.concatenate([rotated[0, :], rotated[-1, :], rotated[:, 0], rotated[:, -1]])
+        if not border.all():
+            return None
+
+        grid = rotated[1:-1, 1:-1]
+        marks = [grid[row, column] for row, column in sorted(CORNERS)]
+        if marks != [1, 0, 0, 0]:
+            continue
+
+        bits = [grid[row, column] for row, column in DATA_CELLS]
+        return decode_bits(bits)
+    return None
+
+
+def decode_barcode(frame: np.ndarray) -> float | None:
+    """The perf_counter time shown in the frame, or None if no barcode is readable"""
+    if frame.ndim == 3:
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    else:
+        gray = frame
+
+    for quad in candidate_quads(gray):
+        cells = sample_cells(gray, quad)
+        if cells is None:
+            continue
+        timestamp = read_cells(cells)
+        if timestamp is not None:
+            return timestamp
+    return None
+
+
+class LatencyTracker:
+    """
+    Accumulates decoded timestamps against frame times. Latency is frame_time minus
+    the displayed time, per port; skew is each port's displayed time minus the mean
+    displayed time of its sync layer.
+    """
+
+    def __init__(self):
+        self.samples = []  # (sync_index, port, frame_time, displayed_time)
+        self.unreadable = {}
+
+    def add(self, port, frame_time: float, frame: np.ndarray, sync_index: int = None):
+        displayed_time = decode_barcode(frame)
+        if displayed_time is None:
+            self.unreadable[port] = self.unreadable.get(port, 0) + 1
+        else:
+            self.samples.append((sync_index, port, frame_time, displayed_time))
+        return displayed_time
+
+    def add_sync_packet(self, sync_packet):
+        for row in np.flatnonzero(sync_packet.present):
+            frame_packet = sync_packet.packets[row]
+            self.add(
+                frame_packet.port, frame_packet.frame_time, frame_packet.frame, sync_packet.sync_index
+            )
+
+    def latencies(self) -> dict:
+        latencies = {}
+        for sync_index, port, frame_time, displayed_time in self.samples:
+            latencies.setdefault(port, []).append(frame_time - displayed_time)
+        return {port: np.array(values) for port, values in latencies.items()}
+
+    def skews(self) -> dict:
+        layers = {}
+        for sync_index, port, frame_time, displayed_time in self.samples:
+            if sync_index is not None:
+                layers.setdefault(sync_index, {})[port] = displayed_time
+
+        skews = {}
+        for displayed in layers.values():
+            if len(displayed) < 2:
+                continue
+            layer_mean = np.mean(list(displayed.values()))
+            for port, displayed_time in displayed.items():
+                skews.setdefault(port, []).append(displayed_time - layer_mean)
+        return {port: np.array(values) for port, values in skews.items()}
+
+    def summary(self) -> dict:
+        """{port: {statistic: value}} with latency and skew in milliseconds"""
+        latencies = self.latencies()
+        skews = self.skews()
+        ports = sorted(set(latencies) | set(self.unreadable))
+
+        summary = {}
+        for port in ports:
+            stats = {
+                "decoded": len(latencies.get(port, [])),
+                "unreadable": self.unreadable.get(port, 0),
+            }
+            stats.update(distribution("latency", latencies.get(port)))
+            stats.update(distribution("skew", skews.get(port)))
+            summary[port] = stats
+        return summary
+
+    def save(self, path: Path):
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["sync_index", "port", "frame_time", "displayed_time", "latency"])
+            for sync_index, port, frame_time, displayed_time in self.samples:
+                writer.writerow(
+                    [sync_index, port, frame_time, displayed_time, frame_time - displayed_time]
+                )
+
+
+def distribution(name: str, values: np.ndarray | None) -> dict:
+    if values is None or len(values) == 0:
+        return {}
+    values = values * 1000
+    return {
+        f"{name}_mean_ms": float(np.mean(values)),
+        f"{name}_median_ms": float(np.median(values)),
+        f"{name}_std_ms": float(np.std(values)),
+        f"{name}_p5_ms": float(np.percentile(values, 5)),
+        f"{name}_p95_ms": float(np.percentile(values, 95)),
+    }
+
+
+def analyze_recording(recording_directory: Path) -> LatencyTracker:
+    """
+    Decode the barcode in every frame of the port_N.mp4 files of a recording and
+    pair it with the frame's time in frame_time_history.csv (frames are written to
+    each video in order of frame time)
+    """
+    recording_directory = Path(recording_directory)
+    history = {}
+    with open(Path(recording_directory, "frame_time_history.csv")) as f:
+        for row in csv.DictReader(f):
+            history.setdefault(int(row["port"]), []).append(
+                (float(row["frame_time"]), int(row["sync_index"]))
+            )
+
+    tracker = LatencyTracker()
+    for port, rows in sorted(history.items()):
+        video_path = Path(recording_directory, f"port_{port}.mp4")
+        if not video_path.exists():
+            logger.warning(f"No video found for port {port} at {video_path}")
+            continue
+
+        logger.info(f"Decoding timestamps in {video_path}")
+        capture = cv2.VideoCapture(str(video_path))
+        for frame_time, sync_index in sorted(rows):
+            success, frame = capture.read()
+            if not success:
+                break
+            tracker.add(port, frame_time, frame, sync_index)
+        capture.release()
+
+    return tracker
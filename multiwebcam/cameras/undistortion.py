@@ -0,0 +1,186 @@
+"""
+Lens undistortion with precomputed remap tables.
+
+cv2.undistort recomputes the undistortion mapping for every frame. Here the mapping
+is computed once with initUndistortRectifyMap for a given calibration, frame size and
+output size, and each frame then costs a single cv2.remap. Because the output size is
+part of the key, a preview can be undistorted and downscaled to thumbnail size in that
+same remap, without first producing a full resolution corrected frame.
+
+Maps are looked up by the calibration values themselves, so they are rebuilt as soon as
+the camera's matrix/distortions or the frame resolution change. The calibration holds
+for the resolution it was made at (the camera's calibration_size). Other resolutions
+with the same aspect ratio are taken to be the same field of view and use a scaled
+matrix; a different aspect ratio usually means the driver crops the sensor, so frames
+at that size are left uncorrected.
+"""
+
+import multiwebcam.logger
+
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+logger = multiwebcam.logger.get(__name__)
+
+MAP_CACHE_SIZE = 4  # (calibration, frame size, output size) combinations kept per camera
+ASPECT_TOLERANCE = 0.01  # difference in width/height below which two resolutions share a field of view
+
+
+def calibration_key(matrix, distortions) -> tuple:
+    return (
+        np.asarray(matrix, dtype=np.float64).tobytes(),
+        np.asarray(distortions, dtype=np.float64).tobytes(),
+    )
+
+
+def build_undistortion_maps(
+    matrix, distortions, frame_size: tuple, output_size: tuple = None
+) -> tuple:
+    """
+    Maps from each pixel of the (width, height) output back into the distorted frame.
+    When output_size differs from frame_size the camera matrix is scaled to match,
+    so that the remap also performs the resize.
+    """
+    matrix = np.asarray(matrix, dtype=np.float64)
+    distortions = np.asarray(distortions, dtype=np.float64)
+    if output_size is None:
+        output_size = frame_size
+
+    scale = np.array(
+        [
+            [output_size[0] / frame_size[0], 0, 0],
+            [0, output_size[1] / frame_size[1], 0],
+            [0, 0, 1],
+        ]
+    )
+    output_matrix = scale @ matrix
+
+    # fixed point maps are the fastest for remap
+    return cv2.initUndistortRectifyMap(
+        matrix, distortions, None, output_matrix, output_size, cv2.CV_16SC2
+    )
+
+
+class Undistorter:
+    """
+    Undistorts frames from one camera. Not shared across threads; each consumer
+    (preview emitter, recorder) keeps its own.
+    """
+
+    def __init__(self, camera):
+        self.camera = camera
+        self.maps = OrderedDict()
+        self.uncovered_sizes = set()  # frame sizes already warned about
+
+    @property
+    def calibrated(self) -> bool:
+        return (
+            getattr(self.camera, "matrix", None) is not None
+            and getattr(self.camera, "distortions", None) is not None
+        )
+
+    def invalidate(self):
+        self.maps.clear()
+        self.uncovered_sizes.clear()
+
+    def frame_matrix(self, frame_size: tuple) -> np.ndarray | None:
+        """
+        The camera matrix for frames of frame_size, scaled from the calibration
+        resolution when only the scale differs; None if the aspect ratio differs
+        """
+        matrix = np.asarray(self.camera.matrix, dtype=np.float64)
+        calibration_size = getattr(self.camera, "calibration_size", None)
+        if calibration_size is None or tuple(calibration_size) == tuple(frame_size):
+            return matrix
+
+        calibrated_aspect = calibration_size[0] / calibration_size[1]
+        if abs(frame_size[0] / frame_size[1] - calibrated_aspect) > ASPECT_TOLERANCE:
+            return None
+
+        scale = np.array(
+            [
+                [frame_size[0] / calibration_size[0], 0, 0],
+                [0, frame_size[1] / calibration_size[1], 0],
+                [0, 0, 1],
+            ]
+        )
+        return scale @ matrix
+
+    def get_maps(self, frame_size: tuple, output_size: tuple = None) -> tuple | None:
+        """None when the calibration does not apply to frames of this size"""
+        key = (
+            calibration_key(self.camera.matrix, self.camera.distortions),
+            tuple(frame_size),
+            None if output_size is None else tuple(output_size),
+        )
+        if key in self.maps:
+            self.maps.move_to_end(key)
+        else:
+            matrix = self.frame_matrix(frame_size)
+            if matrix is None:
+                if tuple(frame_size) not in self.uncovered_sizes:
+                    self.uncovered_sizes.add(tuple(frame_size))
+                    logger.warning(
+                        f"Calibration at port {self.camera.port} was made at {tuple(self.camera.calibration_size)}; frames of {tuple(frame_size)} have a different aspect ratio and are not undistorted"
+                    )
+                self.maps[key] = None
+            else:
+                logger.info(
+                    f"Building undistortion maps at port {self.camera.port} for frames of {frame_size} output at {output_size or frame_size}"
+                )
+                self.maps[key] = build_undistortion_maps(
+                    matrix, self.camera.distortions, frame_size, output_size
+                )
+            if len(self.maps) > MAP_CACHE_SIZE:
+                self.maps.popitem(last=False)
+        return self.maps[key]
+
+    def undistort(
+        self,
+        frame: np.ndarray,
+        output_size: tuple = None,
+        out: np.ndarray = None,
+        interpolation: int = cv2.INTER_LINEAR,
+    ) -> np.ndarray:
+        """
+        Undistort frame, optionally straight to a different (width, height) and into a
+        preallocated `out`. Frames the calibration does not cover (none saved, or a
+        different aspect ratio) are returned as they are (or resized if an output size
+        is given).
+        """
+        frame_size = (frame.shape[1], frame.shape[0])
+        maps = self.get_maps(frame_size, output_size) if self.calibrated else None
+        if maps is None:
+            if output_size is None or tuple(output_size) == frame_size:
+                if out is None:
+                    return frame
+                np.copyto(out, frame)
+                return out
+            return cv2.resize(frame, output_size, dst=out, interpolation=cv2.INTER_AREA)
+
+        map1, map2 = maps
+        return cv2.remap(frame, map1, map2, interpolation, dst=out)
+
+
+class UndistortingWriter:
+    """
+    Wraps a frame writer (cv2.VideoWriter, RawFrameWriter) so frames are undistorted
+    on the write stage worker just before being written. The corrected frame goes
+    into a reused buffer because the wrapped writer is done with it once write returns.
+    """
+
+    def __init__(self, writer, undistorter: Undistorter):
+        self.writer = writer
+        self.undistorter = undistorter
+        self.buffer = None
+
+    def write(self, frame: np.ndarray, *args):
+        if self.buffer is None or self.buffer.shape != frame.shape:
+            self.buffer = np.empty_like(frame)
+        corrected = self.undistorter.undistort(frame, out=self.buffer)
+        self.writer.write(corrected, *args)
+
+    def release(self):
+        self.writer.release()
@@ -0,0 +1,114 @@
+"""
+Health monitoring for live camera streams.
+
+A LiveStream whose device stops delivering (failed grabs, a USB drop, a driver that
+blocks in grab) otherwise goes quiet without complaint, and the Synchronizer waits on
+it indefinitely. The watchdog checks each stream's last good read against a deadline.
+A port that misses it is reported missing, so the remaining cameras keep producing
+sync layers, and reopen attempts are made with exponential backoff. Each attempt is
+carried out by the stream's own worker between reads (LiveStream.reconnect), never
+from the watchdog, so the capture is not released while a grab is still running on
+it. Once a frame is read again the port is reported restored.
+"""
+
+import multiwebcam.logger
+
+from threading import Event, Thread
+from time import perf_counter
+
+logger = multiwebcam.logger.get(__name__)
+
+STALL_DEADLINE = 2.0  # seconds without a good read before a port is considered failed
+CHECK_INTERVAL = 0.25  # seconds between health checks
+RECONNECT_BACKOFF_INITIAL = 0.5  # seconds before the first reconnect attempt
+RECONNECT_BACKOFF_MAX = 10.0  # ceiling on the wait between attempts
+
+
+class StreamWatchdog:
+    def __init__(
+        self,
+        streams: dict,
+        on_missing=None,
+        on_restored=None,
+        stop_event: Event = None,
+        deadline: float = STALL_DEADLINE,
+    ):
+        """
+        streams: {port: stream}; only streams that can reconnect (LiveStream) are
+            watched, so recorded playback streams are ignored
+        on_missing/on_restored: called with the port from the watchdog threads
+        stop_event: shared event that ends monitoring and any reconnect attempts
+        """
+        self.streams = {
+            port: stream for port, stream in streams.items() if hasattr(stream, "reconnect")
+        }
+        self.on_missing = on_missing
+        self.on_restored = on_restored
+        self.stop_event = stop_event if stop_event is not None else Event()
+        self.deadline = deadline
+
+        self.recovery_threads = {}
+        self.reconnect_counts = {port: 0 for port in self.streams}
+
+        self.thread = Thread(target=self._watch_worker, args=(), daemon=True)
+        self.thread.start()
+
+    @property
+    def health(self) -> dict:
+        """{port: "ok" | "recovering"}"""
+        return {
+            port: "recovering" if stream.recovering.is_set() else "ok"
+            for port, stream in self.streams.items()
+        }
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+    def port_deadline(self, stream) -> float:
+        # a slow frame rate target must not read as a stall
+        return max(self.deadline, 3 / max(stream.fps_target, 1))
+
+    def _watch_worker(self):
+        logger.info(f"Watchdog monitoring streams at ports {list(self.streams.keys())}")
+        while not self.stop_event.wait(CHECK_INTERVAL):
+            now = perf_counter()
+            for port, stream in self.streams.items():
+                if stream.recovering.is_set() or len(stream.subscribers) == 0:
+                    continue
+
+                silence = now - stream.last_good_read
+                if silence > self.port_deadline(stream):
+                    logger.warning(
+                        f"No good frame from port {port} in {silence:.1f} s "
+                        f"({stream.consecutive_failures} failed reads); treating it as missing"
+                    )
+                    stream.recovering.set()
+                    if self.on_missing is not None:
+                        self.on_missing(port)
+
+                    self.recovery_threads[port] = Thread(
+                        target=self._recover, args=(port, stream), daemon=True
+                    )
+                    self.recovery_threads[port].start()
+
+        logger.info("Watchdog stopped")
+
+    def _recover(self, port, stream):
+        delay = RECONNECT_BACKOFF_INITIAL
+        attempt = 0
+        while not self.stop_event.wait(delay):
+            attempt += 1
+            if stream.reconnect():
+                self.reconnect_counts[port] += 1
+                logger.info(f"Camera at port {port} reconnected after {attempt} attempt(s)")
+                if self.on_restored is not None:
+                    self.on_restored(port)
+                stream.recovering.clear()
+                return
+
+            delay = min(delay * 2, RECONNECT_BACKOFF_MAX)
+            logger.info(f"Reconnect attempt {attempt} failed at port {port}; next in {delay:.1f} s")
+
+        # shutting down mid recovery; let the stream worker wind down normally
+        stream.recovering.clear()
@@ -2,16 +2,26 @@
 
 import multiwebcam.logger
 
+import atexit
+import os
 from pathlib import Path
 from datetime import datetime
 from os.path import exists
+from threading import Event, Lock, Thread
 import rtoml
 
-from multiwebcam.cameras.camera import Camera, CAMERA_BACKENDS
 from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+# the camera module pulls in OpenCV, so it is only imported when cameras are loaded
+if TYPE_CHECKING:
+    from multiwebcam.cameras.camera import Camera
 
 logger = multiwebcam.logger.get(__name__)
 
+# changes made within this window of the first one are written out together
+SAVE_DEBOUNCE_SECONDS = 0.5
+
 
 class Configurator:
     """
@@ -23,6 +33,15 @@ class Configurator:
         self.workspace_path = workspace_path
         self.config_toml_path = Path(self.workspace_path, "recording_config.toml")
 
+        # saves are requested from GUI and capture threads but the file is written
+        # on a background thread, with a burst of changes coalesced into one write
+        self.save_requested = Event()
+        self.write_lock = Lock()
+        self.stop_event = Event()
+        self.persist_thread = Thread(target=self._persist_worker, args=(), daemon=True)
+        self.persist_thread.start()
+        atexit.register(self.flush)
+
         if exists(self.config_toml_path):
             self.refresh_config_from_toml()
             # this check only included for interfacing with historical tests...
@@ -40,6 +59,7 @@ class Configurator:
             self.dict["multicam_render_fps"] = 6
 
             self.update_config_toml()
+            self.flush()
 
 
     def save_camera_count(self, count):
@@ -60,6 +80,18 @@ class Configurator:
     def get_fps_target(self):
         return self.dict["fps"]
 
+    def get_mosaic_preview(self):
+        # optional setting; composite the multicam preview into a single image
+        return self.dict.get("mosaic_preview", False)
+
+    def get_preroll_seconds(self):
+        # optional setting; seconds before the record button that recordings include
+        return self.dict.get("preroll_seconds", 0)
+
+    def get_preroll_jpeg_quality(self):
+        # optional setting; hold preroll frames JPEG compressed at this quality to save memory
+        return self.dict.get("preroll_jpeg_quality", None)
+
 
     def save_fps(self,fps_target):
         self.dict["fps"] = fps_target
@@ -68,19 +100,64 @@ class Configurator:
 
     def refresh_config_from_toml(self):
         logger.info("Populating config dictionary with config.toml data")
+        # anything not yet written would otherwise be lost
+        if hasattr(self, "dict"):
+            self.flush()
         # with open(self.config_toml_path, "r") as f:
         self.dict = rtoml.load(self.config_toml_path)
 
 
     def update_config_toml(self):
-        # alphabetize by key to maintain standardized layout
-        sorted_dict = {key: value for key, value in sorted(self.dict.items())}
-        self.dict = sorted_dict
-
-        with open(self.config_toml_path, "w") as f:
-            rtoml.dump(self.dict, f)
-
-    def save_camera(self, camera: Camera):
+        """
+        Request that the current config be saved. Returns immediately; the write
+        happens on the background thread shortly after. Use flush() to write now.
+        """
+        self.save_requested.set()
+
+    def flush(self):
+        """Write any pending changes immediately on the calling thread"""
+        # held across the check as well as the write so that a flush from another
+        # thread (or atexit) cannot interleave with the background writer
+        with self.write_lock:
+            if self.save_requested.is_set():
+                self.save_requested.clear()
+                self._write_config_toml()
+
+    def close(self):
+        """Write any pending changes and end the background writer"""
+        self.stop_event.set()
+        self.persist_thread.join()
+        self.flush()
+        atexit.unregister(self.flush)
+
+    def _persist_worker(self):
+        while not self.stop_event.is_set():
+            if not self.save_requested.wait(timeout=0.5):
+                continue
+            # let further changes within the window accumulate into a single write
+            if self.stop_event.wait(SAVE_DEBOUNCE_SECONDS):
+                break  # close() flushes whatever is pending
+            self.flush()
+
+    def _write_config_toml(self):
+        """Only called from flush(), with write_lock held"""
+        try:
+            # alphabetize by key to maintain standardized layout
+            sorted_dict = {key: value for key, value in sorted(self.dict.copy().items())}
+            config_text = rtoml.dumps(sorted_dict)
+
+            # written to a temporary file first and swapped in, so the config on
+            # disk is never left half written
+            temp_path = self.config_toml_path.with_name(self.config_toml_path.name + ".tmp")
+            with open(temp_path, "w") as f:
+                f.write(config_text)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.config_toml_path)
+        except Exception:
+            logger.exception(f"Failed to save config to {self.config_toml_path}")
+
+    def save_camera(self, camera: "Camera"):
 
         params = {
             "port": camera.port,
@@ -89,14 +166,29 @@ class Configurator:
             "rotation_count": camera.rotation_count,
             "ignore": camera.ignore,
             "verified_resolutions": camera.verified_resolutions,
-            "backend": camera.backend
+            "backend": camera.backend,
+            "time_offset": camera.time_offset,
+            "time_drift": camera.time_drift,
         }
 
+        # calibration is only stored once the camera has one
+        # (numpy is already loaded by the camera module at this point)
+        import numpy as np
+
+        if getattr(camera, "matrix", None) is not None and getattr(camera, "distortions", None) is not None:
+            params["matrix"] = [list(map(float, row)) for row in camera.matrix]
+            params["distortions"] = [float(value) for value in np.ravel(camera.distortions)]
+            if getattr(camera, "calibration_size", None) is not None:
+                params["calibration_size"] = [int(value) for value in camera.calibration_size]
+
         self.dict["cam_" + str(camera.port)] = params
         self.update_config_toml()
 
 
-    def get_cameras(self) -> dict[int, Camera]:
+    def get_cameras(self) -> dict[int, "Camera"]:
+        import numpy as np
+        from multiwebcam.cameras.camera import Camera
+
         cameras = {}
 
         def add_preconfigured_cam(params:dict):
@@ -114,6 +206,14 @@ class Configurator:
                 camera = Camera(port=port, verified_resolutions=verified_resolutions, backend=backend)
                 camera.rotation_count = params["rotation_count"]
                 camera.exposure = params["exposure"]
+                # configs saved before timing corrections existed won't have them
+                camera.time_offset = params.get("time_offset", 0.0)
+                camera.time_drift = params.get("time_drift", 0.0)
+                if "matrix" in params and "distortions" in params:
+                    camera.matrix = np.array(params["matrix"], dtype=np.float64)
+                    camera.distortions = np.array(params["distortions"], dtype=np.float64)
+                    # a calibration entered without its size is taken to match the saved resolution
+                    camera.calibration_size = tuple(params.get("calibration_size", params["size"])[0:2])
                 cameras[port] = camera 
                 
         with ThreadPoolExecutor() as executor:
@@ -4,7 +4,7 @@ from pathlib import Path
 from threading import Thread
 
 from PySide6.QtCore import Qt
-from PySide6.QtGui import QIcon
+from PySide6.QtGui import QIcon, QPixmap
 from PySide6.QtWidgets import (
     QApplication,
     QWidget,
@@ -181,8 +181,9 @@ class CameraConfigTab(QWidget):
         else:
             self.fps_display.setText("reconnecting to camera...")
 
-    def image_update(self, qpixmap):
-        self.frame_display.setPixmap(qpixmap)
+    def image_update(self, qimage):
+        # the emitter renders at display size already so this is the only copy made
+        self.frame_display.setPixmap(QPixmap.fromImage(qimage))
 
     def enable_recording(self):
         self.record_btn.setText("Record")
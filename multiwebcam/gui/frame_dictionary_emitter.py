@@ -1,178 +1,269 @@
-from time import sleep
+from time import sleep, perf_counter
 from threading import Event
+import math
 import numpy as np
 
-import cv2
 from PySide6.QtCore import Signal, QThread
 from PySide6.QtGui import QImage
 
 from multiwebcam.cameras.synchronizer import Synchronizer
-from multiwebcam.interface import FramePacket
+from multiwebcam.cameras.stream_variants import covering_variant
+from multiwebcam.gui.thumbnail_renderer import ThumbnailRenderer
+from multiwebcam.cameras.undistortion import Undistorter
+from multiwebcam.gui.preview_governor import PreviewGovernor
 import multiwebcam.logger
 
 logger = multiwebcam.logger.get(__name__)
 
 class FrameDictionaryEmitter(QThread):
     ThumbnailImagesBroadcast = Signal(dict)
+    MosaicBroadcast = Signal(QImage)
     dropped_fps = Signal(dict)
 
-    def __init__(self, synchronizer: Synchronizer, render_fps,  single_frame_height=300):
+    def __init__(
+        self,
+        synchronizer: Synchronizer,
+        render_fps,
+        single_frame_height=300,
+        mosaic=False,
+        governor: PreviewGovernor = None,
+    ):
+        """
+        mosaic: rather than a dictionary of per-port thumbnails, composite all of them into
+        a single image laid out in a grid. One image (and one repaint) per tick scales
+        better on rigs with many cameras.
+
+        governor: when provided, the render rate and thumbnail size are scaled back
+        (or rendering paused) while capture or recording is under pressure
+        """
         super(FrameDictionaryEmitter, self).__init__()
         self.single_frame_height = single_frame_height
         self.synchronizer = synchronizer
         self.render_fps = render_fps
+        self.mosaic = mosaic
+        self.governor = governor
+
+        # when set, thumbnails of calibrated cameras are undistorted as they are scaled down
+        self.undistort = False
+        self.undistorters = {
+            port: Undistorter(stream.camera) for port, stream in self.synchronizer.streams.items()
+        }
+
+        # stream variant each port's thumbnail is rendered from
+        self.port_variants = {}
+
+        self.build_renderers(self.single_frame_height)
+
         logger.info("Initiated recording frame emitter")
         self.keep_collecting = Event()
         self.start()
 
+    def build_renderers(self, edge_length: int):
+        """
+        Each port renders into its own reused canvas, and a QImage is built over each
+        canvas only once. Rebuilt whenever the thumbnail size changes.
+        """
+        self.edge_length = edge_length
+        self.renderers = {
+            port: ThumbnailRenderer(edge_length) for port in self.synchronizer.ports
+        }
+        self.canvas_qimages = {}
+
+        # what was last drawn, so unchanged ports can be skipped
+        self.last_sync_index = None
+        self.rendered_states = {}
+
+        if self.mosaic:
+            self.build_mosaic()
+
     def update_render_fps(self,fps):
         self.render_fps = fps 
+
+    def build_mosaic(self):
+        """
+        Layout is computed once, matching the grid used by the multicamera widget,
+        and the mosaic buffer is preallocated
+        """
+        edge = self.edge_length
+        self.tile_positions = mosaic_layout(self.synchronizer.ports)
+        rows = max(row for row, column in self.tile_positions.values()) + 1
+        columns = max(column for row, column in self.tile_positions.values()) + 1
+
+        self.mosaic_buffer = np.zeros((rows * edge, columns * edge, 3), dtype=np.uint8)
+
+        # tile views are fixed so they are built once as well
+        self.mosaic_tiles = {
+            port: self.mosaic_buffer[row * edge : (row + 1) * edge, column * edge : (column + 1) * edge]
+            for port, (row, column) in self.tile_positions.items()
+        }
+
+        # what each tile currently holds
+        self.tile_states = {}
+
+    def port_render_state(self, row):
+        """
+        The frame to draw for the port at `row` of the sync packet along with a key
+        describing what would be drawn. If the key matches what was last drawn, the
+        cached thumbnail can be reused.
+        """
+        sync_packet = self.current_sync_packet
+        port = sync_packet.ports[row]
+        rotation_count = self.synchronizer.streams[port].camera.rotation_count
+
+        if not sync_packet.present[row]:
+            return None, (None, rotation_count, self.undistort)
+        else:
+            frame_key = (int(sync_packet.frame_indices[row]), float(sync_packet.frame_times[row]))
+            frame_packet = sync_packet.packets[row]
+            frame = frame_packet.variant(self.port_variant(port, frame_packet.frame))
+            return frame, (frame_key, rotation_count, self.undistort)
+
+    def port_variant(self, port, full_frame) -> str:
+        if self.undistort and self.undistorters[port].calibrated:
+            # the calibration describes full resolution frames
+            variant = "full"
+        else:
+            frame_size = (full_frame.shape[1], full_frame.shape[0])
+            variant = covering_variant(frame_size, self.edge_length)
+
+        self.port_variants[port] = variant
+        return variant
+
+    def port_undistorter(self, port):
+        if self.undistort and self.port_variants.get(port) == "full":
+            return self.undistorters[port]
+        return None
+
+    def render_mosaic(self):
+        changed = False
+        for row, port in enumerate(self.current_sync_packet.ports):
+            frame, state = self.port_render_state(row)
+            if state == self.tile_states.get(port):
+                continue  # the tile already holds this thumbnail
+
+            rotation_count = state[1]
+            self.renderers[port].render(
+                frame,
+                rotation_count,
+                label=str(port),
+                out=self.mosaic_tiles[port],
+                undistorter=self.port_undistorter(port),
+            )
+            self.tile_states[port] = state
+            changed = True
+
+        if changed:
+            # copied so the GUI never paints from the buffer while it is being drawn into
+            self.MosaicBroadcast.emit(self.qimage_over(self.mosaic_buffer).copy())
+
+    def render_thumbnails(self):
+        # only ports with a new frame (or rotation) are re-rendered and emitted;
+        # the display keeps showing the previous thumbnail for the rest
+        thumbnail_qimage = {}
+        for row, port in enumerate(self.current_sync_packet.ports):
+            frame, state = self.port_render_state(row)
+            if state == self.rendered_states.get(port):
+                continue
+
+            rotation_count = state[1]
+            canvas = self.renderers[port].render(
+                frame, rotation_count, label=str(port), undistorter=self.port_undistorter(port)
+            )
+            # the GUI thread paints from the image later, after this canvas may have
+            # been drawn over again, so what is emitted is a copy
+            thumbnail_qimage[str(port)] = self.qimage_over(canvas).copy()
+            self.rendered_states[port] = state
+
+        if thumbnail_qimage:
+            self.ThumbnailImagesBroadcast.emit(thumbnail_qimage)
+
     def run(self):
         self.keep_collecting.set()
 
         while self.keep_collecting.is_set():
-            sleep(1 / self.render_fps)
+            if self.governor is None:
+                sleep(1 / self.render_fps)
+            else:
+                level = self.governor.update()
+                if level.paused:
+                    sleep(1 / self.render_fps)
+                    continue
+                sleep(1 / (self.render_fps * level.fps_scale))
+
+                edge_length = int(self.single_frame_height * level.size_scale)
+                if edge_length != self.edge_length:
+                    logger.info(f"Rebuilding thumbnail renderers at {edge_length} pixels")
+                    self.build_renderers(edge_length)
+
             logger.debug("About to get next recording frame")
             # recording_frame = self.unpaired_frame_builder.get_recording_frame()
 
             logger.debug("Referencing current sync packet in synchronizer")
-            self.current_sync_packet = self.synchronizer.current_sync_packet
+            sync_packet = self.synchronizer.current_sync_packet
 
-            thumbnail_qimage = {}
-            for port in self.synchronizer.ports:
-                frame_packet = self.current_sync_packet.frame_packets[port]
-                rotation_count = self.synchronizer.streams[port].camera.rotation_count
+            # nothing new from the synchronizer since the last tick so nothing to draw
+            if sync_packet is None or sync_packet.sync_index == self.last_sync_index:
+                continue
 
-                text_frame = frame_packet_2_thumbnail(
-                    frame_packet, rotation_count, self.single_frame_height, port
-                )
-                q_image = cv2_to_qimage(text_frame)
-                thumbnail_qimage[str(port)] = q_image
+            self.current_sync_packet = sync_packet
+            self.last_sync_index = sync_packet.sync_index
 
-            self.ThumbnailImagesBroadcast.emit(thumbnail_qimage)
+            render_start = perf_counter()
+            if self.mosaic:
+                self.render_mosaic()
+            else:
+                self.render_thumbnails()
+            if self.governor is not None:
+                self.governor.report_render_time(perf_counter() - render_start)
 
             dropped_fps_dict = {
                 str(port): dropped
                 for port, dropped in self.synchronizer.dropped_fps.items()
             }
             self.dropped_fps.emit(dropped_fps_dict)
-        logger.info("Recording thumbnail emitter run thread ended...")
-
-
-def frame_packet_2_thumbnail(
-    frame_packet: FramePacket, rotation_count: int, edge_length: int, port: int
-):
-    raw_frame = get_frame_or_blank(frame_packet, edge_length)
-    # port = frame_packet.port
-
-    # raw_frame = self.get_frame_or_blank(None)
-    square_frame = resize_to_square(raw_frame, edge_length)
-    rotated_frame = apply_rotation(square_frame, rotation_count)
-    flipped_frame = cv2.flip(rotated_frame, 1)
-
-    # put the port number on the top of the frame
-    text_frame = cv2.putText(
-        flipped_frame,
-        str(port),
-        (int(flipped_frame.shape[1] / 2), int(edge_length / 4)),
-        fontFace=cv2.FONT_HERSHEY_SIMPLEX,
-        fontScale=1,
-        color=(0, 0, 255),
-        thickness=2,
-    )
-
-    return text_frame
-
-
-def get_frame_or_blank(frame_packet, edge_length):
-    """Synchronization issues can lead to some frames being None among
-    the synched frames, so plug that with a blank frame"""
-
-    if frame_packet is None:
-        logger.debug("plugging blank frame data")
-        frame = np.zeros((edge_length, edge_length, 3), dtype=np.uint8)
-    else:
-        frame = frame_packet.frame
-
-    return frame
-
 
-def resize_to_square(frame, edge_length):
-    """To make sure that frames align well, scale them all to thumbnails
-    squares with black borders."""
-    logger.debug("resizing square")
-
-    height = frame.shape[0]
-    width = frame.shape[1]
-
-    padded_size = max(height, width)
-
-    height_pad = int((padded_size - height) / 2)
-    width_pad = int((padded_size - width) / 2)
-    pad_color = [0, 0, 0]
-
-    logger.debug("about to pad border")
-    frame = cv2.copyMakeBorder(
-        frame,
-        height_pad,
-        height_pad,
-        width_pad,
-        width_pad,
-        cv2.BORDER_CONSTANT,
-        value=pad_color,
-    )
-
-    frame = resize(frame, new_height=edge_length)
-    return frame
-
-
-def resize(image, new_height):
-    (current_height, current_width) = image.shape[:2]
-    ratio = new_height / float(current_height)
-    dim = (int(current_width * ratio), new_height)
-    resized = cv2.resize(image, dim, interpolation=cv2.INTER_AREA)
-    return resized
-
-
-def apply_rotation(frame, rotation_count):
-    if rotation_count == 0:
-        pass
-    elif rotation_count in [1, -3]:
-        frame = cv2.rotate(frame, cv2.ROTATE_90_CLOCKWISE)
-    elif rotation_count in [2, -2]:
-        frame = cv2.rotate(frame, cv2.ROTATE_180)
-    elif rotation_count in [-1, 3]:
-        frame = cv2.rotate(frame, cv2.ROTATE_90_COUNTERCLOCKWISE)
+        logger.info("Recording thumbnail emitter run thread ended...")
 
-    return frame
+    def qimage_over(self, canvas: np.ndarray) -> QImage:
+        """QImage that views the canvas memory directly; built once per canvas"""
+        key = id(canvas)
+        if key not in self.canvas_qimages:
+            self.canvas_qimages[key] = canvas_to_qimage(canvas)
+        return self.canvas_qimages[key]
 
 
-def prep_img_for_qpixmap(image: np.ndarray):
+def mosaic_layout(ports) -> dict:
     """
-    qpixmap needs dimensions divisible by 4 and without that weird things happen.
+    (row, column) of each port within a roughly square grid, filled row by row
+    in port order as in MultiCameraWidget.place_widgets
     """
-    if image.shape[1] % 4 != 0:  # If the width of the row isn't divisible by 4
-        padding_width = 4 - (image.shape[1] % 4)  # Calculate how much padding is needed
-        padding = np.zeros(
-            (image.shape[0], padding_width, image.shape[2]), dtype=image.dtype
-        )  # Create a black image of the required size
-        image = np.hstack([image, padding])  # Add the padding to the right of the image
-
-    return image
-
-
-
-def cv2_to_qimage(frame):
-    image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-
-    qt_frame = QImage(
-        image.data,
-        image.shape[1],
-        image.shape[0],
+    grid_columns = int(math.ceil(len(ports) ** 0.5))
+    positions = {}
+    row = 0
+    column = 0
+    for port in sorted(ports):
+        positions[port] = (row, column)
+        # update row and column for next iteration
+        if column >= grid_columns - 1:
+            # start fresh on next row
+            column = 0
+            row += 1
+        else:
+            column += 1
+    return positions
+
+
+def canvas_to_qimage(canvas: np.ndarray) -> QImage:
+    """
+    Wraps an RGB canvas without copying. The caller must keep the canvas alive
+    for as long as the QImage is in use, and emit a copy of it rather than the
+    view itself whenever the canvas will be reused.
+    """
+    height, width = canvas.shape[:2]
+    return QImage(
+        canvas.data,
+        width,
+        height,
+        canvas.strides[0],
         QImage.Format.Format_RGB888,
     )
-
-    return qt_frame
-
-
-
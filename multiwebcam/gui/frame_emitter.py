@@ -3,26 +3,33 @@ import multiwebcam.logger
 
 from datetime import datetime
 from pathlib import Path
-from time import sleep
+from time import sleep, perf_counter
 from threading import Event
 from queue import Queue
 
 import cv2
-from PySide6.QtCore import QSize, Qt, QThread, Signal
-from PySide6.QtGui import QFont, QIcon, QImage, QPixmap
+import numpy as np
+from PySide6.QtCore import QThread, Signal
+from PySide6.QtGui import QImage
 from multiwebcam.cameras.live_stream import LiveStream
+from multiwebcam.cameras.stream_variants import covering_variant
+from multiwebcam.cameras.undistortion import Undistorter
+from multiwebcam.gui.preview_governor import PreviewGovernor
+from multiwebcam.gui.thumbnail_renderer import ThumbnailRenderer
+from multiwebcam.gui.frame_dictionary_emitter import canvas_to_qimage
 
 logger = multiwebcam.logger.get(__name__)
 
 class FrameEmitter(QThread):
     # establish signals from the frame that will be displayed in real time
     # within the GUI
-    ImageBroadcast = Signal(QPixmap)
+    ImageBroadcast = Signal(QImage)
     FPSBroadcast = Signal(float)
 
-    def __init__(self, stream:LiveStream, pixmap_edge_length=None):
+    def __init__(self, stream:LiveStream, pixmap_edge_length=None, governor:PreviewGovernor=None):
         # pixmap_edge length is from the display window. Keep the display area
         # square to keep life simple.
+        # governor optionally scales back the preview while capture/recording is under pressure
         super(FrameEmitter, self).__init__()
         self.stream = stream
         self.in_q = Queue(1)
@@ -30,7 +37,20 @@ class FrameEmitter(QThread):
         logger.info(f"Frame emitter at port {self.stream.port} subscribing to stream")
         self.pixmap_edge_length = pixmap_edge_length
         self.rotation_count = stream.camera.rotation_count
+        # when set and the camera is calibrated, frames are undistorted at display size
         self.undistort = False
+        self.undistorter = Undistorter(stream.camera)
+        self.governor = governor
+        self.last_render_time = 0
+
+        # smallest stream variant that still covers the display
+        self.variant = "full"
+
+        # frames are scaled by OpenCV straight into a preallocated, display sized RGB canvas
+        # and the QImage over it is only built once
+        self.renderer = None
+        self.canvas_qimages = {}
+
         self.keep_collecting = Event()
         self.start()
 
@@ -40,27 +60,75 @@ class FrameEmitter(QThread):
     def unsubscribe(self):
         self.stream.unsubscribe(self.in_q)
 
+    def display_edge_length(self, frame, size_scale=1) -> int:
+        if self.pixmap_edge_length:
+            return int(self.pixmap_edge_length * size_scale)
+        else:
+            # no display size given so show the frame at its native resolution
+            return int(max(frame.shape[0], frame.shape[1]) * size_scale)
+
+    def select_variant(self, frame, edge_length) -> str:
+        """Smallest stream variant to render from at this display size"""
+        if self.undistort and self.undistorter.calibrated:
+            # the calibration describes full resolution frames
+            variant = "full"
+        else:
+            variant = covering_variant((frame.shape[1], frame.shape[0]), edge_length)
+
+        self.variant = variant
+        return variant
+
+    def get_renderer(self, edge_length) -> ThumbnailRenderer:
+        """Display sized renderer, rebuilt if the display size changes"""
+        if self.renderer is None or self.renderer.edge_length != edge_length:
+            # bilinear keeps a full rate 1080p preview to a small fraction of a core
+            self.renderer = ThumbnailRenderer(edge_length, interpolation=cv2.INTER_LINEAR)
+            self.canvas_qimages = {}
+
+        return self.renderer
+
     def run(self):
         self.keep_collecting.set()
 
         while self.keep_collecting.is_set():
             # Grab a frame from the queue and broadcast to displays
+            # blocks until the stream delivers a new frame, so there is never a
+            # repeat of what is already on display to skip
             self.frame_packet  = self.in_q.get()
-            self.frame = self.frame_packet.frame
 
-            self.frame = resize_to_square(self.frame)
-            self.apply_rotation()
+            size_scale = 1
+            if self.governor is not None:
+                level = self.governor.update()
+                if level.paused:
+                    continue
+                # drop frames to bring the render rate down to a fraction of the stream rate
+                min_interval = 1 / (max(self.stream.fps_target, 1) * level.fps_scale)
+                if perf_counter() - self.last_render_time < min_interval:
+                    continue
+                size_scale = level.size_scale
 
-            image = self.cv2_to_qlabel(self.frame)
-            pixmap = QPixmap.fromImage(image)
+            render_start = perf_counter()
+            self.last_render_time = render_start
 
-            if self.pixmap_edge_length:
-                pixmap = pixmap.scaled(
-                    int(self.pixmap_edge_length),
-                    int(self.pixmap_edge_length),
-                    Qt.AspectRatioMode.KeepAspectRatio,
-                )
-            self.ImageBroadcast.emit(pixmap)
+            self.frame = self.frame_packet.frame
+            if self.frame is None:
+                continue
+
+            edge_length = self.display_edge_length(self.frame, size_scale)
+            variant = self.select_variant(self.frame, edge_length)
+            renderer = self.get_renderer(edge_length)
+            undistorter = self.undistorter if self.undistort and variant == "full" else None
+            canvas = renderer.render(
+                self.frame_packet.variant(variant),
+                self.stream.camera.rotation_count,
+                undistorter=undistorter,
+            )
+            # the display paints later on the GUI thread, by which time the canvas may
+            # be drawn over again, so it is handed a copy
+            self.ImageBroadcast.emit(self.qimage_over(canvas).copy())
+
+            if self.governor is not None:
+                self.governor.report_render_time(perf_counter() - render_start)
             
             # moved to monocalibrator...delete if works well
             self.FPSBroadcast.emit(self.stream.FPS_actual)
@@ -71,53 +139,13 @@ class FrameEmitter(QThread):
         self.keep_collecting = False
         self.quit()
 
-    def cv2_to_qlabel(self, frame):
-        Image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        FlippedImage = cv2.flip(Image, 1)
-
-        qt_frame = QImage(
-            FlippedImage.data,
-            FlippedImage.shape[1],
-            FlippedImage.shape[0],
-            QImage.Format.Format_RGB888,
-        )
-        return qt_frame
-
-    def apply_rotation(self):
-        # logger.debug("Applying Rotation")
-        if self.stream.camera.rotation_count == 0:
-            pass
-        elif self.stream.camera.rotation_count in [1, -3]:
-            self.frame = cv2.rotate(self.frame, cv2.ROTATE_90_CLOCKWISE)
-        elif self.stream.camera.rotation_count in [2, -2]:
-            self.frame = cv2.rotate(self.frame, cv2.ROTATE_180)
-        elif self.stream.camera.rotation_count in [-1, 3]:
-            self.frame = cv2.rotate(self.frame, cv2.ROTATE_90_COUNTERCLOCKWISE)
-
-
-
-def resize_to_square(frame):
-
-    height = frame.shape[0]
-    width = frame.shape[1]
-
-    padded_size = max(height, width)
-
-    height_pad = int((padded_size - height) / 2)
-    width_pad = int((padded_size - width) / 2)
-    pad_color = [0, 0, 0]
-
-    frame = cv2.copyMakeBorder(
-        frame,
-        height_pad,
-        height_pad,
-        width_pad,
-        width_pad,
-        cv2.BORDER_CONSTANT,
-        value=pad_color,
-    )
-
-    return frame
+    def qimage_over(self, canvas: np.ndarray) -> QImage:
+        """QImage that views the canvas memory directly; built once per canvas"""
+        key = id(canvas)
+        if key not in self.canvas_qimages:
+            self.canvas_qimages[key] = canvas_to_qimage(canvas)
+        return self.canvas_qimages[key]
+
 
 if __name__ == "__main__":
     pass
@@ -1,6 +1,8 @@
-from multiwebcam.logger import get, XStream
+from multiwebcam.logger import get, add_handler
+from multiwebcam.gui.qt_log_handler import XStream, QtHandler
 
-from PySide6.QtCore import Slot, Qt
+from PySide6.QtCore import Slot, Qt, QTimer
+from PySide6.QtGui import QTextCursor
 from PySide6.QtWidgets import (
     QWidget,
     QApplication,
@@ -12,6 +14,9 @@ from PySide6.QtWidgets import (
 from time import time
 logger = get(__name__)
 
+LOG_REFRESH_MS = 100  # how often buffered log messages are moved into the view
+LOG_MAX_LINES = 1000  # scrollback kept in the view; older lines are discarded
+
 
 class LogWidget(QWidget):
     def __init__(self, message: str = None):
@@ -33,8 +38,16 @@ class LogWidget(QWidget):
             self._button.clicked.connect(test)
 
         self.setLayout(layout)
-        XStream.stdout().messageWritten.connect(self._console.appendLogMessage)
-        XStream.stderr().messageWritten.connect(self._console.appendLogMessage)
+
+        # buffered messages are collected in batches rather than signalled one by one
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.timeout.connect(self.drain_log)
+        self.refresh_timer.start(LOG_REFRESH_MS)
+
+    def drain_log(self):
+        text = XStream.stdout().drain() + XStream.stderr().drain()
+        if text:
+            self._console.appendLogMessage(text)
 
 
 def test():
@@ -47,16 +60,20 @@ class LogMessageViewer(QTextBrowser):
         # self.setLineWrapMode(QtGui.QTextEdit.NoWrap)
         self.setEnabled(True)
         self.verticalScrollBar().setVisible(True)
+        # the oldest lines are removed once the limit is reached, keeping memory bounded
+        self.document().setMaximumBlockCount(LOG_MAX_LINES)
 
     @Slot(str)
     def appendLogMessage(self, msg):
+        # msg may hold many lines; they are inserted together and the view scrolled once
         horScrollBar = self.horizontalScrollBar()
         verScrollBar = self.verticalScrollBar()
         # scrollIsAtEnd = verScrollBar.maximum() - verScrollBar.value() <= 10
 
+        self.moveCursor(QTextCursor.MoveOperation.End)
+        self.insertPlainText(msg)
         verScrollBar.setValue(verScrollBar.maximum())  # Scrolls to the bottom
         horScrollBar.setValue(0)  # scroll to the left  
-        self.insertPlainText(msg)
 
         # if scrollIsAtEnd:
         #     verScrollBar.setValue(verScrollBar.maximum())  # Scrolls to the bottom
@@ -64,6 +81,7 @@ class LogMessageViewer(QTextBrowser):
         #     horScrollBar.setValue(0)  # scroll to the left  
 
 if __name__ == "__main__":
+    add_handler(QtHandler())
     app = QApplication([])
     dlg = LogWidget("This is only a test")
     dlg.show()
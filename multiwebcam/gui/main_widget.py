@@ -17,9 +17,10 @@ from PySide6.QtWidgets import (
 import rtoml
 from PySide6.QtGui import QIcon, QAction
 from PySide6.QtCore import Qt
-from multiwebcam import __root__, __settings_path__
+from multiwebcam import __root__, __settings_path__, load_user_settings, print_banner
 from multiwebcam.session.session import LiveSession, SessionMode
 from multiwebcam.gui.log_widget import LogWidget
+from multiwebcam.gui.qt_log_handler import QtHandler
 from multiwebcam.configurator import Configurator
 from multiwebcam.gui.single_camera_widget import (
     SingleCameraWidget,
@@ -34,7 +35,7 @@ class MainWindow(QMainWindow):
     def __init__(self):
         super(MainWindow, self).__init__()
 
-        self.app_settings = rtoml.load(__settings_path__)
+        self.app_settings = load_user_settings()
 
         # Persistent parent widget
         self.persistent_parent = QWidget(self)
@@ -254,6 +255,11 @@ class MainWindow(QMainWindow):
 
 def launch_main(show_clock=False):
     # import qdarktheme
+    print_banner()
+
+    # avoid stepping through XStream object if in debug
+    if os.getenv("DEBUG") != "1":
+        multiwebcam.logger.add_handler(QtHandler())
 
     app = QApplication(sys.argv)
     # qdarktheme.setup_theme("auto")
@@ -5,8 +5,9 @@ from threading import Thread
 from enum import Enum
 
 from PySide6.QtCore import Slot, Qt
-from PySide6.QtGui import QPixmap
+from PySide6.QtGui import QImage, QPixmap
 from PySide6.QtWidgets import (
+    QCheckBox,
     QGridLayout,
     QWidget,
     QSpinBox,
@@ -21,6 +22,7 @@ from PySide6.QtWidgets import (
 
 from multiwebcam.session.session import LiveSession
 from multiwebcam.cameras.synchronizer import Synchronizer
+from multiwebcam.helper import get_next_recording_directory
 import multiwebcam.logger
 
 logger = multiwebcam.logger.get(__name__)
@@ -54,6 +56,9 @@ class MultiCameraWidget(QWidget):
         self.render_rate_spin.setValue(self.session.multicam_render_fps) 
         self.render_rate_spin.setMaximumWidth(50)
 
+        self.undistort_check = QCheckBox("Undistort Preview")
+        self.undistort_check.setChecked(self.thumbnail_emitter.undistort)
+
         self.next_action = NextRecordingActions.StartRecording
         self.start_stop = QPushButton(self.next_action.value)
         self.destination_label = QLabel("Recording Destination:")
@@ -64,6 +69,8 @@ class MultiCameraWidget(QWidget):
         # all video output routed to qlabels stored in a dictionariy
         # make it as square as you can get it
         self.recording_displays = {str(port): QLabel() for port in self.ports}
+        # when the emitter composites a mosaic, a single label shows every camera
+        self.mosaic_display = QLabel()
         # self.recording_frame_display = QLabel()
 
         self.place_widgets()
@@ -83,22 +90,7 @@ class MultiCameraWidget(QWidget):
             logger.info("Record button eligibility updated: Not Eligible")
 
     def get_next_recording_directory(self):
-        folders = [item.name for item in self.session.path.iterdir() if item.is_dir()]
-        recording_folders = [
-            folder for folder in folders if folder.startswith("recording_")
-        ]
-        recording_counts = [folder.split("_")[1] for folder in recording_folders]
-        recording_counts = [
-            int(rec_count) for rec_count in recording_counts if rec_count.isnumeric()
-        ]
-
-        if len(recording_counts) == 0:
-            next_directory = "recording_1"
-
-        else:
-            next_directory = "recording_" + str(max(recording_counts) + 1)
-
-        return next_directory
+        return get_next_recording_directory(self.session.path)
 
     def place_widgets(self):
         self.setLayout(QVBoxLayout())
@@ -120,6 +112,9 @@ class MultiCameraWidget(QWidget):
         rendered_rate_layout.addWidget(self.render_rate_spin, alignment=Qt.AlignmentFlag.AlignLeft)
         self.settings_layout.addLayout(rendered_rate_layout)
 
+        self.undistort_check.setToolTip("Lens correct the previews of cameras with a calibration saved in recording_config.toml.")
+        self.settings_layout.addWidget(self.undistort_check)
+
         self.layout().addWidget(self.settings_group)
 
         self.record_controls = QGroupBox()
@@ -140,17 +135,20 @@ class MultiCameraWidget(QWidget):
         grid_columns = int(math.ceil(camera_count**0.5))
 
         frame_grid = QGridLayout()
-        row = 0
-        column = 0
-        for port in sorted(self.ports):
-            frame_grid.addWidget(self.recording_displays[str(port)], row, column)
-            # update row and column for next iteration
-            if column >= grid_columns - 1:
-                # start fresh on next row
-                column = 0
-                row += 1
-            else:
-                column += 1
+        if self.thumbnail_emitter.mosaic:
+            frame_grid.addWidget(self.mosaic_display, 0, 0)
+        else:
+            row = 0
+            column = 0
+            for port in sorted(self.ports):
+                frame_grid.addWidget(self.recording_displays[str(port)], row, column)
+                # update row and column for next iteration
+                if column >= grid_columns - 1:
+                    # start fresh on next row
+                    column = 0
+                    row += 1
+                else:
+                    column += 1
 
         frame_display_layout = QHBoxLayout()
         frame_display_layout.addStretch(1)
@@ -170,8 +168,10 @@ class MultiCameraWidget(QWidget):
 
     def connect_widgets(self):
         self.thumbnail_emitter.ThumbnailImagesBroadcast.connect(self.ImageUpdateSlot)
+        self.thumbnail_emitter.MosaicBroadcast.connect(self.MosaicUpdateSlot)
         self.frame_rate_spin.valueChanged.connect(self.session.set_fps)
         self.render_rate_spin.valueChanged.connect(self.session.set_multicam_render_fps)
+        self.undistort_check.toggled.connect(self.session.set_undistort_preview)
         self.thumbnail_emitter.dropped_fps.connect(self.update_dropped_fps)
         self.start_stop.clicked.connect(self.toggle_start_stop)
         self.session.fps_target_updated.connect(self.update_fps_target)
@@ -245,3 +245,6 @@ class MultiCameraWidget(QWidget):
             self.recording_displays[port].setPixmap(qpixmap)
             logger.debug("successfully set display")
 
+    @Slot(QImage)
+    def MosaicUpdateSlot(self, mosaic: QImage):
+        self.mosaic_display.setPixmap(QPixmap.fromImage(mosaic))
@@ -1,12 +1,19 @@
 import sys
 from PySide6.QtWidgets import QApplication, QWidget, QVBoxLayout, QLabel
 from PySide6.QtCore import QTimer
-from PySide6.QtGui import QFont
+from PySide6.QtGui import QFont, QImage, QPixmap
 import time
 
+from multiwebcam.cameras.timestamp_barcode import render_barcode
+
 class PerfCounterWidget(QWidget):
-    def __init__(self):
+    def __init__(self, show_barcode=True):
+        """
+        show_barcode: also display the time as a machine readable grid of cells
+        that timestamp_barcode.decode_barcode can read back from camera frames
+        """
         super().__init__()
+        self.show_barcode = show_barcode
 
         # Set up the layout
         self.layout = QVBoxLayout()
@@ -17,6 +24,11 @@ class PerfCounterWidget(QWidget):
         self.perfLabel.setFont(font)
 
         self.layout.addWidget(self.perfLabel)
+
+        if self.show_barcode:
+            self.barcodeLabel = QLabel(self)
+            self.layout.addWidget(self.barcodeLabel)
+
         self.setLayout(self.layout)
 
         self.timer = QTimer(self)
@@ -30,6 +42,13 @@ class PerfCounterWidget(QWidget):
         # Update the label with the current perf_counter value
         self.perfLabel.setText(f"{elapsedTime:.4f}")
 
+        if self.show_barcode:
+            barcode = render_barcode(elapsedTime)
+            height, width = barcode.shape
+            # fromImage copies, so the array need not outlive this call
+            image = QImage(barcode.data, width, height, width, QImage.Format.Format_Grayscale8)
+            self.barcodeLabel.setPixmap(QPixmap.fromImage(image))
+
 
 
 def main():
@@ -0,0 +1,143 @@
+"""
+Keeps preview rendering from starving capture and recording.
+
+The frame emitters ask the governor for the current PreviewLevel before each render.
+While recording, the governor periodically looks at the recorder backlog, the
+synchronizer's dropped frame rate and how much time the emitters are spending on
+rendering. Under pressure it steps the preview down (lower fps, then smaller
+thumbnails, then paused); once there has been headroom for a while, or recording has
+stopped, it steps back up one level at a time.
+"""
+
+import multiwebcam.logger
+
+from collections import deque
+from dataclasses import dataclass
+from threading import RLock
+from time import perf_counter
+
+logger = multiwebcam.logger.get(__name__)
+
+EVALUATION_INTERVAL = 1.0  # seconds between assessments
+RECOVERY_EVALUATIONS = 5  # consecutive assessments with headroom before stepping back up
+
+BACKLOG_LIMIT = 30  # unsaved packets/frames queued at the recorders
+DROPPED_LIMIT = 0.10  # fraction of frames dropped at the worst port
+RENDER_LOAD_LIMIT = 0.25  # fraction of one core spent rendering previews
+
+
+@dataclass(frozen=True, slots=True)
+class PreviewLevel:
+    fps_scale: float
+    size_scale: float
+    paused: bool = False
+
+
+PREVIEW_LEVELS = [
+    PreviewLevel(fps_scale=1.0, size_scale=1.0),
+    PreviewLevel(fps_scale=0.5, size_scale=1.0),
+    PreviewLevel(fps_scale=0.5, size_scale=0.5),
+    PreviewLevel(fps_scale=0.25, size_scale=0.5),
+    PreviewLevel(fps_scale=0.0, size_scale=0.5, paused=True),
+]
+
+
+class PreviewGovernor:
+    def __init__(self, synchronizer=None):
+        # the synchronizer is optional and can be assigned once it has been created
+        self.synchronizer = synchronizer
+
+        # objects with a `backlog` property, i.e. active recorders
+        self.backlog_sources = []
+
+        self.level_index = 0
+        self.headroom_count = 0
+        self.last_backlog = 0
+        self.last_evaluation = perf_counter()
+
+        # several emitter threads report to and update the governor; reentrant so
+        # update() can hold it across the whole decision while calling render_load()
+        self.lock = RLock()
+        self.render_log = deque()  # (time of render, seconds spent rendering)
+
+    @property
+    def level(self) -> PreviewLevel:
+        return PREVIEW_LEVELS[self.level_index]
+
+    def add_backlog_source(self, source):
+        if source not in self.backlog_sources:
+            self.backlog_sources.append(source)
+
+    def remove_backlog_source(self, source):
+        if source in self.backlog_sources:
+            self.backlog_sources.remove(source)
+
+    def report_render_time(self, seconds: float):
+        with self.lock:
+            self.render_log.append((perf_counter(), seconds))
+
+    def render_load(self) -> float:
+        """Fraction of wall time spent rendering over the trailing evaluation interval"""
+        now = perf_counter()
+        with self.lock:
+            while self.render_log and now - self.render_log[0][0] > EVALUATION_INTERVAL:
+                self.render_log.popleft()
+            busy = sum(seconds for _, seconds in self.render_log)
+        return busy / EVALUATION_INTERVAL
+
+    def backlog(self) -> int:
+        return sum(source.backlog for source in list(self.backlog_sources))
+
+    def worst_dropped_fps(self) -> float:
+        if self.synchronizer is None:
+            return 0
+        dropped = self.synchronizer.dropped_fps
+        return max(dropped.values()) if len(dropped) > 0 else 0
+
+    def update(self) -> PreviewLevel:
+        """Called by the emitters on every render; only reassesses once per interval"""
+        with self.lock:
+            now = perf_counter()
+            if now - self.last_evaluation < EVALUATION_INTERVAL:
+                return self.level
+            self.last_evaluation = now
+
+            backlog = self.backlog()
+            backlog_growing = backlog > self.last_backlog and backlog > BACKLOG_LIMIT / 5
+            self.last_backlog = backlog
+            # outside of recording, dropped frames usually reflect the cameras themselves
+            # rather than competition from the preview, and a busy preview has nothing
+            # to starve, so neither holds the preview back
+            recording = len(self.backlog_sources) > 0
+            dropped = self.worst_dropped_fps() if recording else 0
+            render_load = self.render_load() if recording else 0
+
+            under_pressure = (
+                backlog > BACKLOG_LIMIT
+                or backlog_growing
+                or dropped > DROPPED_LIMIT
+                or render_load > RENDER_LOAD_LIMIT
+            )
+            has_headroom = (
+                backlog <= BACKLOG_LIMIT / 5
+                and dropped <= DROPPED_LIMIT / 2
+                and render_load <= RENDER_LOAD_LIMIT / 2
+            )
+
+            if under_pressure:
+                self.headroom_count = 0
+                if self.level_index < len(PREVIEW_LEVELS) - 1:
+                    self.level_index += 1
+                    logger.info(
+                        f"Reducing preview to {self.level} (backlog: {backlog}, dropped: {dropped:.0%}, render load: {render_load:.0%})"
+                    )
+            elif has_headroom and self.level_index > 0:
+                self.headroom_count += 1
+                if self.headroom_count >= RECOVERY_EVALUATIONS:
+                    self.headroom_count = 0
+                    self.level_index -= 1
+                    logger.info(f"Restoring preview to {self.level}")
+            else:
+                self.headroom_count = 0
+
+            return self.level
@@ -0,0 +1,80 @@
+# Qt side of the logging setup. Kept apart from multiwebcam.logger so that
+# headless use of the package never imports PySide6.
+#
+# Messages are not signalled to the GUI one at a time. They are appended to a ring
+# buffer (a deque append needs no lock) and the log widget drains the ring on a timer,
+# so a burst of logging costs the GUI thread one text insert per tick.
+
+import logging
+import sys
+from collections import deque
+
+from PySide6 import QtCore
+
+LOG_RING_SIZE = 5000  # messages held between drains; the oldest are dropped beyond this
+
+
+class QtHandler(logging.Handler):
+    """
+    Adapted from discussion here: https://stackoverflow.com/questions/24469662/how-to-redirect-logger-output-into-pyqt-text-widget
+    This handler will allow a QDialog box to pick up the logger output which may be useful for a  
+    splash screen to show users that something is happening during big processing moments like:
+    - loading/finding cameras
+
+    - building / unbuilding synchronizer
+    - performing stereocalibration
+    """
+    def __init__(self):
+        logging.Handler.__init__(self)
+        # qt_log_format =" %(levelname)s| %(name)s |%(message)s"
+        qt_log_format =" %(name)s|%(message)s"
+        qt_formatter = logging.Formatter(qt_log_format)
+        self.setFormatter(qt_formatter)
+
+    def emit(self, record):
+        record = self.format(record)
+        if record: XStream.stdout().write(f"{record} \n")
+
+
+class XStream(QtCore.QObject):
+    _stdout = None
+    _stderr = None
+    def __init__(self):
+        super().__init__()
+        self.ring = deque(maxlen=LOG_RING_SIZE)
+        self.overflow_count = 0
+    def flush( self ):
+        pass
+    def fileno( self ):
+        return -1
+    def write( self, msg ):
+        # may be called from any thread; the text is only collected here
+        if ( not self.signalsBlocked() ):
+            if len(self.ring) == LOG_RING_SIZE:
+                self.overflow_count += 1
+            self.ring.append(msg)
+
+    def drain(self) -> str:
+        """Everything written since the last drain, as one string"""
+        parts = []
+        if self.overflow_count:
+            parts.append(f"... {self.overflow_count} earlier log messages dropped ...\n")
+            self.overflow_count = 0
+        # only what is present now; anything written meanwhile waits for the next drain
+        for _ in range(len(self.ring)):
+            parts.append(self.ring.popleft())
+        return "".join(parts)
+
+    @staticmethod
+    def stdout():
+        if ( not XStream._stdout ):
+            XStream._stdout = XStream()
+            sys.stdout = XStream._stdout
+        return XStream._stdout
+
+    @staticmethod
+    def stderr():
+        if ( not XStream._stderr ):
+            XStream._stderr = XStream()
+            sys.stderr = XStream._stderr
+        return XStream._stderr
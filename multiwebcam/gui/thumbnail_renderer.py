@@ -0,0 +1,147 @@
+"""
+Single pass rendering of camera frames into square RGB thumbnails.
+
+The straightforward pipeline (pad to square, resize, rotate, flip, convert BGR to RGB)
+allocates a new full resolution image at nearly every step. Here the frame is downscaled
+first, into a reused buffer, and then padding, rotation, mirroring and the channel swap
+are all applied in one gather through a precomputed lookup table into a reused canvas.
+The lookup table only has to be rebuilt when the frame size, rotation or edge length changes.
+
+Nothing here depends on Qt so the renderer can be used off the GUI thread.
+"""
+
+import cv2
+import numpy as np
+
+from multiwebcam.cameras.undistortion import Undistorter
+
+LABEL_COLOR = (255, 0, 0)  # red, given the canvas is RGB
+
+
+def build_thumbnail_lut(
+    frame_height: int, frame_width: int, edge_length: int, rotation_count: int, mirror: bool = True
+):
+    """
+    Returns (scaled_size, lut) where scaled_size is the (width, height) the frame should
+    be resized to and lut holds, for every element of the (edge, edge, 3) RGB canvas, the
+    index of the element to take from the flattened, resized BGR frame. Padding points to
+    one element past the end of the frame, which is kept at zero.
+    """
+    scale = edge_length / max(frame_height, frame_width)
+    height = max(1, int(round(frame_height * scale)))
+    width = max(1, int(round(frame_width * scale)))
+    pad_y = (edge_length - height) // 2
+    pad_x = (edge_length - width) // 2
+
+    row, col = np.indices((edge_length, edge_length))
+    last = edge_length - 1
+
+    if mirror:
+        col = last - col
+
+    # invert the rotation to find where each canvas pixel lies in the square (padded) frame
+    # +1 for each 90 degree CW rotation, -1 for CCW, matching Camera.rotation_count
+    match rotation_count % 4:
+        case 0:
+            y, x = row, col
+        case 1:  # 90 clockwise
+            y, x = last - col, row
+        case 2:  # 180
+            y, x = last - row, last - col
+        case 3:  # 90 counterclockwise
+            y, x = col, last - row
+
+    y = y - pad_y
+    x = x - pad_x
+    inside = (y >= 0) & (y < height) & (x >= 0) & (x < width)
+
+    sentinel = height * width * 3
+    pixel = (y * width + x) * 3
+    # channel order reversed so that BGR frames come out as RGB
+    lut = pixel[..., np.newaxis] + np.array([2, 1, 0])
+    lut[~inside] = sentinel
+
+    return (width, height), lut.astype(np.intp)
+
+
+class ThumbnailRenderer:
+    """
+    Renders frames for one camera into a square RGB canvas of a fixed edge length.
+    The canvas is preallocated and drawn over on every render, so a consumer on another
+    thread should be handed a copy of it (the GUI emitters emit a copied QImage).
+
+    INTER_AREA gives the cleanest downscale but costs ~20x as much as INTER_LINEAR when
+    shrinking a 1080p frame, so high frame rate displays may want the latter.
+    """
+
+    def __init__(
+        self,
+        edge_length: int,
+        mirror: bool = True,
+        interpolation: int = cv2.INTER_AREA,
+    ):
+        self.edge_length = int(edge_length)
+        self.mirror = mirror
+        self.interpolation = interpolation
+        self.canvas = np.zeros((self.edge_length, self.edge_length, 3), dtype=np.uint8)
+
+        self.lut_key = None
+        self.lut = None
+        self.scaled_size = None
+        self.scaled_flat = None
+        self.scaled = None
+
+    def _update_lut(self, frame_height, frame_width, rotation_count):
+        key = (frame_height, frame_width, rotation_count)
+        if key == self.lut_key:
+            return
+
+        self.scaled_size, self.lut = build_thumbnail_lut(
+            frame_height, frame_width, self.edge_length, rotation_count, self.mirror
+        )
+        width, height = self.scaled_size
+        # one extra trailing element that stays zero and is used for the padding
+        self.scaled_flat = np.zeros(height * width * 3 + 1, dtype=np.uint8)
+        self.scaled = self.scaled_flat[:-1].reshape(height, width, 3)
+        self.lut_key = key
+
+    def render(
+        self,
+        frame: np.ndarray,
+        rotation_count: int = 0,
+        label: str = None,
+        out: np.ndarray = None,
+        undistorter: Undistorter = None,
+    ) -> np.ndarray:
+        """
+        Render frame (BGR, any size; None gives a blank thumbnail) into the canvas,
+        or into `out` if provided (any (edge, edge, 3) uint8 view, e.g. a tile of a larger
+        image). Returns the array written to.
+
+        With a calibrated undistorter the frame is undistorted and downscaled in the same
+        remap, in place of the resize.
+        """
+        canvas = out if out is not None else self.canvas
+
+        if frame is None:
+            canvas.fill(0)
+        else:
+            self._update_lut(frame.shape[0], frame.shape[1], rotation_count)
+            if undistorter is not None and undistorter.calibrated:
+                undistorter.undistort(frame, self.scaled_size, out=self.scaled)
+            else:
+                cv2.resize(frame, self.scaled_size, dst=self.scaled, interpolation=self.interpolation)
+            np.take(self.scaled_flat, self.lut, out=canvas, mode="clip")
+
+        if label is not None:
+            cv2.putText(
+                canvas,
+                label,
+                (int(self.edge_length / 2), int(self.edge_length / 4)),
+                fontFace=cv2.FONT_HERSHEY_SIMPLEX,
+                fontScale=1,
+                color=LABEL_COLOR,
+                thickness=2,
+            )
+
+        return canvas
@@ -0,0 +1,364 @@
+# Recording without the GUI. Nothing in this module (or what it imports) pulls in
+# PySide6, so it can run on a capture server without a display.
+
+import multiwebcam.logger
+
+from pathlib import Path
+from queue import Empty
+from time import sleep, perf_counter
+
+from multiwebcam.configurator import Configurator
+from multiwebcam.cameras.live_stream import LiveStream
+from multiwebcam.cameras.synchronizer import Synchronizer
+from multiwebcam.recording.multi_video_recorder import MultiVideoRecorder
+from multiwebcam.helper import get_next_recording_directory
+
+logger = multiwebcam.logger.get(__name__)
+
+STOP_TIMEOUT = 5  # seconds to wait for a capture thread to finish its current read
+
+
+def load_streams(config: Configurator, fps_target: int = None) -> dict[int, LiveStream]:
+    """
+    Connect to the cameras stored in the workspace config and create a stream for each.
+    Resolution is set before the stream begins reading so no restart of the
+    capture thread is needed.
+    """
+    if fps_target is None:
+        fps_target = config.get_fps_target()
+
+    cameras = config.get_cameras()
+
+    streams = {}
+    for port, camera in cameras.items():
+        size = config.dict[f"cam_{port}"]["size"]
+        default_size = camera.default_resolution
+        if size[0] != default_size[0] or size[1] != default_size[1]:
+            logger.info(f"Setting resolution at port {port} to {size[0:2]}")
+            camera.size = size
+
+        logger.info(f"Loading Stream for port {port}")
+        streams[port] = LiveStream(camera, fps_target=fps_target)
+
+    return streams
+
+
+def release_streams(streams: dict[int, LiveStream], synchronizer: Synchronizer = None):
+    """
+    Stop the synchronizer, then the streams, and release the cameras. A camera is only
+    released once its stream has confirmed it stopped reading, so the capture is never
+    pulled out from under a grab in progress.
+    """
+    if synchronizer is not None:
+        # the streams keep running meanwhile so the harvesters get a frame and see the stop
+        synchronizer.stop(timeout=STOP_TIMEOUT)
+    for stream in streams.values():
+        stream.stop_event.set()
+    for stream in streams.values():
+        if stream.thread.is_alive():
+            try:
+                stream.stop_confirm.get(timeout=STOP_TIMEOUT)
+            except Empty:
+                # releasing it now could crash the backend mid-read; it goes with the process
+                logger.warning(f"Stream at port {stream.port} is still in a read; leaving its camera open")
+                continue
+        stream.camera.disconnect()
+
+
+def record(
+    workspace: Path,
+    duration: float,
+    destination: Path = None,
+    fps_target: int = None,
+    raw_capture: bool = False,
+    undistort: bool = False,
+) -> Path:
+    """
+    Record synchronized video from all configured cameras in the workspace for
+    `duration` seconds. Returns the folder the recording was saved to, or None if
+    no cameras are configured.
+    """
+    workspace = Path(workspace)
+    config = Configurator(workspace)
+
+    if destination is None:
+        destination = Path(workspace, get_next_recording_directory(workspace))
+
+    streams = load_streams(config, fps_target)
+    # nothing is saved back to the config from here on
+    config.close()
+    if len(streams) == 0:
+        logger.error(
+            f"No cameras configured in {workspace}; launch `mwc` once to detect and set up cameras"
+        )
+        return None
+
+    synchronizer = Synchronizer(streams)
+
+    # need to let synchronizer spin up before recording
+    while not hasattr(synchronizer, "current_sync_packet"):
+        logger.info("Waiting for initial sync packet to populate in synchronizer")
+        sleep(0.5)
+
+    recorder = MultiVideoRecorder(synchronizer)
+    recorder.start_recording(destination, raw_capture=raw_capture, undistort=undistort)
+    logger.info(f"Recording for {duration} seconds to {destination}")
+
+    start = perf_counter()
+    try:
+        while perf_counter() - start < duration:
+            sleep(min(0.5, max(0, duration - (perf_counter() - start))))
+    except KeyboardInterrupt:
+        logger.info("Recording interrupted; saving what has been captured so far")
+
+    recorder.stop_recording()
+    while recorder.recording:
+        logger.info("Waiting for video recorder to save out data...")
+        sleep(0.5)
+
+    release_streams(streams, synchronizer)
+
+    if recorder.transcoder is not None:
+        logger.info("Waiting for raw capture to finish transcoding...")
+        recorder.transcoder.join()
+
+    if recorder.write_error is not None:
+        logger.error(f"Recording to {destination} did not finish saving: {recorder.write_error}")
+        return None
+
+    logger.info(f"Recording saved to {destination}")
+    return destination
+
+
+def serve(
+    workspace: Path,
+    host: str = "127.0.0.1",
+    port: int = None,
+    thumbnail_edge: int = None,
+    fps_target: int = None,
+) -> bool:
+    """
+    Stream synchronized frames from all configured cameras over the network
+    until interrupted (Ctrl-C). Returns False if serving could not begin.
+    """
+    from multiwebcam.streaming.network_sink import DEFAULT_PORT, NetworkSink
+
+    workspace = Path(workspace)
+    config = Configurator(workspace)
+
+    streams = load_streams(config, fps_target)
+    # nothing is saved back to the config from here on
+    config.close()
+    if len(streams) == 0:
+        logger.error(
+            f"No cameras configured in {workspace}; launch `mwc` once to detect and set up cameras"
+        )
+        return False
+
+    synchronizer = Synchronizer(streams)
+    sink = NetworkSink(
+        synchronizer,
+        host=host,
+        port=DEFAULT_PORT if port is None else port,
+        thumbnail_edge=thumbnail_edge,
+    )
+    try:
+        sink.start()
+    except OSError as error:
+        logger.error(f"Could not serve on {sink.host}:{sink.port}: {error}")
+        release_streams(streams, synchronizer)
+        return False
+
+    try:
+        while sink.thread.is_alive():
+            sleep(0.5)
+    except KeyboardInterrupt:
+        logger.info("Stopping network stream")
+
+    sink.stop()
+    release_streams(streams, synchronizer)
+    return True
+
+
+def watch(
+    workspace: Path,
+    preroll_seconds: float = 3,
+    postroll_seconds: float = 5,
+    motion: bool = True,
+    roi: tuple = None,
+    pixel_threshold: int = None,
+    motion_fraction: float = None,
+    trigger_file: Path = None,
+    trigger_port: int = None,
+    duration: float = None,
+    fps_target: int = None,
+) -> list:
+    """
+    Keep the cameras running and record a clip whenever there is motion (or an
+    external trigger), from `preroll_seconds` before it started until
+    `postroll_seconds` after it ended. Runs for `duration` seconds, or until
+    interrupted if None. Returns the clip folders, or None if no cameras are configured.
+    """
+    from multiwebcam.recording.triggered_recording import (
+        MOTION_FRACTION,
+        PIXEL_CHANGE_THRESHOLD,
+        FileTrigger,
+        MotionDetector,
+        SocketTrigger,
+        TriggeredRecorder,
+    )
+
+    workspace = Path(workspace)
+    config = Configurator(workspace)
+
+    streams = load_streams(config, fps_target)
+    if len(streams) == 0:
+        logger.error(
+            f"No cameras configured in {workspace}; launch `mwc` once to detect and set up cameras"
+        )
+        config.close()
+        return None
+
+    detector = None
+    if motion:
+        detector = MotionDetector(
+            roi=roi,
+            pixel_threshold=PIXEL_CHANGE_THRESHOLD if pixel_threshold is None else pixel_threshold,
+            motion_fraction=MOTION_FRACTION if motion_fraction is None else motion_fraction,
+        )
+    triggers = []
+    if trigger_file is not None:
+        triggers.append(FileTrigger(trigger_file))
+    if trigger_port is not None:
+        triggers.append(SocketTrigger(port=trigger_port))
+
+    synchronizer = Synchronizer(streams)
+    watcher = TriggeredRecorder(
+        synchronizer,
+        workspace,
+        preroll_seconds=preroll_seconds,
+        postroll_seconds=postroll_seconds,
+        motion=detector,
+        triggers=triggers,
+        preroll_jpeg_quality=config.get_preroll_jpeg_quality(),
+    )
+    config.close()
+    logger.info(
+        "Watching for activity"
+        + (f" for {duration} seconds" if duration is not None else " until interrupted")
+    )
+
+    start = perf_counter()
+    try:
+        while duration is None or perf_counter() - start < duration:
+            sleep(0.5)
+    except KeyboardInterrupt:
+        logger.info("Stopping triggered recording")
+
+    watcher.stop()
+    logger.info("Waiting for the last clip to save out...")
+    watcher.wait_for_clips()
+    release_streams(streams, synchronizer)
+
+    return watcher.clips
+
+
+def calibrate_clocks(
+    workspace: Path,
+    duration: float,
+    method: str = "events",
+    fps_target: int = None,
+) -> dict:
+    """
+    Estimate each camera's timing correction (see clock_calibration) over `duration`
+    seconds. For the "events" method, switch the lights on and off (or flash a light
+    in view of every camera) a few times while this runs; the corrections are saved
+    to the workspace config and returned as {port: (time_offset, time_drift)}. The
+    "residuals" method only reports what it measured, as {port: (offset, drift)}, and
+    saves nothing. Returns None on failure.
+    """
+    from multiwebcam.cameras.clock_calibration import ClockCalibrator, apply_estimates, SAVED_METHODS
+
+    workspace = Path(workspace)
+    config = Configurator(workspace)
+
+    streams = load_streams(config, fps_target)
+    if len(streams) < 2:
+        logger.error(f"Clock calibration needs at least two cameras configured in {workspace}")
+        release_streams(streams)
+        config.close()
+        return None
+
+    synchronizer = Synchronizer(streams)
+    calibrator = ClockCalibrator(synchronizer, method=method)
+    logger.info(f"Calibrating camera clocks from {method} for {duration} seconds")
+
+    try:
+        estimates = calibrator.run(duration)
+    except ValueError as error:
+        logger.error(f"Clock calibration failed: {error}")
+        release_streams(streams, synchronizer)
+        config.close()
+        return None
+
+    if method not in SAVED_METHODS:
+        # the residual phase depends on when this session's streams started reading
+        logger.info(f"Clock estimates from {method} are reported only; recording_config.toml is unchanged")
+        config.close()
+        release_streams(streams, synchronizer)
+        return estimates
+
+    cameras = {port: stream.camera for port, stream in streams.items()}
+    apply_estimates(cameras, estimates)
+    for camera in cameras.values():
+        config.save_camera(camera)
+    config.close()
+
+    release_streams(streams, synchronizer)
+    return {port: (camera.time_offset, camera.time_drift) for port, camera in cameras.items()}
+
+
+def measure_latency(workspace: Path, duration: float, fps_target: int = None):
+    """
+    Decode the timestamp barcode shown by `mwc clock` in live frames from every
+    configured camera for `duration` seconds. Returns the LatencyTracker, whose
+    samples are also saved to latency_samples.csv in the workspace.
+    """
+    from queue import Empty
+    from multiwebcam.cameras.timestamp_barcode import LatencyTracker
+
+    workspace = Path(workspace)
+    config = Configurator(workspace)
+
+    streams = load_streams(config, fps_target)
+    # nothing is saved back to the config from here on
+    config.close()
+    if len(streams) == 0:
+        logger.error(
+            f"No cameras configured in {workspace}; launch `mwc` once to detect and set up cameras"
+        )
+        return None
+
+    synchronizer = Synchronizer(streams)
+    sync_packet_q = synchronizer.subscribe_to_sync_packets()
+    tracker = LatencyTracker()
+    logger.info(f"Measuring latency for {duration} seconds")
+
+    start = perf_counter()
+    try:
+        while perf_counter() - start < duration:
+            try:
+                batch = sync_packet_q.get_batch(timeout=1)
+            except Empty:
+                continue
+            for sync_packet in batch:
+                if sync_packet is not None:
+                    tracker.add_sync_packet(sync_packet)
+    except KeyboardInterrupt:
+        logger.info("Latency measurement interrupted")
+
+    synchronizer.release_sync_packet_q(sync_packet_q)
+    release_streams(streams, synchronizer)
+
+    tracker.save(Path(workspace, "latency_samples.csv"))
+    return tracker
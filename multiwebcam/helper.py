@@ -35,3 +35,26 @@ def copy_contents(src_folder, dst_folder):
         elif src_item.is_dir():
             logger.info(f"Copying directory at {src_item} to {dst_item}")
             shutil.copytree(src_item, dst_item)
+
+
+def get_next_recording_directory(workspace: Path) -> str:
+    """
+    Recordings are stored in sequentially numbered folders (recording_1, recording_2...)
+    within the workspace. Returns the name of the next one.
+    """
+    folders = [item.name for item in Path(workspace).iterdir() if item.is_dir()]
+    recording_folders = [
+        folder for folder in folders if folder.startswith("recording_")
+    ]
+    recording_counts = [folder.split("_")[1] for folder in recording_folders]
+    recording_counts = [
+        int(rec_count) for rec_count in recording_counts if rec_count.isnumeric()
+    ]
+
+    if len(recording_counts) == 0:
+        next_directory = "recording_1"
+
+    else:
+        next_directory = "recording_" + str(max(recording_counts) + 1)
+
+    return next_directory
@@ -0,0 +1,100 @@
+"""
+Import-time benchmark for the core capture modules.
+
+Each module is imported in a fresh interpreter (`python -X importtime`) so the
+measurement reflects a cold start. The benchmark fails (non-zero exit) when a module
+goes over its budget or when it drags in a dependency that should only be loaded
+by the GUI or by playback.
+
+    python -m multiwebcam.import_benchmark
+    python -m multiwebcam.import_benchmark --scale 2.0   # loosen budgets on slow machines
+"""
+
+import argparse
+import subprocess
+import sys
+
+# cumulative import time budgets in milliseconds. OpenCV and NumPy are genuine
+# requirements of capture so the modules that need them carry their cost.
+IMPORT_BUDGETS_MS = {
+    "multiwebcam": 50,
+    "multiwebcam.logger": 80,
+    "multiwebcam.interface": 80,
+    "multiwebcam.configurator": 120,
+    "multiwebcam.cameras.synchronizer": 300,
+    "multiwebcam.cameras.live_stream": 600,
+    "multiwebcam.recording.multi_video_recorder": 600,
+    "multiwebcam.headless": 600,
+}
+
+# none of the core capture modules should load these
+FORBIDDEN_MODULES = ["PySide6", "pandas"]
+
+REPEATS = 3  # best of several runs to reduce noise from the OS
+
+
+def measure_import(module: str) -> tuple[float, list[str]]:
+    """
+    Returns the cumulative import time of `module` in milliseconds along with
+    any forbidden modules that were loaded along the way
+    """
+    check = (
+        f"import sys, {module}; "
+        f"print(','.join(m for m in {FORBIDDEN_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", check],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    cumulative_us = None
+    for line in result.stderr.splitlines():
+        # format is `import time: self [us] | cumulative | imported package`
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:") :].split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            cumulative_us = int(fields[1])
+
+    loaded_forbidden = [m for m in result.stdout.strip().split(",") if m]
+    return cumulative_us / 1000, loaded_forbidden
+
+
+def run_benchmark(scale: float = 1.0) -> bool:
+    passed = True
+    for module, budget in IMPORT_BUDGETS_MS.items():
+        budget = budget * scale
+        timings = []
+        for _ in range(REPEATS):
+            elapsed, loaded_forbidden = measure_import(module)
+            timings.append(elapsed)
+        elapsed = min(timings)
+
+        status = "ok"
+        if elapsed > budget:
+            status = "OVER BUDGET"
+            passed = False
+        if loaded_forbidden:
+            status = f"LOADS {', '.join(loaded_forbidden)}"
+            passed = False
+
+        print(f"{module:45s} {elapsed:8.1f} ms  (budget {budget:6.0f} ms)  {status}")
+
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--scale", type=float, default=1.0, help="multiply all budgets by this factor"
+    )
+    args = parser.parse_args()
+
+    if not run_benchmark(args.scale):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
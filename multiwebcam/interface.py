@@ -1,8 +1,12 @@
-from dataclasses import dataclass
-import numpy as np
-from queue import Queue
-from abc import ABC, abstractmethod
-import cv2
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import TYPE_CHECKING
+
+# numpy is only needed for annotations here; keep the interface cheap to import
+if TYPE_CHECKING:
+    import numpy as np
 
 
 # @dataclass(slots=True)
@@ -18,34 +22,67 @@ class FramePacket:
     frame_time: float
     frame: np.ndarray
     fps: float
+    # reduced resolution versions of frame, shared by every consumer of the packet
+    variants: dict = field(default_factory=dict)
+    # consumers on several threads may ask for the same variant at once
+    variant_lock: Lock = field(default_factory=Lock, repr=False, compare=False)
+
+    def variant(self, name: str = "full") -> np.ndarray | None:
+        """
+        The frame as the named stream variant ("full", "half", "thumbnail"). The first
+        consumer to ask makes it, on its own thread, and it is kept for the rest.
+        """
+        if name == "full" or self.frame is None:
+            return self.frame
+        variant = self.variants.get(name)
+        if variant is None:
+            with self.variant_lock:
+                variant = self.variants.get(name)
+                if variant is None:
+                    # OpenCV is only pulled in by consumers that actually scale frames
+                    from multiwebcam.cameras.stream_variants import make_variant
+
+                    variant = make_variant(self.frame, name, self.variants)
+                    self.variants[name] = variant
+        return variant
 
 @dataclass(frozen=True, slots=True)
 class SyncPacket:
     """
     SyncPacket holds syncronized frame packets.
+
+    Every packet from a synchronizer shares the same port order, fixed when the
+    synchronizer is created. Per port values are stored positionally in that order:
+    the frame packets themselves (None where the port dropped a frame) along with
+    small arrays of frame times (nan if dropped), frame indices (-1 if dropped) and
+    a presence mask, so that consumers can work across ports without a Python loop.
     """
 
     sync_index: int
-    frame_packets: dict
+    ports: tuple
+    packets: tuple
+    frame_times: np.ndarray
+    frame_indices: np.ndarray
+    present: np.ndarray
+
+    def index_of(self, port: int) -> int:
+        return self.ports.index(port)
+
+    def frame_packet(self, port: int) -> FramePacket | None:
+        return self.packets[self.ports.index(port)]
+
+    @property
+    def frame_packets(self) -> dict:
+        """port keyed view of the frame packets for code that prefers a dictionary"""
+        return dict(zip(self.ports, self.packets))
 
     @property
     def dropped(self):
         """
         convencience method to ease tracking of dropped frame rate within the synchronizer
         """
-        temp_dict = {}
-        for port, packet in self.frame_packets.items():
-            if packet is None:
-                temp_dict[port] = 1
-            else:
-                temp_dict[port] = 0
-        return temp_dict
+        return dict(zip(self.ports, (~self.present).astype(int).tolist()))
     
     @property
     def frame_packet_count(self):
-        count = 0
-        for port, packet in self.frame_packets.items():
-            if packet is not None:
-                 count+= 1
-        return count
-        
+        return int(self.present.sum())
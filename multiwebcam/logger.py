@@ -1,16 +1,22 @@
-# Construct a single logger that will be used throughout 
+# Construct a single logger that will be used throughout
 # Detail will be logged to a single file with INFO logged to the console
+#
+# Records are not formatted or written on the thread that logs them. Every package
+# logger hands records to one queue, and a single background listener thread does
+# the formatting and the file/console/Qt output. Handlers are installed exactly once.
 
+import atexit
 import logging
-from PySide6 import QtCore
-import sys
-import os
+import logging.handlers
+import queue
+import time
 from pathlib import Path
 from multiwebcam import __log_dir__
 
+PACKAGE_LOGGER_NAME = "multiwebcam"
 
 # only one file handler accross package so all messages logged to one file
-
+__log_dir__.mkdir(exist_ok=True, parents=True)
 app_dir_file_handler = logging.FileHandler(Path(__log_dir__,'calibration.log'), "w+")
 app_dir_file_handler.setLevel(logging.INFO)
 
@@ -29,69 +35,88 @@ console_handler.setFormatter(console_formatter)
 # log_level_overides = {"multiwebcam.cameras.live_stream": logging.INFO}
 
 
-class QtHandler(logging.Handler):
+class RateLimitFilter(logging.Filter):
     """
-    Adapted from discussion here: https://stackoverflow.com/questions/24469662/how-to-redirect-logger-output-into-pyqt-text-widget
-    This handler will allow a QDialog box to pick up the logger output which may be useful for a  
-    splash screen to show users that something is happening during big processing moments like:
-    - loading/finding cameras
+    Opt-in rate limiting per call site. A call such as
+
+        logger.warning("Skipped frame", extra={"rate_limit": 5})
 
-    - building / unbuilding synchronizer
-    - performing stereocalibration
+    is emitted at most once every 5 seconds from that line; the number of
+    suppressed records is appended to the next one that gets through.
     """
+
     def __init__(self):
-        logging.Handler.__init__(self)
-        # qt_log_format =" %(levelname)s| %(name)s |%(message)s"
-        qt_log_format =" %(name)s|%(message)s"
-        qt_formatter = logging.Formatter(qt_log_format)
-        self.setFormatter(qt_formatter)
-
-    def emit(self, record):
-        record = self.format(record)
-        if record: XStream.stdout().write(f"{record} \n")
-
-
-class XStream(QtCore.QObject):
-    _stdout = None
-    _stderr = None
-    messageWritten = QtCore.Signal(str)
-    def flush( self ):
-        pass
-    def fileno( self ):
-        return -1
-    def write( self, msg ):
-        if ( not self.signalsBlocked() ):
-            self.messageWritten.emit(msg)
-
-    @staticmethod
-    def stdout():
-        if ( not XStream._stdout ):
-            XStream._stdout = XStream()
-            sys.stdout = XStream._stdout
-        return XStream._stdout
-
-    @staticmethod
-    def stderr():
-        if ( not XStream._stderr ):
-            XStream._stderr = XStream()
-            sys.stderr = XStream._stderr
-        return XStream._stderr
+        super().__init__()
+        self.call_sites = {}
+
+    def filter(self, record):
+        interval = getattr(record, "rate_limit", None)
+        if interval is None:
+            return True
+
+        call_site = (record.pathname, record.lineno)
+        now = time.monotonic()
+        last_emit, suppressed = self.call_sites.get(call_site, (None, 0))
+
+        if last_emit is not None and now - last_emit < interval:
+            self.call_sites[call_site] = (last_emit, suppressed + 1)
+            return False
+
+        if suppressed > 0:
+            record.msg = f"{record.msg} ({suppressed} similar messages suppressed)"
+        self.call_sites[call_site] = (now, 0)
+        return True
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    The standard QueueHandler fully formats each record before queueing it. Here only
+    the message itself is rendered (so arguments are captured as they were when logged)
+    and the rest of the formatting is left to the listener thread.
+    """
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+log_queue = queue.SimpleQueue()
+
+queue_handler = DeferredQueueHandler(log_queue)
+queue_handler.addFilter(RateLimitFilter())
+
+log_listener = logging.handlers.QueueListener(
+    log_queue, app_dir_file_handler, console_handler, respect_handler_level=True
+)
+log_listener.start()
+atexit.register(log_listener.stop)
+
+# every logger within the package propagates to this one, so the queue handler
+# only needs to be attached here
+package_logger = logging.getLogger(PACKAGE_LOGGER_NAME)
+package_logger.setLevel(logging.INFO)
+package_logger.addHandler(queue_handler)
+
 
 def get(name): # as in __name__
     logger = logging.getLogger(name)
 
-    logger.setLevel(logging.INFO) 
-    
-    logger.addHandler(app_dir_file_handler)
-    logger.addHandler(console_handler)
- 
-    # avoid stepping through XStream object if in debug 
-    if os.getenv("DEBUG") != '1':
-        qt_handler = QtHandler()
-        logger.addHandler(qt_handler)
-    
-    # qt_handler = QtHandler()
-    # logger.addHandler(qt_handler)
+    logger.setLevel(logging.INFO)
+
+    # loggers outside the package (e.g. __main__ when running a module directly)
+    # do not propagate to the package logger so get the queue handler directly
+    in_package = name == PACKAGE_LOGGER_NAME or name.startswith(PACKAGE_LOGGER_NAME + ".")
+    if not in_package and queue_handler not in logger.handlers:
+        logger.addHandler(queue_handler)
 
     return logger
 
+
+def add_handler(handler: logging.Handler):
+    """
+    Attach an additional output (e.g. the Qt log window) to the listener thread.
+    Adding the same handler more than once has no effect.
+    """
+    if handler not in log_listener.handlers:
+        log_listener.handlers = log_listener.handlers + (handler,)
@@ -0,0 +1,303 @@
+"""
+A dedicated disk I/O stage for the recorders.
+
+The thread that pulls packets off the synchronizer (or stream) queue only hands work
+to the stage; the actual encoder/file writes happen on the stage's worker threads. A slow
+fsync or a brief storage stall therefore accumulates on the stage's queue rather than
+backing up into the synchronizer.
+
+Two kinds of targets can be registered under a key:
+- writers: any object with `write(*args)` and `release()` (cv2.VideoWriter, RawFrameWriter)
+- files: byte sinks whose small writes (e.g. frame history rows) are coalesced into large
+  sequential writes
+
+A write that fails on a worker (disk full, encoder error) is logged and recorded on the
+stage, and raised to the producer as a DiskWriteError from its next write() or close().
+"""
+
+import multiwebcam.logger
+
+import os
+from pathlib import Path
+from queue import Queue, Empty, Full
+from threading import Thread, Lock
+from time import perf_counter
+
+logger = multiwebcam.logger.get(__name__)
+
+COALESCE_BYTES = 4 * 1024 * 1024  # buffered file output is written out in blocks of this size
+FLUSH_INTERVAL = 1.0  # seconds; buffered file output older than this is written out when idle
+STATS_LOG_INTERVAL = 10  # seconds between periodic throughput reports
+MAX_QUEUED_WRITES = 120  # per worker; write() blocks once this many are waiting on the disk
+
+
+class DiskWriteError(Exception):
+    """A write to disk failed on one of the stage's worker threads"""
+
+
+class CoalescedFile:
+    """
+    Buffers small writes and commits them to disk as large sequential writes.
+    If preallocate_bytes is given the space is reserved up front and the file is
+    truncated back to the written length when closed.
+    """
+
+    def __init__(self, path: Path, preallocate_bytes: int = None):
+        self.path = path
+        self.file = open(path, "wb")
+        self.buffer = bytearray()
+        self.bytes_written = 0
+        self.last_flush = perf_counter()
+        self.preallocated = False
+
+        if preallocate_bytes:
+            self.preallocate(preallocate_bytes)
+
+    def preallocate(self, size: int):
+        try:
+            if hasattr(os, "posix_fallocate"):
+                os.posix_fallocate(self.file.fileno(), 0, size)
+            else:
+                self.file.truncate(size)
+                self.file.seek(0)
+            self.preallocated = True
+            logger.info(f"Preallocated {size / 1e6:.1f} MB for {self.path}")
+        except OSError as e:
+            logger.warning(f"Unable to preallocate space for {self.path}: {e}")
+
+    def write(self, payload: bytes):
+        self.buffer += payload
+        if len(self.buffer) >= COALESCE_BYTES:
+            return self.flush()
+        return 0
+
+    def flush(self):
+        byte_count = len(self.buffer)
+        if byte_count > 0:
+            self.file.write(self.buffer)
+            self.buffer.clear()
+            self.bytes_written += byte_count
+        self.last_flush = perf_counter()
+        return byte_count
+
+    def release(self):
+        self.flush()
+        if self.preallocated:
+            self.file.truncate(self.file.tell())
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+
+
+class DiskWriteStage:
+    """
+    Queue-fed worker threads that perform all disk writes for a recorder.
+
+    Each key is pinned to one worker so writes to a given target stay in order.
+    Queue latency (time from `write` being called to the write being performed) and
+    throughput are tracked and available from `stats()`.
+    """
+
+    def __init__(self, name: str = "recorder", workers: int = 1):
+        self.name = name
+        self.worker_count = max(1, workers)
+        # bounded so a stalled disk holds back the producer rather than filling memory
+        self.job_queues = [Queue(MAX_QUEUED_WRITES) for _ in range(self.worker_count)]
+        self.error = None  # first failure on a worker, raised to the producer
+
+        self.targets = {}
+        self.key_worker = {}
+        self._next_worker = 0
+
+        self.stats_lock = Lock()
+        self.bytes_written = 0
+        self.frames_written = 0
+        self.jobs_completed = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.start_time = perf_counter()
+        self.last_stats_log = self.start_time
+        self.last_stall_log = 0
+
+        self.threads = []
+        for i in range(self.worker_count):
+            t = Thread(target=self._io_worker, args=(i,), daemon=True)
+            t.start()
+            self.threads.append(t)
+
+    def _assign_worker(self, key):
+        worker = self._next_worker % self.worker_count
+        self._next_worker += 1
+        self.key_worker[key] = worker
+        return worker
+
+    def add_writer(self, key, writer):
+        """Register an object with write(*args)/release() (e.g. a cv2.VideoWriter)"""
+        self._assign_worker(key)
+        self.targets[key] = writer
+
+    def open_file(self, key, path: Path, preallocate_bytes: int = None):
+        """Register a coalesced byte sink; the file is opened on the worker thread"""
+        worker = self._assign_worker(key)
+        self.job_queues[worker].put(
+            ("open", key, (path, preallocate_bytes), perf_counter())
+        )
+
+    def write(self, key, *args):
+        """
+        Queue a write to the target registered under key; only blocks while the worker
+        already has MAX_QUEUED_WRITES waiting. For writers, args are passed to
+        writer.write; for files, args[0] is bytes. Raises DiskWriteError if an earlier
+        write on the stage failed.
+        """
+        self.raise_error()
+        job_q = self.job_queues[self.key_worker[key]]
+        job = ("write", key, args, perf_counter())
+        try:
+            job_q.put(job, block=False)
+        except Full:
+            if perf_counter() - self.last_stall_log > STATS_LOG_INTERVAL:
+                self.last_stall_log = perf_counter()
+                logger.warning(f"Disk write stage for {self.name} is full; waiting on the disk")
+            while True:
+                try:
+                    job_q.put(job, timeout=1)
+                    break
+                except Full:
+                    self.raise_error()
+
+    def raise_error(self):
+        if self.error is not None:
+            raise DiskWriteError(f"Disk write failed for {self.name}: {self.error}") from self.error
+
+    @property
+    def backlog(self):
+        return sum(q.qsize() for q in self.job_queues)
+
+    def stats(self) -> dict:
+        with self.stats_lock:
+            elapsed = perf_counter() - self.start_time
+            jobs = max(self.jobs_completed, 1)
+            return {
+                "bytes_written": self.bytes_written,
+                "frames_written": self.frames_written,
+                "throughput_MBps": self.bytes_written / elapsed / 1e6 if elapsed > 0 else 0,
+                "mean_queue_latency": self.latency_total / jobs,
+                "max_queue_latency": self.latency_max,
+                "backlog": self.backlog,
+            }
+
+    def close(self):
+        """
+        Drain all queued writes, release every target and wait for the workers to end.
+        Raises DiskWriteError if anything failed along the way.
+        """
+        logger.info(f"Closing disk write stage for {self.name} with {self.backlog} queued writes")
+        for q in self.job_queues:
+            q.put(None)
+        for t in self.threads:
+            t.join()
+
+        stats = self.stats()
+        logger.info(
+            f"Disk write stage for {self.name} closed: {stats['frames_written']} frames, "
+            f"{stats['bytes_written'] / 1e6:.1f} MB of file output, "
+            f"mean queue latency {stats['mean_queue_latency'] * 1000:.1f} ms, "
+            f"max queue latency {stats['max_queue_latency'] * 1000:.1f} ms"
+        )
+        self.raise_error()
+
+    def _record_job(self, enqueue_time, byte_count=0, frame_count=0):
+        latency = perf_counter() - enqueue_time
+        with self.stats_lock:
+            self.jobs_completed += 1
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+            self.bytes_written += byte_count
+            self.frames_written += frame_count
+
+    def _log_stats(self):
+        now = perf_counter()
+        if now - self.last_stats_log > STATS_LOG_INTERVAL:
+            self.last_stats_log = now
+            stats = self.stats()
+            logger.info(
+                f"Disk write stage for {self.name}: {stats['throughput_MBps']:.2f} MB/s file output, "
+                f"mean queue latency {stats['mean_queue_latency'] * 1000:.1f} ms, backlog {stats['backlog']}"
+            )
+
+    def _flush_idle_files(self, keys):
+        now = perf_counter()
+        for key in keys:
+            target = self.targets[key]
+            if target.buffer and now - target.last_flush > FLUSH_INTERVAL:
+                byte_count = target.flush()
+                with self.stats_lock:
+                    self.bytes_written += byte_count
+
+    def _fail(self, key, error: Exception):
+        logger.exception(f"Disk write to {key} failed for {self.name}")
+        if self.error is None:
+            self.error = error
+
+    def _io_worker(self, worker: int):
+        job_q = self.job_queues[worker]
+        file_keys = []
+
+        while True:
+            try:
+                job = job_q.get(timeout=FLUSH_INTERVAL)
+            except Empty:
+                try:
+                    self._flush_idle_files(file_keys)
+                except Exception as error:
+                    self._fail(file_keys, error)
+                continue
+
+            if job is None:
+                break
+
+            kind, key, args, enqueue_time = job
+            if self.error is not None:
+                # keep draining so the producer is not blocked; it hears of the failure
+                # on its next write
+                continue
+
+            try:
+                if kind == "open":
+                    path, preallocate_bytes = args
+                    self.targets[key] = CoalescedFile(path, preallocate_bytes)
+                    file_keys.append(key)
+                    self._record_job(enqueue_time)
+
+                elif kind == "write":
+                    target = self.targets[key]
+                    if isinstance(target, CoalescedFile):
+                        byte_count = target.write(args[0])
+                        self._record_job(enqueue_time, byte_count=byte_count)
+                    else:
+                        target.write(*args)
+                        self._record_job(enqueue_time, frame_count=1)
+
+                if job_q.empty():
+                    self._flush_idle_files(file_keys)
+            except Exception as error:
+                self._fail(key, error)
+
+            if worker == 0:
+                self._log_stats()
+
+        # a proper release is strictly necessary to ensure files are readable
+        for key, target in list(self.targets.items()):
+            if self.key_worker[key] == worker:
+                try:
+                    if isinstance(target, CoalescedFile):
+                        byte_count = len(target.buffer)
+                        target.release()
+                        with self.stats_lock:
+                            self.bytes_written += byte_count
+                    else:
+                        logger.info(f"Releasing writer {key} for {self.name}")
+                        target.release()
+                except Exception as error:
+                    self._fail(key, error)
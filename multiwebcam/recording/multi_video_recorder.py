@@ -1,16 +1,31 @@
 # from PySide6.QtCore import QObject, Signal
+import shutil
 from pathlib import Path
 from queue import Queue
-import pandas as pd
 from threading import Thread, Event
 import cv2
+import numpy as np
 
+from multiwebcam.batch_queue import BatchQueue
 from multiwebcam.cameras.synchronizer import Synchronizer
+from multiwebcam.cameras.undistortion import Undistorter, UndistortingWriter
 from multiwebcam.interface import SyncPacket
+from multiwebcam.recording.disk_io import DiskWriteError, DiskWriteStage
+from multiwebcam.recording.raw_frame_store import RawFrameWriter, RawTranscoder, raw_frame_bytes
 import multiwebcam.logger
 
 logger = multiwebcam.logger.get(__name__)
 
+# upper bound on the length of a raw capture; used to preallocate the memory-mapped files
+RAW_CAPTURE_MAX_SECONDS = 60
+RAW_CAPTURE_MIN_SECONDS = 5  # below this much room on disk, record encoded video instead
+RAW_CAPTURE_DISK_RESERVE = 2 * 1024**3  # bytes left free on the drive beyond the raw capture
+
+FRAME_HISTORY_KEY = "frame_history"
+
+# upper bound on the sync packets pulled off the queue and processed together
+SYNC_PACKET_BATCH_SIZE = 32
+
 
 class MultiVideoRecorder:
     def __init__(self, synchronizer: Synchronizer, suffix: str = None):
@@ -32,8 +47,25 @@ class MultiVideoRecorder:
         self.sync_index = 0  # no sync packets at init... absence of initialized value can cause errors elsewhere
         # build dict that will be stored to csv
         self.trigger_stop = Event()
-
-        self.sync_packet_in_q = Queue(-1)
+        self.final_sync_index = None  # when set, later layers are not saved
+
+        self.sync_packet_in_q = BatchQueue(-1)
+
+        self.raw_capture = False
+        self.transcoder = None
+        self.preallocate_bytes = None
+        self.undistort = False
+        self.preroll = None
+        self.write_stage = None
+        self.write_error = None  # set if saving failed part way
+
+    @property
+    def backlog(self) -> int:
+        """Sync packets waiting to be processed plus writes waiting to reach disk"""
+        backlog = self.sync_packet_in_q.qsize()
+        if self.write_stage is not None:
+            backlog += self.write_stage.backlog
+        return backlog
 
     def build_video_writers(self):
         """
@@ -53,20 +85,83 @@ class MultiVideoRecorder:
             writer = cv2.VideoWriter(path, fourcc, stream.fps_target, frame_size)
             self.video_writers[port] = writer
 
+    def build_raw_writers(self, max_seconds: float) -> bool:
+        """
+        Raw capture skips the encoder entirely while recording. Frames are copied into
+        preallocated memory-mapped files and transcoded to mp4 once recording stops.
+
+        The files are sized to what fits on the drive (up to max_seconds). Returns False,
+        having built nothing, if not even RAW_CAPTURE_MIN_SECONDS would fit.
+        """
+        streams = self.synchronizer.streams
+        bytes_per_second = sum(
+            raw_frame_bytes(stream.size) * stream.fps_target for stream in streams.values()
+        )
+        available = shutil.disk_usage(self.destination_folder).free - RAW_CAPTURE_DISK_RESERVE
+        seconds = min(max_seconds, available / bytes_per_second)
+
+        if seconds < RAW_CAPTURE_MIN_SECONDS:
+            logger.warning(
+                f"Only {max(available, 0) / 1e9:.1f} GB available at {self.destination_folder}, "
+                f"not enough for raw capture ({bytes_per_second / 1e9:.2f} GB/s); recording encoded video instead"
+            )
+            return False
+        if seconds < max_seconds:
+            logger.warning(
+                f"Raw capture limited to {seconds:.0f} s by the {available / 1e9:.1f} GB available at {self.destination_folder}"
+            )
+
+        self.video_writers = {}
+        # frames handed to each raw writer so far, so the recording can end cleanly
+        # when a buffer fills rather than logging history rows for dropped frames
+        self.raw_capacity = {}
+        self.raw_queued = {}
+        for port, stream in streams.items():
+            capacity = int(seconds * stream.fps_target)
+            self.raw_capacity[port] = capacity
+            self.raw_queued[port] = 0
+            writer = RawFrameWriter(
+                self.destination_folder, port, stream.size, capacity, suffix=self.suffix
+            )
+            self.video_writers[port] = writer
+        return True
+
+    def wrap_undistorting_writers(self):
+        """
+        Frames from calibrated cameras are undistorted with cached remap tables on the
+        write stage workers, so the correction does not slow the thread reading packets
+        """
+        for port, stream in self.synchronizer.streams.items():
+            undistorter = Undistorter(stream.camera)
+            if undistorter.calibrated:
+                logger.info(f"Recording undistorted frames at port {port}")
+                self.video_writers[port] = UndistortingWriter(self.video_writers[port], undistorter)
+            else:
+                logger.warning(f"Camera at port {port} is not calibrated; recording frames as captured")
+
     def save_data_worker(
         self, include_video: bool, show_points: bool, store_point_history: bool
     ):
+        # all encoder and file output is handed off to the disk write stage so that
+        # a slow disk does not hold up the thread pulling packets off the queue
+        self.write_stage = DiskWriteStage(
+            name="multi video recorder", workers=len(self.synchronizer.ports)
+        )
+
         # connect video recorder to synchronizer via an "in" queue
         if include_video:
-            self.build_video_writers()
+            if self.raw_capture and not self.build_raw_writers(self.raw_max_seconds):
+                self.raw_capture = False
+            if not self.raw_capture:
+                self.build_video_writers()
 
-        # I think I put this here so that it will get reset if you reuse the same recorder..
-        self.frame_history = {
-            "sync_index": [],
-            "port": [],
-            "frame_index": [],
-            "frame_time": [],
-        }
+            if self.undistort:
+                self.wrap_undistorting_writers()
+
+            for port, writer in self.video_writers.items():
+                self.write_stage.add_writer(port, writer)
+
+            self.open_frame_history()
 
         self.point_data_history = {
             "sync_index": [],
@@ -82,83 +177,172 @@ class MultiVideoRecorder:
 
         self.synchronizer.subscribe_to_sync_packets(self.sync_packet_in_q)
         syncronizer_subscription_released = False
-
-        # this is where the issue is... need to figure out when the queue is empty...
-        logger.info("Entering Save data worker loop entered")
-        while self.sync_packet_in_q.qsize() > 0 or not self.trigger_stop.is_set():
-            sync_packet: SyncPacket = self.sync_packet_in_q.get()
-
-            # provide periodic updates of recording queue
-            logger.debug("Getting size of sync packet q")
-            backlog = self.sync_packet_in_q.qsize()
-            if backlog % 25 == 0 and backlog != 0:
-                logger.info(
-                    f"Size of unsaved frames on the recording queue is {self.sync_packet_in_q.qsize()}"
-                )
-
-            if sync_packet is None:
-                # relenvant when
-                logger.info("End of sync packets signaled...breaking record loop")
-                break
-
-            self.sync_index = sync_packet.sync_index
-
-            for port, frame_packet in sync_packet.frame_packets.items():
-                if frame_packet is not None:
-                    logger.debug("Processiong frame packet...")
-                    # read in the data for this frame for this port
-                    if show_points:
-                        frame = frame_packet.frame_with_points
-                    else:
-                        frame = frame_packet.frame
-
-                    frame_index = frame_packet.frame_index
-                    frame_time = frame_packet.frame_time
-
-                    if include_video:
-                        # store the frame
-                        if self.sync_index % 50 == 0:
-                            logger.debug(
-                                f"Writing frame for port {port} and sync index {self.sync_index}"
-                            )
-                            logger.debug(f"frame size  {frame.shape}")
-
-                        self.video_writers[port].write(frame)
-
-                        # store to assocated data in the dictionary
-                        self.frame_history["sync_index"].append(self.sync_index)
-                        self.frame_history["port"].append(port)
-                        self.frame_history["frame_index"].append(frame_index)
-                        self.frame_history["frame_time"].append(frame_time)
-
-
-            if not syncronizer_subscription_released and self.trigger_stop.is_set():
-                logger.info("Save frame worker winding down...")
-                syncronizer_subscription_released = True
+        preroll_pending = self.preroll is not None
+
+        try:
+            # this is where the issue is... need to figure out when the queue is empty...
+            logger.info("Entering Save data worker loop entered")
+            while self.sync_packet_in_q.qsize() > 0 or not self.trigger_stop.is_set():
+                # everything that has queued up (within limits) is handled in one pass, which
+                # amortizes the per packet overhead when catching up on a backlog
+                sync_packets = self.sync_packet_in_q.get_batch(max_items=SYNC_PACKET_BATCH_SIZE)
+
+                # provide periodic updates of recording queue
+                logger.debug("Getting size of sync packet q")
+                backlog = self.sync_packet_in_q.qsize()
+                if backlog % 25 == 0 and backlog != 0:
+                    logger.info(
+                        f"Size of unsaved frames on the recording queue is {self.sync_packet_in_q.qsize()}"
+                    )
+
+                if preroll_pending and sync_packets and sync_packets[0] is not None:
+                    # the layers buffered before the first live one go out ahead of it
+                    preroll_pending = False
+                    self.flush_preroll(sync_packets[0].sync_index, include_video, show_points)
+
+                # history rows for the whole batch are passed to the write stage as one block
+                history_rows = []
+                end_of_packets = False
+                for sync_packet in sync_packets:
+                    if sync_packet is None:
+                        # relenvant when
+                        logger.info("End of sync packets signaled...breaking record loop")
+                        end_of_packets = True
+                        break
+
+                    if (
+                        self.final_sync_index is not None
+                        and sync_packet.sync_index > self.final_sync_index
+                    ):
+                        # still queued from before the subscription was released
+                        continue
+
+                    self.store_sync_packet(sync_packet, include_video, show_points, history_rows)
+
+                if history_rows:
+                    self.write_stage.write(FRAME_HISTORY_KEY, "".join(history_rows).encode())
+
+                if end_of_packets:
+                    break
+
+                if not syncronizer_subscription_released and self.trigger_stop.is_set():
+                    logger.info("Save frame worker winding down...")
+                    syncronizer_subscription_released = True
+                    self.synchronizer.release_sync_packet_q(self.sync_packet_in_q)
+                    # self.sync_packet_in_q = Queue(-1)
+                    # self.recording_stop_signal.emit()
+        except DiskWriteError as error:
+            # nothing more can be saved; stop taking layers and keep what made it to disk
+            logger.error(f"Recording to {self.destination_folder} stopped: {error}")
+            self.write_error = error
+            if not syncronizer_subscription_released:
                 self.synchronizer.release_sync_packet_q(self.sync_packet_in_q)
-                # self.sync_packet_in_q = Queue(-1)
-                # self.recording_stop_signal.emit()
 
         # a proper release is strictly necessary to ensure file is readable
-        if include_video:
-            logger.info("releasing video writers...")
-            for port in self.synchronizer.ports:
-                logger.info(f"releasing video writer for port {port}")
-                self.video_writers[port].release()
-
-            logger.info("Initiate storing of frame history")
-            self.store_frame_history()
+        # closing the write stage drains pending writes then releases writers and history
+        logger.info("releasing video writers and storing frame history...")
+        try:
+            self.write_stage.close()
+        except DiskWriteError as error:
+            logger.error(f"Recording to {self.destination_folder} may be incomplete: {error}")
+            self.write_error = error
+
+        if include_video and self.raw_capture:
+            logger.info("Launching background transcode of raw capture")
+            port_fps = {
+                port: stream.fps_target for port, stream in self.synchronizer.streams.items()
+            }
+            self.transcoder = RawTranscoder(
+                self.destination_folder, self.synchronizer.ports, port_fps, suffix=self.suffix
+            )
+            self.transcoder.start()
 
         logger.info("Initiate storing of point history")
         self.trigger_stop.clear()  # reset stop recording trigger
         self.recording = False
         logger.info("About to emit `all frames saved` signal")
 
-    def store_frame_history(self):
-        df = pd.DataFrame(self.frame_history)
-        frame_hist_path = str(Path(self.destination_folder, "frame_time_history.csv"))
+    def flush_preroll(self, first_live_index: int, include_video: bool, show_points: bool):
+        history_rows = []
+        flushed = 0
+        for sync_packet in self.preroll.layers_before(first_live_index):
+            self.store_sync_packet(sync_packet, include_video, show_points, history_rows)
+            flushed += 1
+            if len(history_rows) >= SYNC_PACKET_BATCH_SIZE:
+                self.write_stage.write(FRAME_HISTORY_KEY, "".join(history_rows).encode())
+                history_rows = []
+
+        if history_rows:
+            self.write_stage.write(FRAME_HISTORY_KEY, "".join(history_rows).encode())
+        logger.info(f"Wrote {flushed} preroll layers ahead of live layer {first_live_index}")
+
+    def store_sync_packet(
+        self, sync_packet: SyncPacket, include_video: bool, show_points: bool, history_rows: list
+    ):
+        """Hand the frames of one layer to the write stage and add its frame history rows"""
+        self.sync_index = sync_packet.sync_index
+
+        # only the ports with a frame in this layer
+        for row in np.flatnonzero(sync_packet.present):
+            port = sync_packet.ports[row]
+            frame_packet = sync_packet.packets[row]
+            logger.debug("Processiong frame packet...")
+            # read in the data for this frame for this port
+            if show_points:
+                frame = frame_packet.frame_with_points
+            else:
+                frame = frame_packet.frame
+
+            frame_index = frame_packet.frame_index
+            frame_time = frame_packet.frame_time
+
+            if include_video:
+                # store the frame
+                if self.sync_index % 50 == 0:
+                    logger.debug(
+                        "Writing frame for port %s and sync index %s",
+                        port,
+                        self.sync_index,
+                    )
+                    logger.debug("frame size  %s", frame.shape)
+
+                if self.raw_capture:
+                    if self.raw_queued[port] >= self.raw_capacity[port]:
+                        self.end_full_raw_capture(port)
+                        continue
+                    self.raw_queued[port] += 1
+                    self.write_stage.write(
+                        port, frame, self.sync_index, frame_index, frame_time
+                    )
+                else:
+                    self.write_stage.write(port, frame)
+
+                # store to assocated data in the frame history
+                history_rows.append(
+                    f"{self.sync_index},{port},{frame_index},{frame_time}\n"
+                )
+
+    def end_full_raw_capture(self, port):
+        """A raw buffer is full, so nothing more can be stored for this port; end the recording"""
+        if not self.trigger_stop.is_set():
+            logger.warning(
+                f"Raw capture buffer for port {port} is full ({self.raw_capacity[port]} frames); ending recording"
+            )
+            self.trigger_stop.set()
+
+    def open_frame_history(self):
+        """
+        Frame history is streamed to csv through the write stage as recording progresses
+        rather than being held in memory and written out at the end
+        """
+        frame_hist_path = Path(self.destination_folder, "frame_time_history.csv")
         logger.info(f"Storing frame history to {frame_hist_path}")
-        df.to_csv(frame_hist_path, index=False, header=True)
+        self.write_stage.open_file(
+            FRAME_HISTORY_KEY, frame_hist_path, preallocate_bytes=self.preallocate_bytes
+        )
+        self.write_stage.write(
+            FRAME_HISTORY_KEY, b"sync_index,port,frame_index,frame_time\n"
+        )
 
     def store_active_config(self):
         pass
@@ -169,10 +353,26 @@ class MultiVideoRecorder:
         include_video=True,
         show_points=False,
         store_point_history=True,
+        raw_capture=False,
+        raw_max_seconds=RAW_CAPTURE_MAX_SECONDS,
+        preallocate_bytes=None,
+        undistort=False,
+        preroll=None,
     ):
         """
         Option exists to not store video if only interested in getting points from original video
 
+        raw_capture: write frames unencoded to memory-mapped files (bounded by raw_max_seconds)
+        and transcode them to port_N.mp4 in the background after recording stops. Intended
+        for short, high-fps captures where the encoder would otherwise drop frames.
+
+        preallocate_bytes: optionally reserve space for the frame history file up front
+
+        undistort: store lens corrected frames for cameras that have a calibration
+
+        preroll: a PrerollBuffer on the same synchronizer; the layers it holds are
+        written ahead of the live ones so the recording begins that far in the past
+
         Parent of destination folder will be the source of the config file that will be stored with the video
         This enables the nested processing of videos (i.e. Recording_1 will store the main config.toml,
         then POSE subfolder will store config.toml from Recording_1). Each folder should largely become self
@@ -196,6 +396,14 @@ class MultiVideoRecorder:
         # duplicate_config_path = Path(self.destination_folder,"config.toml")
         # shutil.copy2(source_config_path,duplicate_config_path)
 
+        self.raw_capture = raw_capture
+        self.raw_max_seconds = raw_max_seconds
+        self.preallocate_bytes = preallocate_bytes
+        self.undistort = undistort
+        self.preroll = preroll
+        self.write_error = None
+        self.final_sync_index = None
+
         self.recording = True
         self.recording_thread = Thread(
             target=self.save_data_worker,
@@ -204,7 +412,12 @@ class MultiVideoRecorder:
         )
         self.recording_thread.start()
 
-    def stop_recording(self):
+    def stop_recording(self, final_sync_index: int = None):
+        """
+        final_sync_index: end the recording exactly on this layer, leaving anything
+        later for another recording to pick up (e.g. from a preroll buffer)
+        """
+        self.final_sync_index = final_sync_index
         logger.info("about to Stop recording initiated within VideoRecorder")
         self.trigger_stop.set()
         logger.info("Stop recording initiated within VideoRecorder")
@@ -0,0 +1,234 @@
+"""
+Keep the last few seconds of synchronized layers in memory so a recording can begin
+before the moment it was started.
+
+The buffer subscribes to the Synchronizer like a recorder would, but only holds on
+to the most recent `seconds` of layers (and never more than `max_bytes`), dropping
+the oldest as new ones arrive. Frames can optionally be held JPEG compressed, which
+cuts memory use by roughly an order of magnitude at the cost of some CPU; encoding
+and decoding run on a small thread pool since OpenCV releases the GIL while it works.
+
+When a MultiVideoRecorder starts with a preroll buffer, it writes out the buffered
+layers that come before its first live layer and then carries on live, so the
+recording has neither a gap nor a duplicated layer at the seam. Layers already
+written out (by an earlier flush, or claimed by a recording that ended on them) are
+not handed out again, so back to back recordings do not overlap.
+"""
+
+import multiwebcam.logger
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from queue import Empty
+from threading import Condition, Event, Thread
+
+import cv2
+import numpy as np
+
+from multiwebcam.cameras.synchronizer import Synchronizer
+from multiwebcam.interface import FramePacket, SyncPacket
+
+logger = multiwebcam.logger.get(__name__)
+
+DEFAULT_MAX_BYTES = 2 * 1024**3  # hard ceiling on buffered frame data
+CATCH_UP_TIMEOUT = 2.0  # seconds to wait for the buffer to reach the first live layer
+
+
+class _CompressedLayer:
+    """A sync packet whose frames are held as JPEG bytes"""
+
+    __slots__ = ("sync_packet", "payloads")
+
+    def __init__(self, sync_packet: SyncPacket, payloads: list):
+        self.sync_packet = sync_packet  # packets hold frame=None
+        self.payloads = payloads
+
+
+def _encode(frame: np.ndarray, quality: int) -> bytes:
+    success, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not success:
+        raise ValueError("JPEG encoding failed")
+    return encoded.tobytes()
+
+
+def _decode(payload: bytes) -> np.ndarray:
+    return cv2.imdecode(np.frombuffer(payload, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+class PrerollBuffer:
+    def __init__(
+        self,
+        synchronizer: Synchronizer,
+        seconds: float,
+        jpeg_quality: int = None,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        workers: int = None,
+    ):
+        """
+        seconds: how far back a recording started now can reach
+        jpeg_quality: hold frames JPEG compressed at this quality; None holds them as is
+        """
+        self.synchronizer = synchronizer
+        self.seconds = seconds
+        self.jpeg_quality = jpeg_quality
+        self.max_bytes = max_bytes
+
+        self.layers = deque()  # (newest frame time, sync_index, layer, bytes)
+        self.buffered_bytes = 0
+        self.latest_sync_index = -1
+        self.claimed_through = -1  # layers up to here belong to an earlier recording
+        self.updated = Condition()
+
+        if jpeg_quality is not None:
+            if workers is None:
+                workers = max(1, len(synchronizer.ports))
+            self.codec_pool = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="preroll_codec"
+            )
+        else:
+            self.codec_pool = None
+
+        self.stop_event = Event()
+        self.sync_packet_q = synchronizer.subscribe_to_sync_packets()
+        self.thread = Thread(target=self._buffer_worker, args=(), daemon=True)
+        self.thread.start()
+        logger.info(
+            f"Preroll buffer holding {seconds} s of layers"
+            + (f" as JPEG (quality {jpeg_quality})" if jpeg_quality is not None else "")
+        )
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+        self.synchronizer.release_sync_packet_q(self.sync_packet_q)
+        if self.codec_pool is not None:
+            self.codec_pool.shutdown()
+        with self.updated:
+            self.layers.clear()
+            self.buffered_bytes = 0
+
+    def _buffer_worker(self):
+        while not self.stop_event.is_set():
+            try:
+                batch = self.sync_packet_q.get_batch(timeout=0.5)
+            except Empty:
+                continue
+
+            for sync_packet in batch:
+                if sync_packet is None:
+                    # synchronizer has stopped
+                    return
+                self.add(sync_packet)
+
+    def add(self, sync_packet: SyncPacket):
+        present = sync_packet.present
+        if not present.any():
+            return
+        frame_time = float(np.nanmax(sync_packet.frame_times))
+
+        if self.codec_pool is None:
+            layer = sync_packet
+            size = sum(sync_packet.packets[row].frame.nbytes for row in np.flatnonzero(present))
+        else:
+            layer = self._compress(sync_packet)
+            size = sum(len(payload) for payload in layer.payloads)
+
+        with self.updated:
+            self.layers.append((frame_time, sync_packet.sync_index, layer, size))
+            self.buffered_bytes += size
+            self.latest_sync_index = sync_packet.sync_index
+
+            # drop whatever has aged out of the window or pushes past the memory cap
+            while self.layers and (
+                frame_time - self.layers[0][0] > self.seconds
+                or self.buffered_bytes > self.max_bytes
+            ):
+                self.buffered_bytes -= self.layers.popleft()[3]
+
+            self.updated.notify_all()
+
+    def _compress(self, sync_packet: SyncPacket) -> _CompressedLayer:
+        rows = np.flatnonzero(sync_packet.present)
+        frames = [sync_packet.packets[row].frame for row in rows]
+        payloads = list(
+            self.codec_pool.map(_encode, frames, [self.jpeg_quality] * len(frames))
+        )
+
+        # keep the metadata but not the full frames
+        packets = list(sync_packet.packets)
+        for row in rows:
+            frame_packet = packets[row]
+            packets[row] = FramePacket(
+                port=frame_packet.port,
+                frame_index=frame_packet.frame_index,
+                frame_time=frame_packet.frame_time,
+                frame=None,
+                fps=frame_packet.fps,
+            )
+        stripped = SyncPacket(
+            sync_packet.sync_index,
+            sync_packet.ports,
+            tuple(packets),
+            sync_packet.frame_times,
+            sync_packet.frame_indices,
+            sync_packet.present,
+        )
+        return _CompressedLayer(stripped, payloads)
+
+    def _expand(self, layer) -> SyncPacket:
+        if not isinstance(layer, _CompressedLayer):
+            return layer
+
+        sync_packet = layer.sync_packet
+        rows = np.flatnonzero(sync_packet.present)
+        frames = self.codec_pool.map(_decode, layer.payloads)
+
+        packets = list(sync_packet.packets)
+        for row, frame in zip(rows, frames):
+            frame_packet = packets[row]
+            packets[row] = FramePacket(
+                port=frame_packet.port,
+                frame_index=frame_packet.frame_index,
+                frame_time=frame_packet.frame_time,
+                frame=frame,
+                fps=frame_packet.fps,
+            )
+        return SyncPacket(
+            sync_packet.sync_index,
+            sync_packet.ports,
+            tuple(packets),
+            sync_packet.frame_times,
+            sync_packet.frame_indices,
+            sync_packet.present,
+        )
+
+    def claim_through(self, sync_index: int):
+        """Layers up to and including sync_index will not be flushed into a later recording"""
+        with self.updated:
+            self.claimed_through = max(self.claimed_through, sync_index)
+
+    def layers_before(self, sync_index: int):
+        """
+        Buffered layers older than sync_index (and newer than anything already claimed),
+        oldest first, as full SyncPackets. Waits briefly for the buffer to catch up to
+        sync_index so nothing between the buffered layers and the first live one is missed.
+        """
+        with self.updated:
+            caught_up = self.updated.wait_for(
+                lambda: self.latest_sync_index >= sync_index - 1, timeout=CATCH_UP_TIMEOUT
+            )
+            if not caught_up:
+                logger.warning(
+                    f"Preroll buffer only reached layer {self.latest_sync_index} of {sync_index - 1}; "
+                    "the recording may have a short gap after the preroll"
+                )
+            selected = [
+                layer
+                for _, index, layer, _ in self.layers
+                if self.claimed_through < index < sync_index
+            ]
+            self.claimed_through = max(self.claimed_through, sync_index - 1)
+
+        logger.info(f"Flushing {len(selected)} preroll layers")
+        for layer in selected:
+            yield self._expand(layer)
@@ -0,0 +1,175 @@
+"""
+Raw, memory-mapped frame storage used for lossless high-speed capture.
+
+Each port gets two preallocated .npy files that are memory-mapped while recording:
+- port_N_frames.npy: a (capacity, height, width, 3) uint8 array, so every frame has a fixed stride
+- port_N_timestamps.npy: a (capacity,) table of sync_index, frame_index and frame_time
+
+Writing a frame is then only a copy into the page cache. Encoding to the normal port_N.mp4
+happens afterwards on a background thread via the RawTranscoder.
+"""
+
+import multiwebcam.logger
+
+from pathlib import Path
+from threading import Thread, Event
+
+import cv2
+import numpy as np
+
+logger = multiwebcam.logger.get(__name__)
+
+TIMESTAMP_DTYPE = np.dtype(
+    [("sync_index", np.int64), ("frame_index", np.int64), ("frame_time", np.float64)]
+)
+
+
+def raw_frame_bytes(frame_size: tuple) -> int:
+    """Disk space taken by one frame (and its timestamp row) in a raw capture"""
+    width, height = frame_size
+    return width * height * 3 + TIMESTAMP_DTYPE.itemsize
+
+
+def raw_frames_path(directory: Path, port: int, suffix: str = "") -> Path:
+    return Path(directory, f"port_{port}{suffix}_frames.npy")
+
+
+def raw_timestamps_path(directory: Path, port: int, suffix: str = "") -> Path:
+    return Path(directory, f"port_{port}{suffix}_timestamps.npy")
+
+
+class RawFrameWriter:
+    """
+    Writes frames for a single port into a preallocated memory-mapped file.
+    Capacity is fixed at creation; frames that arrive after it is exhausted are
+    dropped (and counted) rather than stalling the recorder.
+    """
+
+    def __init__(
+        self, directory: Path, port: int, frame_size: tuple, capacity: int, suffix: str = ""
+    ):
+        self.port = port
+        self.capacity = capacity
+        self.frame_count = 0
+        self.overflow_count = 0
+
+        width, height = frame_size
+        self.frame_shape = (height, width, 3)
+
+        self.frames_path = raw_frames_path(directory, port, suffix)
+        self.timestamps_path = raw_timestamps_path(directory, port, suffix)
+
+        logger.info(
+            f"Preallocating raw capture for port {port}: {capacity} frames of {width}x{height} at {self.frames_path}"
+        )
+        self.frames = np.lib.format.open_memmap(
+            self.frames_path, mode="w+", dtype=np.uint8, shape=(capacity, *self.frame_shape)
+        )
+        self.timestamps = np.lib.format.open_memmap(
+            self.timestamps_path, mode="w+", dtype=TIMESTAMP_DTYPE, shape=(capacity,)
+        )
+        # unwritten rows are flagged with a frame_index of -1
+        self.timestamps["sync_index"] = -1
+        self.timestamps["frame_index"] = -1
+        self.timestamps["frame_time"] = -1
+
+    def write(self, frame: np.ndarray, sync_index: int, frame_index: int, frame_time: float) -> bool:
+        """Returns False if the frame was dropped because capacity is exhausted"""
+        if self.frame_count >= self.capacity:
+            if self.overflow_count % 100 == 0:
+                logger.warning(
+                    f"Raw capture buffer for port {self.port} is full ({self.capacity} frames); dropping frames"
+                )
+            self.overflow_count += 1
+            return False
+
+        if frame.shape != self.frame_shape:
+            # resolution changed mid recording; keep the fixed stride intact
+            frame = cv2.resize(frame, (self.frame_shape[1], self.frame_shape[0]))
+
+        self.frames[self.frame_count] = frame
+        self.timestamps[self.frame_count] = (sync_index, frame_index, frame_time)
+        self.frame_count += 1
+        return True
+
+    def release(self):
+        logger.info(
+            f"Releasing raw capture for port {self.port} with {self.frame_count} frames stored"
+        )
+        if self.overflow_count > 0:
+            logger.warning(
+                f"Raw capture for port {self.port} ran out of room; the last {self.overflow_count} frames were not saved"
+            )
+        self.frames.flush()
+        self.timestamps.flush()
+        # drop references so the memory maps are closed
+        del self.frames
+        del self.timestamps
+
+
+class RawTranscoder:
+    """
+    Converts the raw memory-mapped captures of a recording into port_N.mp4 files
+    on a background thread. Raw files are removed once they are successfully encoded
+    unless keep_raw is set.
+
+    port_fps: {port: frame rate} each port's video is encoded at
+    """
+
+    def __init__(
+        self, directory: Path, ports: list, port_fps: dict, suffix: str = "", keep_raw: bool = False
+    ):
+        self.directory = directory
+        self.ports = ports
+        self.port_fps = port_fps
+        self.suffix = suffix
+        self.keep_raw = keep_raw
+
+        self.complete = Event()
+        self.thread = None
+
+    def start(self):
+        self.complete.clear()
+        self.thread = Thread(target=self._transcode_worker, args=(), daemon=False)
+        self.thread.start()
+
+    def join(self):
+        if self.thread is not None:
+            self.thread.join()
+
+    def _transcode_worker(self):
+        for port in self.ports:
+            self.transcode_port(port)
+        logger.info(f"Transcoding of raw capture in {self.directory} complete")
+        self.complete.set()
+
+    def transcode_port(self, port: int):
+        frames_path = raw_frames_path(self.directory, port, self.suffix)
+        timestamps_path = raw_timestamps_path(self.directory, port, self.suffix)
+
+        if not frames_path.exists():
+            logger.warning(f"No raw capture found for port {port} at {frames_path}")
+            return
+
+        frames = np.load(frames_path, mmap_mode="r")
+        timestamps = np.load(timestamps_path, mmap_mode="r")
+        frame_count = int(np.count_nonzero(timestamps["frame_index"] >= 0))
+
+        height, width = frames.shape[1:3]
+        video_path = str(Path(self.directory, f"port_{port}{self.suffix}.mp4"))
+        logger.info(f"Transcoding {frame_count} raw frames from port {port} to {video_path}")
+
+        fourcc = cv2.VideoWriter_fourcc(*"MP4V")
+        writer = cv2.VideoWriter(video_path, fourcc, self.port_fps[port], (width, height))
+        for i in range(frame_count):
+            writer.write(np.ascontiguousarray(frames[i]))
+        writer.release()
+
+        # release the memory maps before removing the underlying files
+        del frames
+        del timestamps
+
+        if not self.keep_raw:
+            logger.info(f"Removing raw capture files for port {port}")
+            frames_path.unlink()
+            timestamps_path.unlink()
@@ -9,7 +9,6 @@ import rtoml
 
 import cv2
 from time import perf_counter, sleep
-import pandas as pd
 import numpy as np
 
 from multiwebcam.interface import FramePacket, Tracker, Stream
@@ -66,6 +65,9 @@ class RecordedStream(Stream):
         ############ PROCESS WITH TRUE TIME STAMPS IF AVAILABLE #########################
         synched_frames_history_path = Path(self.directory, "frame_time_history.csv")
 
+        # pandas is only needed for playback so it is not imported with the module
+        import pandas as pd
+
         if synched_frames_history_path.exists():
             synched_frames_history = pd.read_csv(synched_frames_history_path)
 
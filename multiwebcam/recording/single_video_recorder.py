@@ -6,6 +6,7 @@ import cv2
 
 from multiwebcam.cameras.live_stream import LiveStream
 from multiwebcam.interface import FramePacket
+from multiwebcam.recording.disk_io import DiskWriteError, DiskWriteStage
 import multiwebcam.logger
 
 logger = multiwebcam.logger.get(__name__)
@@ -24,6 +25,15 @@ class SingleVideoRecorder:
         self.recording = False
         self.trigger_stop = Event()
         self.frame_packet_in_q = Queue(-1)
+        self.write_stage = None
+
+    @property
+    def backlog(self) -> int:
+        """Frames waiting to be processed plus writes waiting to reach disk"""
+        backlog = self.frame_packet_in_q.qsize()
+        if self.write_stage is not None:
+            backlog += self.write_stage.backlog
+        return backlog
 
     def save_data_worker( self ):
         # connect video recorder to synchronizer via an "in" queue
@@ -36,36 +46,50 @@ class SingleVideoRecorder:
         )
         self.video_writer = cv2.VideoWriter(path, fourcc, self.stream.fps_target, frame_size)
 
+        # encoding and disk output happen on the write stage rather than this thread
+        self.write_stage = DiskWriteStage(name=f"single video recorder at port {self.port}")
+        self.write_stage.add_writer(self.port, self.video_writer)
+
         stream_subscription_released = False
         self.stream.subscribe(self.frame_packet_in_q)
 
-        # this is where the issue is... need to figure out when the queue is empty...
-        logger.info("Entering Save data worker loop entered")
-        while self.frame_packet_in_q.qsize() > 0 or not self.trigger_stop.is_set():
-            frame_packet: FramePacket = self.frame_packet_in_q.get()
-
-            # provide periodic updates of recording queue
-            # logger.info("Getting size of sync packet q")
-            backlog = self.frame_packet_in_q.qsize()
-            if backlog % 25 == 0 and backlog != 0:
-                logger.info(
-                    f"Size of unsaved frames on the recording queue is {self.frame_packet_in_q.qsize()}"
-                )
-
-            if frame_packet is None:
-                # relenvant when
-                logger.info("End of sync packets signaled...breaking record loop")
-                break
-            else:
-                # logger.info("Processing frame packet...")
-                self.video_writer.write(frame_packet.frame)
-
-            if not stream_subscription_released and self.trigger_stop.is_set():
-                logger.info("Save frame worker winding down...")
+        try:
+            # this is where the issue is... need to figure out when the queue is empty...
+            logger.info("Entering Save data worker loop entered")
+            while self.frame_packet_in_q.qsize() > 0 or not self.trigger_stop.is_set():
+                frame_packet: FramePacket = self.frame_packet_in_q.get()
+
+                # provide periodic updates of recording queue
+                # logger.info("Getting size of sync packet q")
+                backlog = self.frame_packet_in_q.qsize()
+                if backlog % 25 == 0 and backlog != 0:
+                    logger.info(
+                        f"Size of unsaved frames on the recording queue is {self.frame_packet_in_q.qsize()}"
+                    )
+
+                if frame_packet is None:
+                    # relenvant when
+                    logger.info("End of sync packets signaled...breaking record loop")
+                    break
+                else:
+                    # logger.info("Processing frame packet...")
+                    self.write_stage.write(self.port, frame_packet.frame)
+
+                if not stream_subscription_released and self.trigger_stop.is_set():
+                    logger.info("Save frame worker winding down...")
+                    self.stream.unsubscribe(self.frame_packet_in_q)
+                    stream_subscription_released = True
+        except DiskWriteError as error:
+            # nothing more can be saved; keep what made it to disk
+            logger.error(f"Recording at port {self.port} stopped: {error}")
+            if not stream_subscription_released:
                 self.stream.unsubscribe(self.frame_packet_in_q)
-                stream_subscription_released = True
 
-        self.video_writer.release()
+        # drains remaining frames and releases the video writer
+        try:
+            self.write_stage.close()
+        except DiskWriteError as error:
+            logger.error(f"Recording at port {self.port} may be incomplete: {error}")
         self.trigger_stop.clear()  # reset stop recording trigger
         self.recording = False
 
@@ -0,0 +1,250 @@
+"""
+Record only while something is happening.
+
+For long unattended sessions, a TriggeredRecorder watches the synchronized layers
+and starts a MultiVideoRecorder when there is activity, stopping it once things
+have been quiet for the post-roll. Each clip goes to its own recording_N folder and
+begins with the pre-roll held by a PrerollBuffer, so the lead up to the trigger is
+kept as well.
+
+Activity is any of:
+
+    motion          frame differencing on the thumbnail stream variant (so the full
+                    frames are never scanned), optionally within a region of interest
+    trigger file    active for as long as the file exists
+    trigger socket  UDP datagrams "start" and "stop" switch it on and off; "pulse"
+                    counts as activity once, so a clip runs for the post-roll
+"""
+
+import multiwebcam.logger
+
+import socket
+from pathlib import Path
+from queue import Empty
+from threading import Event, Thread
+from time import perf_counter
+
+import cv2
+import numpy as np
+
+from multiwebcam.cameras.synchronizer import Synchronizer
+from multiwebcam.helper import get_next_recording_directory
+from multiwebcam.interface import SyncPacket
+from multiwebcam.recording.multi_video_recorder import MultiVideoRecorder
+from multiwebcam.recording.preroll_buffer import PrerollBuffer
+
+logger = multiwebcam.logger.get(__name__)
+
+DEFAULT_PREROLL_SECONDS = 3
+DEFAULT_POSTROLL_SECONDS = 5
+PIXEL_CHANGE_THRESHOLD = 25  # gray level difference at which a thumbnail pixel counts as changed
+MOTION_FRACTION = 0.01  # share of changed pixels within the ROI that counts as motion
+
+
+class MotionDetector:
+    def __init__(
+        self,
+        roi: tuple = None,
+        pixel_threshold: int = PIXEL_CHANGE_THRESHOLD,
+        motion_fraction: float = MOTION_FRACTION,
+    ):
+        """
+        roi: (left, top, right, bottom) as fractions of the frame, e.g. (0.25, 0, 0.75, 1)
+        for the middle half; None watches the whole frame
+        """
+        self.roi = roi
+        self.pixel_threshold = pixel_threshold
+        self.motion_fraction = motion_fraction
+        self.previous = {}
+        self.scores = {}
+
+    def crop(self, frame: np.ndarray) -> np.ndarray:
+        if self.roi is None:
+            return frame
+        height, width = frame.shape[:2]
+        left, top, right, bottom = self.roi
+        return frame[
+            int(top * height) : max(int(bottom * height), int(top * height) + 1),
+            int(left * width) : max(int(right * width), int(left * width) + 1),
+        ]
+
+    def update(self, sync_packet: SyncPacket) -> bool:
+        """True if any port in the layer changed enough since its previous frame"""
+        motion = False
+        for row in np.flatnonzero(sync_packet.present):
+            frame_packet = sync_packet.packets[row]
+            thumbnail = self.crop(frame_packet.variant("thumbnail"))
+            gray = cv2.GaussianBlur(cv2.cvtColor(thumbnail, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+
+            previous = self.previous.get(frame_packet.port)
+            self.previous[frame_packet.port] = gray
+            if previous is None or previous.shape != gray.shape:
+                continue
+
+            changed = cv2.absdiff(gray, previous) > self.pixel_threshold
+            self.scores[frame_packet.port] = float(changed.mean())
+            if self.scores[frame_packet.port] > self.motion_fraction:
+                motion = True
+        return motion
+
+
+class FileTrigger:
+    """Active while the file exists, e.g. `touch record_now` / `rm record_now`"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    @property
+    def active(self) -> bool:
+        return self.path.exists()
+
+    def close(self):
+        pass
+
+
+class SocketTrigger:
+    """Listens for UDP datagrams "start", "stop" and "pulse" on host:port"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8766):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind((host, port))
+        self.socket.settimeout(0.5)
+        self.port = self.socket.getsockname()[1]
+        self.switched_on = False
+        self.pulsed = Event()
+        self.stop_event = Event()
+        self.thread = Thread(target=self._listen_worker, args=(), daemon=True)
+        self.thread.start()
+        logger.info(f"Listening for recording triggers on udp {host}:{self.port}")
+
+    @property
+    def active(self) -> bool:
+        if self.pulsed.is_set():
+            self.pulsed.clear()
+            return True
+        return self.switched_on
+
+    def _listen_worker(self):
+        while not self.stop_event.is_set():
+            try:
+                message = self.socket.recv(64).decode(errors="ignore").strip().lower()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+
+            if message == "start":
+                self.switched_on = True
+            elif message == "stop":
+                self.switched_on = False
+            elif message == "pulse":
+                self.pulsed.set()
+            else:
+                logger.warning(f"Ignoring unknown recording trigger message {message!r}")
+
+    def close(self):
+        self.stop_event.set()
+        self.thread.join()
+        self.socket.close()
+
+
+class TriggeredRecorder:
+    def __init__(
+        self,
+        synchronizer: Synchronizer,
+        workspace: Path,
+        preroll_seconds: float = DEFAULT_PREROLL_SECONDS,
+        postroll_seconds: float = DEFAULT_POSTROLL_SECONDS,
+        motion: MotionDetector = None,
+        triggers: list = None,
+        preroll_jpeg_quality: int = None,
+    ):
+        """
+        motion: None records on the external triggers alone
+        triggers: objects with an `active` property and `close()` (FileTrigger, SocketTrigger)
+        """
+        self.synchronizer = synchronizer
+        self.workspace = Path(workspace)
+        self.postroll_seconds = postroll_seconds
+        self.motion = motion
+        self.triggers = triggers if triggers is not None else []
+
+        self.preroll = PrerollBuffer(synchronizer, preroll_seconds, jpeg_quality=preroll_jpeg_quality)
+
+        self.recorder = None
+        self.finishing = []  # stopped recorders that may still be saving out
+        self.clips = []  # recording folders written so far
+        self.last_activity = None
+        self.latest_sync_index = -1  # newest layer the watcher has seen
+        self.stop_event = Event()
+
+        self.sync_packet_q = synchronizer.subscribe_to_sync_packets()
+        self.thread = Thread(target=self._watch_worker, args=(), daemon=True)
+        self.thread.start()
+
+    @property
+    def recording(self) -> bool:
+        return self.recorder is not None
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+        self.synchronizer.release_sync_packet_q(self.sync_packet_q)
+        for trigger in self.triggers:
+            trigger.close()
+        self.preroll.stop()
+
+    def _watch_worker(self):
+        ended = False
+        while not ended and not self.stop_event.is_set():
+            try:
+                batch = self.sync_packet_q.get_batch(timeout=0.5)
+            except Empty:
+                batch = []
+
+            motion = False
+            for sync_packet in batch:
+                if sync_packet is None:
+                    ended = True
+                    break
+                self.latest_sync_index = sync_packet.sync_index
+                if self.motion is not None and self.motion.update(sync_packet):
+                    motion = True
+
+            external = any([trigger.active for trigger in self.triggers])
+            now = perf_counter()
+            if motion or external:
+                self.last_activity = now
+                if self.recorder is None:
+                    self.start_clip("motion" if motion else "trigger")
+            elif self.recorder is not None and now - self.last_activity > self.postroll_seconds:
+                self.stop_clip(f"quiet for {self.postroll_seconds} s")
+
+        if self.recorder is not None:
+            self.stop_clip("watching stopped" if not ended else "cameras stopped")
+        logger.info(f"Triggered recording ended after {len(self.clips)} clip(s)")
+
+    def start_clip(self, reason: str):
+        destination = Path(self.workspace, get_next_recording_directory(self.workspace))
+        logger.info(f"Activity ({reason}) detected; recording to {destination}")
+        self.recorder = MultiVideoRecorder(self.synchronizer)
+        self.recorder.start_recording(destination, preroll=self.preroll)
+        self.clips.append(destination)
+
+    def stop_clip(self, reason: str):
+        logger.info(f"Ending clip {self.clips[-1]} ({reason})")
+        # the clip ends on the newest layer seen here, and those layers are claimed so
+        # the next clip's preroll starts after them rather than repeating its tail
+        self.preroll.claim_through(self.latest_sync_index)
+        # the recorder drains and closes its files on its own thread
+        self.recorder.stop_recording(final_sync_index=self.latest_sync_index)
+        self.finishing = [recorder for recorder in self.finishing if recorder.recording]
+        self.finishing.append(self.recorder)
+        self.recorder = None
+
+    def wait_for_clips(self):
+        """Block until every clip has been saved out (and transcoded if raw)"""
+        for recorder in self.finishing:
+            recorder.recording_thread.join()
+            if recorder.transcoder is not None:
+                recorder.transcoder.join()
@@ -13,9 +13,11 @@ from multiwebcam.cameras.camera import Camera
 from multiwebcam.cameras.synchronizer import Synchronizer
 from multiwebcam.gui.frame_emitter import FrameEmitter
 from multiwebcam.gui.frame_dictionary_emitter import FrameDictionaryEmitter
+from multiwebcam.gui.preview_governor import PreviewGovernor
 from multiwebcam.configurator import Configurator
 from multiwebcam.cameras.live_stream import LiveStream
 from multiwebcam.recording.multi_video_recorder import MultiVideoRecorder
+from multiwebcam.recording.preroll_buffer import PrerollBuffer
 from multiwebcam.recording.single_video_recorder import SingleVideoRecorder
 
 logger = multiwebcam.logger.get(__name__)
@@ -61,6 +63,12 @@ class LiveSession(QObject):
         self.fps_target = self.config.get_fps_target()
         self.is_recording = False
 
+        # scales back preview rendering whenever it starts to compete with capture and recording
+        self.preview_governor = PreviewGovernor()
+
+        # recent layers held in memory so synchronized recordings can begin in the past
+        self.preroll_buffer = None
+
         self.mode = None  # default mode of session
 
     def disconnect_cameras(self):
@@ -73,8 +81,12 @@ class LiveSession(QObject):
         for port, cam in self.cameras.items():
             cam.disconnect()
         self.cameras = {}
+        if self.preroll_buffer is not None:
+            self.preroll_buffer.stop()
+            self.preroll_buffer = None
         self.synchronizer.stop_event.set()
         self.synchronizer = None
+        self.preview_governor.synchronizer = None
         self.stream_tools_loaded = False
         self.stream_tools_disconnected_signal.emit()
 
@@ -140,6 +152,14 @@ class LiveSession(QObject):
         self.unsubscribe_all_frame_emitters()
         self.frame_emitters[self.active_single_port].subscribe()
         
+    def set_undistort_preview(self, undistort: bool):
+        """Lens correct the live previews of calibrated cameras"""
+        logger.info(f"Setting undistortion of preview to {undistort}")
+        for emitter in self.frame_emitters.values():
+            emitter.undistort = undistort
+        if hasattr(self, "multicam_frame_emitter"):
+            self.multicam_frame_emitter.undistort = undistort
+
     def set_multicam_render_fps(self,fps):
         logger.info(f"Updating multicam frame emitter to render view at {fps} fps")
         self.multicam_render_fps = fps
@@ -210,7 +230,11 @@ class LiveSession(QObject):
                     stream = LiveStream(cam,fps_target=self.fps_target)
                     self.streams[port] = stream
                     pixmap_edge_length = 500
-                    frame_emitter = FrameEmitter(stream, pixmap_edge_length=pixmap_edge_length)
+                    frame_emitter = FrameEmitter(
+                        stream,
+                        pixmap_edge_length=pixmap_edge_length,
+                        governor=self.preview_governor,
+                    )
                     self.frame_emitters[port] = frame_emitter
 
 
@@ -219,13 +243,28 @@ class LiveSession(QObject):
             self.synchronizer = Synchronizer(
                 self.streams
             )  
+            self.preview_governor.synchronizer = self.synchronizer
+
+            preroll_seconds = self.config.get_preroll_seconds()
+            if preroll_seconds > 0:
+                self.preroll_buffer = PrerollBuffer(
+                    self.synchronizer,
+                    preroll_seconds,
+                    jpeg_quality=self.config.get_preroll_jpeg_quality(),
+                )
 
             # need to let synchronizer spin up before able to display frames
             while not hasattr(self.synchronizer, "current_sync_packet"):
                 logger.info("Waiting for initial sync packet to populate in synhronizer")
                 sleep(0.5)
 
-            self.multicam_frame_emitter = FrameDictionaryEmitter(self.synchronizer,self.multicam_render_fps,single_frame_height=MULTIFRAME_HEIGHT)
+            self.multicam_frame_emitter = FrameDictionaryEmitter(
+                self.synchronizer,
+                self.multicam_render_fps,
+                single_frame_height=MULTIFRAME_HEIGHT,
+                mosaic=self.config.get_mosaic_preview(),
+                governor=self.preview_governor,
+            )
             self.stream_tools_loaded = True
             self.stream_tools_in_process = False
 
@@ -255,6 +294,7 @@ class LiveSession(QObject):
         stream = self.streams[port]
         self.single_stream_recorder = SingleVideoRecorder(stream = stream)
         self.single_stream_recorder.start_recording(destination_directory)
+        self.preview_governor.add_backlog_source(self.single_stream_recorder)
 
     def stop_single_stream_recording(self):
         def worker():
@@ -263,6 +303,7 @@ class LiveSession(QObject):
             while self.single_stream_recorder.recording:
                 sleep(.5)
                 logger.info("Waiting for recorder to finalize save of data")    
+            self.preview_governor.remove_backlog_source(self.single_stream_recorder)
 
         
         self.stop_single_stream_recording_thread = QThread()
@@ -280,7 +321,10 @@ class LiveSession(QObject):
         destination_directory.mkdir(parents=True, exist_ok=True)
 
         self.sync_video_recorder = MultiVideoRecorder(self.synchronizer)
-        self.sync_video_recorder.start_recording( destination_directory)
+        self.sync_video_recorder.start_recording(
+            destination_directory, preroll=self.preroll_buffer
+        )
+        self.preview_governor.add_backlog_source(self.sync_video_recorder)
         self.is_recording = True
 
     def stop_synchronized_recording(self):
@@ -290,6 +334,7 @@ class LiveSession(QObject):
             logger.info("Waiting for video recorder to save out data...")
             sleep(0.5)
 
+        self.preview_governor.remove_backlog_source(self.sync_video_recorder)
         self.is_recording = False
 
         logger.info("Recording of frames is complete...signalling change in status")
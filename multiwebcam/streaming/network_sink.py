@@ -0,0 +1,283 @@
+"""
+Serve synchronized layers to other machines over TCP.
+
+The sink subscribes to a Synchronizer and, for every layer it has time for, JPEG encodes
+the frames (optionally downscaled to thumbnails) in a worker pool. Encoded layers are
+offered to every connected client, and each client only ever holds the most recent one.
+A client that cannot keep up skips layers rather than holding up capture or other clients.
+The server runs on its own asyncio loop in a background thread.
+
+Each layer on the wire is
+
+    4 byte big-endian header length | JSON header | JPEG payloads, concatenated
+
+where the header is
+
+    {"sync_index": 12, "frames": [{"port": 0, "frame_index": 40, "frame_time": 1234.5, "size": 20931}, ...]}
+
+and the payloads follow in the order of "frames". NetworkSinkClient reads this format.
+"""
+
+import multiwebcam.logger
+
+import asyncio
+import json
+import socket
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Thread
+
+import cv2
+import numpy as np
+
+from multiwebcam.cameras.async_hub import AsyncPacketHub
+from multiwebcam.cameras.stream_variants import covering_variant
+from multiwebcam.cameras.synchronizer import Synchronizer
+from multiwebcam.interface import FramePacket, SyncPacket
+
+logger = multiwebcam.logger.get(__name__)
+
+DEFAULT_PORT = 8765
+DEFAULT_JPEG_QUALITY = 80
+HEADER_LENGTH = struct.Struct(">I")
+
+
+def encode_frame(frame: np.ndarray, max_edge: int = None, quality: int = DEFAULT_JPEG_QUALITY) -> bytes:
+    """JPEG encode a BGR frame, first shrinking it so its longer side is at most max_edge"""
+    if max_edge is not None:
+        height, width = frame.shape[:2]
+        scale = max_edge / max(height, width)
+        if scale < 1:
+            size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+    success, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not success:
+        raise ValueError("JPEG encoding failed")
+    return encoded.tobytes()
+
+
+def encode_frame_packet(
+    frame_packet: FramePacket, max_edge: int = None, quality: int = DEFAULT_JPEG_QUALITY
+) -> bytes:
+    """As encode_frame, but starting from the smallest stream variant that covers max_edge"""
+    frame = frame_packet.frame
+    if max_edge is not None:
+        frame = frame_packet.variant(covering_variant((frame.shape[1], frame.shape[0]), max_edge))
+    return encode_frame(frame, max_edge, quality)
+
+
+def build_message(sync_packet: SyncPacket, payloads: list) -> bytes:
+    """payloads holds the encoded frames of the ports present in the packet, in port order"""
+    frames = []
+    for row, payload in zip(np.flatnonzero(sync_packet.present), payloads):
+        frames.append(
+            {
+                "port": sync_packet.ports[row],
+                "frame_index": int(sync_packet.frame_indices[row]),
+                "frame_time": float(sync_packet.frame_times[row]),
+                "size": len(payload),
+            }
+        )
+    header = json.dumps({"sync_index": sync_packet.sync_index, "frames": frames}).encode()
+    return b"".join([HEADER_LENGTH.pack(len(header)), header, *payloads])
+
+
+class _ClientConnection:
+    """Latest-only mailbox for one client; a newer layer replaces one not yet sent"""
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.handler = asyncio.current_task()
+        self.pending = None
+        self.wakeup = asyncio.Event()
+        self.sent = 0
+        self.skipped = 0
+
+    def offer(self, message: bytes):
+        if self.pending is not None:
+            self.skipped += 1
+        self.pending = message
+        self.wakeup.set()
+
+    async def send_loop(self):
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            message, self.pending = self.pending, None
+            self.writer.write(message)
+            await self.writer.drain()
+            self.sent += 1
+
+
+class NetworkSink:
+    def __init__(
+        self,
+        synchronizer: Synchronizer,
+        host: str = "127.0.0.1",
+        port: int = DEFAULT_PORT,
+        thumbnail_edge: int = None,
+        jpeg_quality: int = DEFAULT_JPEG_QUALITY,
+        encode_workers: int = None,
+    ):
+        """
+        host: "127.0.0.1" serves this machine only; use "0.0.0.0" to serve the local network
+        port: 0 picks a free port, available as `self.port` once started
+        thumbnail_edge: longest side of the transmitted frames; None sends full frames
+        """
+        self.synchronizer = synchronizer
+        self.host = host
+        self.port = port
+        self.thumbnail_edge = thumbnail_edge
+        self.jpeg_quality = jpeg_quality
+
+        # OpenCV releases the GIL while encoding so the ports of a layer encode in parallel
+        if encode_workers is None:
+            encode_workers = max(1, len(synchronizer.ports))
+        self.encode_pool = ThreadPoolExecutor(
+            max_workers=encode_workers, thread_name_prefix="network_sink_encoder"
+        )
+
+        self.clients = []
+        self.layers_sent = 0
+        self.started = Event()
+        self.error = None  # why the server failed, if it did
+        self.loop = None
+        self.sync_packets = None
+
+    def start(self):
+        """Returns once serving; raises whatever stopped the server from starting (e.g. port in use)"""
+        self.thread = Thread(target=self._run, args=(), daemon=True)
+        self.thread.start()
+        self.started.wait()
+        if self.error is not None:
+            self.thread.join()
+            self.encode_pool.shutdown()
+            raise self.error
+
+    def _run(self):
+        try:
+            asyncio.run(self._serve())
+        except Exception as error:
+            self.error = error
+            if self.started.is_set():
+                logger.exception("Network sink stopped unexpectedly")
+        finally:
+            # never leave start() waiting on a server that did not come up
+            self.started.set()
+
+    def stop(self):
+        logger.info("Stopping network sink")
+        if self.loop is not None and self.sync_packets is not None:
+            try:
+                self.loop.call_soon_threadsafe(self.sync_packets.close)
+            except RuntimeError:
+                # the loop has already finished because the synchronizer stopped first
+                pass
+        self.thread.join()
+        self.encode_pool.shutdown()
+
+    async def _serve(self):
+        self.loop = asyncio.get_running_loop()
+        server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        self.port = server.sockets[0].getsockname()[1]
+        logger.info(f"Network sink serving synchronized frames on {self.host}:{self.port}")
+
+        hub = AsyncPacketHub()
+        # only the newest layer is kept while the previous one is being encoded
+        self.sync_packets = hub.sync_packets(self.synchronizer, maxsize=1)
+        self.started.set()
+
+        async with server:
+            async for sync_packet in self.sync_packets:
+                if not self.clients:
+                    continue
+                message = await self._encode_layer(sync_packet)
+                for client in self.clients:
+                    client.offer(message)
+                self.layers_sent += 1
+
+            # a client that stopped reading would never finish on its own, so the
+            # handlers are cancelled rather than waited on
+            handlers = [client.handler for client in self.clients]
+            for handler in handlers:
+                handler.cancel()
+            await asyncio.gather(*handlers, return_exceptions=True)
+
+        logger.info(f"Network sink stopped after serving {self.layers_sent} layers")
+
+    async def _encode_layer(self, sync_packet: SyncPacket) -> bytes:
+        jobs = [
+            self.loop.run_in_executor(
+                self.encode_pool,
+                encode_frame_packet,
+                sync_packet.packets[row],
+                self.thumbnail_edge,
+                self.jpeg_quality,
+            )
+            for row in np.flatnonzero(sync_packet.present)
+        ]
+        payloads = await asyncio.gather(*jobs)
+        return build_message(sync_packet, payloads)
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        address = writer.get_extra_info("peername")
+        logger.info(f"Network sink client connected from {address}")
+        client = _ClientConnection(writer)
+        self.clients.append(client)
+
+        sending = asyncio.create_task(client.send_loop())
+        # clients are not expected to send anything; reading just detects disconnection
+        closed = asyncio.create_task(reader.read())
+        try:
+            await asyncio.wait([sending, closed], return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            pass  # the sink is shutting down
+        finally:
+            sending.cancel()
+            closed.cancel()
+            self.clients.remove(client)
+            # abort rather than close so unsent data for a stalled client is discarded
+            writer.transport.abort()
+            logger.info(
+                f"Network sink client {address} disconnected; {client.sent} layers sent, {client.skipped} skipped"
+            )
+
+
+class NetworkSinkClient:
+    """Blocking reader for a NetworkSink, e.g. for a viewer on another machine or a loopback check"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = DEFAULT_PORT, timeout: float = None):
+        self.socket = socket.create_connection((host, port), timeout=timeout)
+
+    def _read_exactly(self, size: int) -> bytes:
+        buffer = bytearray(size)
+        view = memoryview(buffer)
+        received = 0
+        while received < size:
+            count = self.socket.recv_into(view[received:])
+            if count == 0:
+                raise ConnectionError("Network sink closed the connection")
+            received += count
+        return bytes(buffer)
+
+    def receive(self) -> tuple[dict, dict]:
+        """Next layer as (header, {port: JPEG bytes})"""
+        (header_length,) = HEADER_LENGTH.unpack(self._read_exactly(HEADER_LENGTH.size))
+        header = json.loads(self._read_exactly(header_length))
+        payloads = {}
+        for frame in header["frames"]:
+            payloads[frame["port"]] = self._read_exactly(frame["size"])
+        return header, payloads
+
+    def receive_frames(self) -> tuple[dict, dict]:
+        """Next layer as (header, {port: decoded BGR frame})"""
+        header, payloads = self.receive()
+        frames = {
+            port: cv2.imdecode(np.frombuffer(payload, dtype=np.uint8), cv2.IMREAD_COLOR)
+            for port, payload in payloads.items()
+        }
+        return header, frames
+
+    def close(self):
+        self.socket.close()
@@ -0,0 +1,129 @@
+import socket
+from threading import Event, Thread
+from time import sleep
+
+import numpy as np
+import pytest
+
+from multiwebcam.interface import FramePacket, SyncPacket
+from multiwebcam.streaming.network_sink import NetworkSink, NetworkSinkClient
+
+PORTS = (0, 1, 2)
+FRAME_SIZES = {0: (640, 480), 1: (1280, 720), 2: (320, 240)}  # (width, height)
+THUMBNAIL_EDGE = 160
+
+
+def make_sync_packet(sync_index: int) -> SyncPacket:
+    """Port 2 drops every other layer so the header has to leave it out"""
+    present = np.array([True, True, sync_index % 2 == 0])
+    packets = []
+    for row, port in enumerate(PORTS):
+        if not present[row]:
+            packets.append(None)
+            continue
+        width, height = FRAME_SIZES[port]
+        frame = np.full((height, width, 3), 40 * (port + 1), dtype=np.uint8)
+        packets.append(FramePacket(port, sync_index, sync_index / 30 + port / 1000, frame, 30))
+
+    return SyncPacket(
+        sync_index,
+        PORTS,
+        tuple(packets),
+        np.array([np.nan if packet is None else packet.frame_time for packet in packets]),
+        np.array([-1 if packet is None else packet.frame_index for packet in packets]),
+        present,
+    )
+
+
+class FakeSynchronizer:
+    """Publishes synthetic layers to its subscribers the way a Synchronizer does"""
+
+    def __init__(self, fps: float = 30):
+        self.ports = PORTS
+        self.fps = fps
+        self.subscribers = []
+        self.stop_event = Event()
+        self.thread = Thread(target=self._publish_worker, args=(), daemon=True)
+        self.thread.start()
+
+    def subscribe_to_sync_packets(self, q):
+        self.subscribers.append(q)
+        return q
+
+    def release_sync_packet_q(self, q):
+        self.subscribers.remove(q)
+
+    def _publish_worker(self):
+        sync_index = 0
+        while not self.stop_event.is_set():
+            sync_packet = make_sync_packet(sync_index)
+            for q in list(self.subscribers):
+                q.put(sync_packet)
+            sync_index += 1
+            sleep(1 / self.fps)
+
+        for q in list(self.subscribers):
+            q.put(None)
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+
+@pytest.fixture
+def synchronizer():
+    synchronizer = FakeSynchronizer()
+    yield synchronizer
+    synchronizer.stop()
+
+
+@pytest.fixture
+def sink(synchronizer):
+    sink = NetworkSink(synchronizer, port=0, thumbnail_edge=THUMBNAIL_EDGE)
+    sink.start()
+    yield sink
+    synchronizer.stop()
+    sink.stop()
+
+
+def test_client_receives_layers(sink):
+    client = NetworkSinkClient(port=sink.port, timeout=5)
+    try:
+        previous_index = -1
+        for _ in range(4):
+            header, frames = client.receive_frames()
+
+            sync_index = header["sync_index"]
+            assert sync_index > previous_index
+            previous_index = sync_index
+
+            expected_ports = [0, 1, 2] if sync_index % 2 == 0 else [0, 1]
+            assert [frame["port"] for frame in header["frames"]] == expected_ports
+            assert sorted(frames) == expected_ports
+
+            for frame_info in header["frames"]:
+                port = frame_info["port"]
+                assert frame_info["frame_index"] == sync_index
+                assert frame_info["frame_time"] == pytest.approx(sync_index / 30 + port / 1000)
+                assert frame_info["size"] > 0
+
+                width, height = FRAME_SIZES[port]
+                scale = THUMBNAIL_EDGE / max(width, height)
+                expected_shape = (round(height * scale), round(width * scale), 3)
+                assert frames[port].shape == expected_shape
+                # JPEG is lossy, but a flat gray frame survives it closely
+                assert abs(float(frames[port].mean()) - 40 * (port + 1)) < 2
+    finally:
+        client.close()
+
+
+def test_port_in_use_raises(synchronizer):
+    blocker = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    blocker.bind(("127.0.0.1", 0))
+    blocker.listen()
+    try:
+        sink = NetworkSink(synchronizer, port=blocker.getsockname()[1])
+        with pytest.raises(OSError):
+            sink.start()
+    finally:
+        blocker.close()
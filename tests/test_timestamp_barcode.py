@@ -0,0 +1,58 @@
+import cv2
+import numpy as np
+import pytest
+
+from multiwebcam.cameras.timestamp_barcode import (
+    DATA_CELLS,
+    TIMESTAMP_RESOLUTION,
+    decode_barcode,
+    render_barcode,
+)
+
+CELL_SIZE = 12
+SCENE_SIZE = (640, 480)  # (width, height)
+TIMESTAMPS = np.random.default_rng(0).uniform(0, 1e6, 20)
+
+
+def camera_view(barcode: np.ndarray, rng: np.random.Generator, angle: float = 12) -> np.ndarray:
+    """The barcode as a camera might see it: scaled, tilted, blurred and noisy on a gray background"""
+    scene = np.full((SCENE_SIZE[1], SCENE_SIZE[0]), 90, dtype=np.uint8)
+    transform = cv2.getRotationMatrix2D((barcode.shape[1] / 2, barcode.shape[0] / 2), angle, 1.1)
+    transform[:, 2] += (120, 80)
+    cv2.warpAffine(barcode, transform, SCENE_SIZE, dst=scene, borderMode=cv2.BORDER_TRANSPARENT)
+    scene = cv2.GaussianBlur(scene, (3, 3), 0)
+    scene = np.clip(scene + rng.normal(0, 6, scene.shape), 0, 255).astype(np.uint8)
+    return cv2.cvtColor(scene, cv2.COLOR_GRAY2BGR)
+
+
+@pytest.mark.parametrize("timestamp", TIMESTAMPS)
+def test_round_trip_through_camera_view(timestamp):
+    rng = np.random.default_rng(int(timestamp))
+    frame = camera_view(render_barcode(timestamp, cell_size=CELL_SIZE), rng)
+
+    decoded = decode_barcode(frame)
+    assert decoded is not None
+    assert abs(decoded - timestamp) <= TIMESTAMP_RESOLUTION
+
+
+@pytest.mark.parametrize("timestamp", TIMESTAMPS[:5])
+def test_camera_on_its_side(timestamp):
+    rng = np.random.default_rng(int(timestamp))
+    frame = np.rot90(camera_view(render_barcode(timestamp, cell_size=CELL_SIZE), rng)).copy()
+
+    decoded = decode_barcode(frame)
+    assert decoded is not None
+    assert abs(decoded - timestamp) <= TIMESTAMP_RESOLUTION
+
+
+def test_failed_parity_is_rejected():
+    timestamp = TIMESTAMPS[0]
+    barcode = render_barcode(timestamp, cell_size=CELL_SIZE)
+
+    # invert the first data cell; the quiet zone and border take two cells on each side
+    row, column = DATA_CELLS[0]
+    top, left = (row + 2) * CELL_SIZE, (column + 2) * CELL_SIZE
+    cell = barcode[top : top + CELL_SIZE, left : left + CELL_SIZE]
+    cell[:] = 255 - cell
+
+    assert decode_barcode(camera_view(barcode, np.random.default_rng(0))) is None